@@ -0,0 +1,177 @@
+import csv
+import random
+
+
+def get_split_column_names(split_columns):
+    return [f"tag{i}" for i in range(split_columns)]
+
+
+def generate_template_rules(*, regions, variables, split_columns=0, regex_validators=True):
+    """
+    Regional timeseries dataset template rules matching the csv written by
+    generate_regional_timeseries_csv with the same arguments.
+
+    All names are lower case as the validator lower cases every row.
+    """
+    split_column_names = get_split_column_names(split_columns)
+
+    properties = {
+        "model": {"type": "string"},
+        "scenario": {"type": "string"},
+        "region": {"type": "string"},
+        "variable": {"type": "string"},
+        "unit": {"type": "string"},
+    }
+    for name in split_column_names:
+        properties[name] = {"type": "array", "x-split": "|", "items": {"type": "string"}}
+    properties["year"] = {"type": "number"}
+    properties["value"] = {"type": "number"}
+
+    rules = {
+        "root_schema_declarations": {
+            "time_dimension": "year",
+            "value_dimension": "value",
+            "unit_dimension": "unit",
+            "variable_dimension": "variable",
+            "region_dimension": "region",
+            "final_dimensions_order": ["model", "scenario", "region", "variable", "unit"] + split_column_names + ["year", "value"],
+        },
+        "root": {
+            "type": "object",
+            "properties": properties,
+            "required": list(properties.keys()),
+        },
+        "map_region": {f"region_{i}": {} for i in range(regions)},
+        "map_variable": {
+            f"variable_{i}": {"unit": f"unit_{i % 7}"} for i in range(variables)
+        },
+        "template_validators": {
+            "unit": {"value_equals": ["&map_variable", "{variable}", "unit"]},
+        },
+    }
+
+    if regex_validators:
+        rules["template_validators"]["scenario"] = {
+            "regex": {
+                "regexf": "^{model}_ssp[0-9]+$",
+                "fcontext": {"model": ["{model}"]},
+            }
+        }
+
+    return rules
+
+
+def generate_regional_timeseries_csv(
+    filepath,
+    *,
+    rows,
+    regions,
+    variables,
+    years,
+    models=2,
+    scenarios=3,
+    split_columns=0,
+    split_values=20,
+    start_year=2000,
+    seed=0
+):
+    """
+    Long format regional timeseries csv in random (unsorted) order.
+
+    Series are (model, scenario, region, variable) combinations, each with
+    `years` consecutive years. Writes `rows` rows, cycling over series with
+    the following years once every series got `years` years, so there are
+    no duplicate keys.
+    """
+    rng = random.Random(seed)
+    split_column_names = get_split_column_names(split_columns)
+
+    headers = ["model", "scenario", "region", "variable", "unit"] + split_column_names + ["year", "value"]
+
+    series = [
+        (f"model_{m}", f"model_{m}_ssp{s}", f"region_{r}", f"variable_{v}", f"unit_{v % 7}")
+        for m in range(models)
+        for s in range(scenarios)
+        for r in range(regions)
+        for v in range(variables)
+    ]
+    rng.shuffle(series)
+
+    written = 0
+    with open(filepath, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(headers)
+
+        cycle_start_year = start_year
+        while written < rows:
+            for key in series:
+                tags = [
+                    '|'.join(
+                        f"{name}_value_{rng.randrange(split_values)}" for _ in range(rng.randint(1, 3))
+                    )
+                    for name in split_column_names
+                ]
+                for year in range(cycle_start_year, cycle_start_year + years):
+                    writer.writerow(list(key) + tags + [year, round(rng.uniform(-1000, 1000), 4)])
+                    written += 1
+                    if written >= rows:
+                        return headers
+            cycle_start_year += years
+    return headers
+
+
+def generate_geotiff(
+    filepath,
+    *,
+    width,
+    height,
+    bands=1,
+    nodata=-9999.0,
+    seed=0,
+    overview_factors=None,
+    bounds=(-180, -90, 180, 90),
+    dtype='float32'
+):
+    """
+    Multi band GeoTIFF in EPSG:4326 with a nodata border, optionally with
+    internal overviews. Float bands are normally distributed, integer bands
+    hold class codes 1 to 10.
+    """
+    import numpy as np
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.transform import from_bounds
+
+    rng = np.random.default_rng(seed)
+
+    profile = {
+        "driver": "GTiff",
+        "width": width,
+        "height": height,
+        "count": bands,
+        "dtype": dtype,
+        "crs": "EPSG:4326",
+        "transform": from_bounds(*bounds, width, height),
+        "nodata": nodata,
+        "tiled": True,
+        "blockxsize": 512,
+        "blockysize": 512,
+        "compress": "deflate",
+        "BIGTIFF": "IF_SAFER",
+    }
+
+    with rasterio.open(filepath, 'w', **profile) as dst:
+        for band_index in range(1, bands + 1):
+            dst.update_tags(band_index, variable=f"variable_{band_index}", unit="unit")
+            for _, window in dst.block_windows(band_index):
+                if np.issubdtype(np.dtype(dtype), np.floating):
+                    block = rng.normal(band_index * 10, 5, size=(window.height, window.width))
+                else:
+                    block = rng.integers(1, 11, size=(window.height, window.width))
+                block = block.astype(dtype)
+                if window.col_off == 0:
+                    block[:, :8] = nodata
+                dst.write(block, band_index, window=window)
+
+        if overview_factors:
+            dst.build_overviews(overview_factors, Resampling.nearest)
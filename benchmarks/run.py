@@ -0,0 +1,469 @@
+"""
+Benchmarks of validator, merger, tif_to_cog, band statistics and COG tile reads on synthetic data.
+
+Every routine runs in a fresh process against the filesystem backed
+LocalAjobCliService (ACC_JOB_BACKEND=local) so peak memory is measured per
+routine. Results are compared to a stored baseline.
+
+    python benchmarks/run.py --scenario small
+    python benchmarks/run.py --scenario medium --routines validator,merger --update-baseline
+    python benchmarks/run.py --scenario small --routines validator,merger --gateway-latency 0.2 --gateway-bandwidth 50e6
+    python benchmarks/run.py --scenario medium --routines validator,merger --execution-backend duckdb
+    python benchmarks/run.py --scenario medium --routines validator,merger --input-transfer stream --input-bandwidth 100e6
+"""
+import os
+import sys
+import json
+import glob
+import time
+import runpy
+import shutil
+import argparse
+import contextlib
+import tempfile
+import multiprocessing
+from queue import Empty
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIRECTORY)
+
+sys.path.insert(0, BENCHMARKS_DIRECTORY)
+sys.path.insert(0, REPO_ROOT)
+
+from generate import generate_template_rules, generate_regional_timeseries_csv, generate_geotiff  # noqa: E402
+from common.profiling import get_peak_rss  # noqa: E402
+from common.project_service import LocalAjobCliService  # noqa: E402
+from common.range_server import LocalRangeServer  # noqa: E402
+from common.streaming import join_location, stream_to_file  # noqa: E402
+
+LOCAL_BACKEND_DIRECTORY = 'local_backend'
+
+SCENARIOS = {
+    'small': {
+        'csv': {'rows': 100_000, 'regions': 20, 'variables': 50, 'years': 10, 'split_columns': 1},
+        'merge_files': 2,
+        'tif': {'width': 2048, 'height': 2048, 'bands': 2},
+    },
+    'medium': {
+        'csv': {'rows': 1_000_000, 'regions': 50, 'variables': 200, 'years': 20, 'split_columns': 2},
+        'merge_files': 4,
+        'tif': {'width': 8192, 'height': 8192, 'bands': 2},
+    },
+    'large': {
+        'csv': {'rows': 10_000_000, 'regions': 200, 'variables': 1000, 'years': 50, 'split_columns': 2},
+        'merge_files': 8,
+        'tif': {'width': 20000, 'height': 20000, 'bands': 3},
+    },
+}
+
+ROUTINES = ['validator', 'merger', 'tif_to_cog', 'statistics', 'tiles']
+
+# Regional raster for tile reads; a global one would need clamping at the WebMercatorQuad poles
+TILES_BOUNDS = (5, 45, 15, 55)
+
+# Relative increase over baseline considered a regression
+COMPARED_METRICS = ['wall_seconds', 'peak_rss_bytes', 'output_bytes']
+
+
+def get_directory_size(directory):
+    return sum(
+        os.path.getsize(path) for path in glob.glob(os.path.join(directory, '**'), recursive=True)
+        if os.path.isfile(path)
+    )
+
+
+def read_profile_stages(directory):
+    stages = {}
+    for path in glob.glob(os.path.join(directory, '*.profile.json')):
+        with open(path) as report_file:
+            for name, stage in json.load(report_file)['stages'].items():
+                stages[name] = stage['wall_seconds']
+    return stages
+
+
+def use_local_backend(rules, validation_details=None):
+    os.environ['ACC_JOB_BACKEND'] = 'local'
+    os.environ['ACC_LOCAL_BACKEND_DIRECTORY'] = LOCAL_BACKEND_DIRECTORY
+
+    backend = LocalAjobCliService(LOCAL_BACKEND_DIRECTORY)
+    backend.write_json({'id': 1, 'rules': rules}, 'dataset_templates', '1.json')
+    for filepath, details in (validation_details or {}).items():
+        backend.write_json(details, 'validation_details', backend.get_validation_details_filename(filepath))
+    return backend
+
+
+def get_bucket_size(exclude=None):
+    return sum(
+        os.path.getsize(path)
+        for path in glob.glob(os.path.join(LOCAL_BACKEND_DIRECTORY, 'bucket', '**'), recursive=True)
+        if os.path.isfile(path) and not (exclude and exclude(path))
+    )
+
+
+@contextlib.contextmanager
+def serve_inputs(settings, inputs):
+    """
+    Input transfer of a benchmark, `inputs` mapping bucket file paths to
+    generated local files. 'local' leaves them in inputs/ (as mapped into a
+    pod before the job starts); 'download' and 'stream' move them into the
+    local bucket served by LocalRangeServer at the input bandwidth. Yields
+    the streamed location per file path (None unless streaming) and a
+    callable downloading the inputs, to be timed with the routine.
+    """
+    transfer = settings.get('input_transfer', {'mode': 'local'})
+    if transfer['mode'] == 'local':
+        yield {filepath: None for filepath in inputs}, lambda: None
+        return
+
+    bucket_directory = os.path.join(LOCAL_BACKEND_DIRECTORY, 'bucket')
+    for filepath, local_filepath in inputs.items():
+        bucket_filepath = os.path.join(bucket_directory, filepath.strip('/'))
+        os.makedirs(os.path.dirname(bucket_filepath), exist_ok=True)
+        shutil.move(local_filepath, bucket_filepath)
+
+    with LocalRangeServer(bucket_directory, bandwidth=transfer.get('bandwidth')) as server:
+        locations = {filepath: join_location(server.url, filepath) for filepath in inputs}
+
+        def download():
+            for filepath, local_filepath in inputs.items():
+                stream_to_file(locations[filepath], local_filepath)
+
+        if transfer['mode'] == 'stream':
+            yield locations, lambda: None
+        else:
+            yield {filepath: None for filepath in inputs}, download
+
+
+def bench_validator(settings):
+    sys.path.insert(0, os.path.join(REPO_ROOT, 'csv_regional_timeseries_validator'))
+    import service
+
+    csv_settings = settings['csv']
+    rules = generate_template_rules(
+        regions=csv_settings['regions'],
+        variables=csv_settings['variables'],
+        split_columns=csv_settings['split_columns'],
+    )
+    os.makedirs('inputs')
+    generate_regional_timeseries_csv('inputs/data.csv', **csv_settings)
+    input_bytes = os.path.getsize('inputs/data.csv')
+
+    use_local_backend(rules)
+
+    with serve_inputs(settings, {'benchmark/data/data.csv': 'inputs/data.csv'}) as (locations, download):
+        start = time.perf_counter()
+        download()
+        service.CsvRegionalTimeseriesVerificationService(
+            filename='inputs/data.csv',
+            dataset_template_id=1,
+            job_token='benchmark',
+            original_filepath='/benchmark/data/data.csv',
+            execution_backend=settings.get('execution_backend', 'python'),
+            input_location=locations['benchmark/data/data.csv'],
+        )()
+        wall_seconds = time.perf_counter() - start
+
+    return {
+        'wall_seconds': wall_seconds,
+        'throughput': csv_settings['rows'] / wall_seconds,
+        'throughput_unit': 'rows/s',
+        'input_bytes': input_bytes,
+        'output_bytes': get_bucket_size(exclude=lambda path: '/job-outputs/' in path),
+    }
+
+
+def bench_merger(settings):
+    sys.path.insert(0, os.path.join(REPO_ROOT, 'csv_regional_timeseries_merger'))
+    import service
+
+    csv_settings = settings['csv']
+    rules = generate_template_rules(
+        regions=csv_settings['regions'],
+        variables=csv_settings['variables'],
+        split_columns=csv_settings['split_columns'],
+    )
+
+    os.makedirs('inputs')
+    filepaths = []
+    validation_details = {}
+    rows_per_file = csv_settings['rows'] // settings['merge_files']
+    for i in range(settings['merge_files']):
+        filepath = f"benchmark/data/data_{i}.csv"
+        generate_regional_timeseries_csv(
+            f"inputs/data_{i}.csv",
+            **{**csv_settings, 'rows': rows_per_file, 'seed': i}
+        )
+        filepaths.append(filepath)
+        validation_details[filepath] = {
+            'dataset_template_id': 1,
+            'validation_metadata': {
+                'year_meta': {'min_value': 2000.0, 'max_value': 2000.0 + csv_settings['years'] - 1},
+                'region': list(rules['map_region'].keys()),
+                'variable-unit': [[variable, doc['unit']] for variable, doc in rules['map_variable'].items()],
+            },
+        }
+
+    input_bytes = get_directory_size('inputs')
+
+    use_local_backend(rules, validation_details)
+    os.environ['JOB_ID'] = 'benchmark'
+
+    files = [f"inputs/{filepath.split('/')[-1]}" for filepath in filepaths]
+
+    with serve_inputs(settings, dict(zip(filepaths, files))) as (locations, download):
+        start = time.perf_counter()
+        download()
+        service.CSVRegionalTimeseriesMergeService(
+            filename='merged',
+            files=files,
+            job_token='benchmark',
+            filepaths=filepaths,
+            execution_backend=settings.get('execution_backend', 'python'),
+            input_locations=[locations[filepath] for filepath in filepaths] if locations[filepaths[0]] else None,
+        )()
+        wall_seconds = time.perf_counter() - start
+
+    return {
+        'wall_seconds': wall_seconds,
+        'throughput': rows_per_file * settings['merge_files'] / wall_seconds,
+        'throughput_unit': 'rows/s',
+        'input_bytes': input_bytes,
+        # served inputs live in the bucket too
+        'output_bytes': get_bucket_size(exclude=lambda path: path.endswith('.profile.json') or '/benchmark/data/' in path),
+    }
+
+
+def bench_tif_to_cog(settings):
+    tif_settings = settings['tif']
+
+    os.makedirs('inputs')
+    generate_geotiff('inputs/raster.tif', **tif_settings)
+    input_bytes = os.path.getsize('inputs/raster.tif')
+
+    os.environ['DEVELOPMENT'] = 'True'
+
+    start = time.perf_counter()
+    runpy.run_path(os.path.join(REPO_ROOT, 'tif_to_cog_converter', 'main.py'), run_name='__main__')
+    wall_seconds = time.perf_counter() - start
+
+    pixels = tif_settings['width'] * tif_settings['height'] * tif_settings['bands']
+
+    return {
+        'wall_seconds': wall_seconds,
+        'throughput': pixels / wall_seconds,
+        'throughput_unit': 'pixels/s',
+        'input_bytes': input_bytes,
+        'output_bytes': sum(
+            # output paths keep the inputs/ prefix of the source file id
+            os.path.getsize(path) for path in glob.glob('outputs/**/*.tif', recursive=True)
+        ),
+    }
+
+
+def bench_statistics(settings):
+    """ Exact (threaded) and approximate (overview) band statistics of common/cog.py. """
+    from common.cog import compute_band_statistics
+    from common.profiling import JobProfiler
+    import rasterio
+
+    tif_settings = {**settings['tif'], 'bands': 1}
+
+    os.makedirs('inputs')
+    generate_geotiff('inputs/raster.tif', **tif_settings, overview_factors=[2, 4, 8, 16, 32, 64])
+    input_bytes = os.path.getsize('inputs/raster.tif')
+
+    profiler = JobProfiler('statistics')
+    profiler.start()
+
+    start = time.perf_counter()
+    with rasterio.open('inputs/raster.tif') as src:
+        with profiler.stage('exact_statistics'):
+            compute_band_statistics(src, 1, None, threads=os.cpu_count())
+        with profiler.stage('approximate_statistics'):
+            compute_band_statistics(src, 1, None, mode='approximate')
+    wall_seconds = time.perf_counter() - start
+
+    profiler.finish()
+
+    return {
+        'wall_seconds': wall_seconds,
+        'throughput': tif_settings['width'] * tif_settings['height'] / wall_seconds,
+        'throughput_unit': 'pixels/s',
+        'input_bytes': input_bytes,
+        'output_bytes': 0,
+    }
+
+
+def bench_tiles(settings):
+    """ Tile reads of native and web optimized COGs (common/cog.py) through the local tiler of tiler.py. """
+    from common.cog import COG_LAYOUTS, WEB_MERCATOR_QUAD, get_resampling, translate_to_cog
+    from common.profiling import JobProfiler
+    from rasterio.enums import Resampling
+    from tiler import benchmark_tiles
+    import rasterio
+
+    tif_settings = {**settings['tif'], 'bands': 1}
+
+    os.makedirs('inputs')
+    os.makedirs('outputs', exist_ok=True)
+    generate_geotiff('inputs/raster.tif', **tif_settings, bounds=TILES_BOUNDS)
+    input_bytes = os.path.getsize('inputs/raster.tif')
+
+    profiler = JobProfiler('tiles')
+    profiler.start()
+
+    start = time.perf_counter()
+    with rasterio.open('inputs/raster.tif') as src:
+        resampling = get_resampling(src.dtypes[0])
+        for layout in COG_LAYOUTS:
+            with profiler.stage(f"{layout}_translate"):
+                translate_to_cog(src, f"outputs/{layout}.tif", 1, src.nodata, {}, quiet=True, layout=layout)
+
+    layouts = {}
+    for layout in COG_LAYOUTS:
+        with profiler.stage(f"{layout}_tiles") as tiles_stage:
+            layouts[layout] = benchmark_tiles(f"outputs/{layout}.tif", WEB_MERCATOR_QUAD, Resampling[resampling])
+        tiles_stage.rows += layouts[layout]['tiles']
+    wall_seconds = time.perf_counter() - start
+
+    profiler.metadata['layouts'] = layouts
+    profiler.finish()
+
+    return {
+        'wall_seconds': wall_seconds,
+        'throughput': sum(result['tiles'] for result in layouts.values()) / wall_seconds,
+        'throughput_unit': 'tiles/s',
+        'input_bytes': input_bytes,
+        'output_bytes': os.path.getsize('outputs/web.tif'),
+        'layouts': layouts,
+    }
+
+
+def run_routine(routine, settings, workdir, queue):
+    """ Runs in a fresh process. """
+    os.chdir(workdir)
+    os.environ['PROFILE_REPORT'] = 'True'
+
+    gateway = settings.get('gateway') or {}
+    if gateway.get('latency'):
+        os.environ['ACC_LOCAL_BACKEND_LATENCY'] = str(gateway['latency'])
+    if gateway.get('bandwidth'):
+        os.environ['ACC_LOCAL_BACKEND_BANDWIDTH'] = str(gateway['bandwidth'])
+
+    result = globals()[f"bench_{routine}"](settings)
+    result['peak_rss_bytes'] = get_peak_rss()['self']
+    result['stages'] = read_profile_stages(os.path.join(workdir, 'outputs'))
+    queue.put(result)
+
+
+def run_benchmark(routine, settings):
+    workdir = tempfile.mkdtemp(prefix=f"benchmark_{routine}_")
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    try:
+        process = context.Process(target=run_routine, args=(routine, settings, workdir, queue))
+        process.start()
+
+        # read before joining: a child blocks on exit until its queued result is consumed
+        result = None
+        while result is None:
+            # checked before the get, so a result put right before exiting is still read
+            alive = process.is_alive()
+            try:
+                result = queue.get(timeout=1)
+            except Empty:
+                if not alive:
+                    break
+
+        process.join()
+        if process.exitcode != 0 or result is None:
+            raise RuntimeError(f"Benchmark of {routine} failed with exit code {process.exitcode}")
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    regressions = []
+    for routine, result in results.items():
+        baseline_result = baseline.get(routine)
+        if not baseline_result:
+            continue
+        for metric in COMPARED_METRICS:
+            if not baseline_result.get(metric):
+                continue
+            change = result[metric] / baseline_result[metric] - 1
+            status = 'REGRESSION' if change > tolerance else 'ok'
+            print(f"{routine:12} {metric:16} {baseline_result[metric]:>16.2f} -> {result[metric]:>16.2f} ({change:+.1%}) {status}")
+            if change > tolerance:
+                regressions.append((routine, metric, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=SCENARIOS.keys(), default='small')
+    parser.add_argument('--routines', default=','.join(ROUTINES))
+    parser.add_argument('--baseline', default=os.path.join(BENCHMARKS_DIRECTORY, 'baseline.json'))
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--output', help='Write results json to this path')
+    parser.add_argument('--gateway-latency', type=float, default=0.0, help='Seconds added to every gateway call')
+    parser.add_argument('--gateway-bandwidth', type=float, default=None, help='Upload bytes per second')
+    parser.add_argument('--execution-backend', choices=['python', 'duckdb'], default='python')
+    parser.add_argument(
+        '--input-transfer', choices=['local', 'download', 'stream'], default='local',
+        help='Validator and merger inputs in inputs/, downloaded from or streamed from a local range server'
+    )
+    parser.add_argument('--input-bandwidth', type=float, default=None, help='Input bytes per second per connection')
+    args = parser.parse_args()
+
+    settings = SCENARIOS[args.scenario]
+
+    # Simulated gateway; baselines are stored per latency and bandwidth
+    baseline_key = args.scenario
+    if args.gateway_latency or args.gateway_bandwidth:
+        settings = {**settings, 'gateway': {'latency': args.gateway_latency, 'bandwidth': args.gateway_bandwidth}}
+        baseline_key = f"{args.scenario}@{args.gateway_latency}s,{args.gateway_bandwidth}B/s"
+
+    if args.execution_backend != 'python':
+        settings = {**settings, 'execution_backend': args.execution_backend}
+        baseline_key = f"{baseline_key}+{args.execution_backend}"
+
+    if args.input_transfer != 'local':
+        settings = {**settings, 'input_transfer': {'mode': args.input_transfer, 'bandwidth': args.input_bandwidth}}
+        baseline_key = f"{baseline_key}+{args.input_transfer}@{args.input_bandwidth}B/s"
+
+    results = {}
+    for routine in args.routines.split(','):
+        print(f"_____________Benchmarking {routine} ({args.scenario})_____________")
+        results[routine] = run_benchmark(routine, settings)
+        print(json.dumps(results[routine], indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baselines = json.load(baseline_file)
+
+    if args.update_baseline:
+        baselines.setdefault(baseline_key, {}).update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baselines, baseline_file, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return
+
+    if baseline_key not in baselines:
+        print(f"No baseline for '{baseline_key}'. Run with --update-baseline to store one.")
+        return
+
+    regressions = compare_to_baseline(results, baselines[baseline_key], args.tolerance)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
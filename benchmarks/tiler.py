@@ -0,0 +1,121 @@
+"""
+Minimal local tile server stand-in for benchmarking COG layouts: reads
+WebMercatorQuad tiles the way rio-tiler does (WarpedVRT on the tile grid at
+source resolution, read resampled to 256 x 256 so GDAL picks the overview) and counts
+the internal blocks a tile read touches.
+"""
+import math
+import random
+import time
+import rasterio
+from rasterio.vrt import WarpedVRT
+from rasterio.transform import from_bounds as transform_from_bounds
+from rasterio.warp import transform_bounds, calculate_default_transform
+from rasterio.windows import from_bounds
+
+TILE_SIZE = 256
+EDGE_TOLERANCE = 1e-6
+
+
+def get_zoom_range(src, tms):
+    """ Max zoom of the dataset resolution and the zoom its coarsest overview serves. """
+    with WarpedVRT(src, crs=tms.rasterio_crs) as vrt:
+        max_zoom = tms.zoom_for_res(max(vrt.res), zoom_level_strategy="auto")
+    overview_factors = src.overviews(1)
+    levels = int(math.log2(overview_factors[-1])) if overview_factors else 0
+    return max(0, max_zoom - levels), max_zoom
+
+
+def sample_tiles(src, tms, zoom, count, seed=0):
+    """ Up to `count` random tiles of `zoom` intersecting the dataset. """
+    west, south, east, north = transform_bounds(src.crs, "EPSG:4326", *src.bounds, densify_pts=21)
+    tiles = list(tms.tiles(west, south, east, north, [zoom]))
+    random.Random(seed).shuffle(tiles)
+    return tiles[:count]
+
+
+def get_read_level(src, tile_resolution):
+    """ Overview factor GDAL reads for a target resolution: the coarsest level not coarser than it (1 is full resolution). """
+    factor = 1
+    for overview_factor in src.overviews(1):
+        if min(src.res) * overview_factor <= tile_resolution * (1 + 1e-6):
+            factor = overview_factor
+    return factor
+
+
+def count_tile_blocks(src, tile, tms):
+    """ Internal blocks of the read level intersecting the footprint of a tile (resampling margins excluded). """
+    bounds = transform_bounds(tms.rasterio_crs, src.crs, *tms.xy_bounds(tile), densify_pts=21)
+    tile_resolution = max(bounds[2] - bounds[0], bounds[3] - bounds[1]) / TILE_SIZE
+    factor = get_read_level(src, tile_resolution)
+
+    block_height, block_width = src.block_shapes[0]
+    level_width = math.ceil(src.width / factor)
+    level_height = math.ceil(src.height / factor)
+
+    window = from_bounds(*bounds, transform=src.transform)
+    col_start = max(0, window.col_off / factor)
+    col_end = min(level_width, (window.col_off + window.width) / factor)
+    row_start = max(0, window.row_off / factor)
+    row_end = min(level_height, (window.row_off + window.height) / factor)
+
+    if col_end <= col_start or row_end <= row_start:
+        return 0
+
+    # tile edges falling on block edges must not count the neighbouring block
+    columns = math.ceil(col_end / block_width - EDGE_TOLERANCE) - math.floor(col_start / block_width + EDGE_TOLERANCE)
+    rows = math.ceil(row_end / block_height - EDGE_TOLERANCE) - math.floor(row_start / block_height + EDGE_TOLERANCE)
+    return columns * rows
+
+
+def get_tms_resolution(src, tms):
+    """ Resolution of the dataset reprojected to the TMS crs. """
+    transform, _, _ = calculate_default_transform(src.crs, tms.rasterio_crs, src.width, src.height, *src.bounds)
+    return abs(transform.a)
+
+
+def read_tile(filepath, tile, tms, resampling, resolution):
+    """ Reads one tile from a freshly opened dataset (cold block cache); returns the array. """
+    west, south, east, north = tms.xy_bounds(tile)
+    width = max(1, round((east - west) / resolution))
+    height = max(1, round((north - south) / resolution))
+
+    with rasterio.open(filepath) as src:
+        with WarpedVRT(
+            src,
+            crs=tms.rasterio_crs,
+            transform=transform_from_bounds(west, south, east, north, width, height),
+            width=width,
+            height=height,
+            resampling=resampling,
+        ) as vrt:
+            return vrt.read(1, out_shape=(TILE_SIZE, TILE_SIZE), resampling=resampling)
+
+
+def benchmark_tiles(filepath, tms, resampling, tiles_per_zoom=16, seed=0):
+    """ Blocks touched and latency of tile reads, per zoom between the min and max zoom of the dataset. """
+    with rasterio.open(filepath) as src:
+        min_zoom, max_zoom = get_zoom_range(src, tms)
+        tiles = [
+            tile
+            for zoom in range(min_zoom, max_zoom + 1)
+            for tile in sample_tiles(src, tms, zoom, tiles_per_zoom, seed)
+        ]
+        blocks = [count_tile_blocks(src, tile, tms) for tile in tiles]
+        resolution = get_tms_resolution(src, tms)
+
+    latencies = []
+    for tile in tiles:
+        start = time.perf_counter()
+        read_tile(filepath, tile, tms, resampling, resolution)
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    return {
+        'zooms': [min_zoom, max_zoom],
+        'tiles': len(tiles),
+        'blocks_per_tile': round(sum(blocks) / len(blocks), 3) if blocks else 0,
+        'max_blocks_per_tile': max(blocks, default=0),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None,
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 3) if latencies else None,
+    }
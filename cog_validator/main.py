@@ -0,0 +1,48 @@
+import os
+import json
+from service import CogValidationService
+
+input_directory = 'inputs'
+
+DEVELOPMENT = os.environ.get('DEVELOPMENT', None)
+
+# Remote COGs (http(s) or s3 urls) are validated through range reads, without download.
+locations = [
+    location.strip() for location in os.environ.get('COG_URLS', '').split(',') if location.strip()
+]
+
+for dirpath, dirnames, filenames in os.walk(input_directory):
+    for f in filenames:
+        if f != '.gitkeep':
+            locations.append(os.path.relpath(os.path.join(dirpath, f), start=os.getcwd()))
+
+allowed_compressions = os.environ.get('COG_ALLOWED_COMPRESSIONS')
+
+for location in locations:
+
+    print(f"_____________Validating COG: {location} _____________")
+
+    cog_validation_service = CogValidationService(
+        location=location,
+        dataset_template_id=os.environ.get('dataset_template_id'),
+        job_token=os.environ.get('ACC_JOB_TOKEN'),
+        block_size=int(os.environ.get('COG_BLOCK_SIZE', 256)),
+        allowed_compressions=allowed_compressions.split(',') if allowed_compressions else None,
+        require_nodata=os.environ.get('COG_REQUIRE_NODATA') in ['True', 'true', '1', 'TRUE'],
+        approximate_statistics=os.environ.get('COG_APPROXIMATE_STATISTICS') in ['True', 'true', '1', 'TRUE'],
+    )
+
+    report = cog_validation_service()
+
+    if not DEVELOPMENT:
+        report_path = f"outputs/{os.path.basename(location)}.cog_validation.json"
+        with open(report_path, 'w') as report_file:
+            json.dump(report, report_file, indent=2, default=str)
+
+        with open(report_path, "rb") as file_stream:
+            cog_validation_service.project_service.add_filestream_as_job_output(
+                report_path,
+                file_stream,
+            )
+
+    print(f"_____________DONE: Validating COG: {location} _____________")
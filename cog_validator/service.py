@@ -0,0 +1,257 @@
+import json
+import xml.etree.ElementTree as ET
+from typing import Optional
+from common.project_service import get_project_service
+from jsonschema import Draft202012Validator
+from jsonschema.exceptions import ValidationError, SchemaError
+from tiff_ifd import (
+    RangeReader,
+    TiffHeaderReader,
+    COMPRESSION,
+    GDAL_METADATA,
+    GDAL_NODATA,
+    STRIP_OFFSETS,
+    TILE_LENGTH,
+    TILE_OFFSETS,
+    TILE_WIDTH,
+)
+
+# TIFF compression tag values accepted for COGs
+COMPRESSION_NAMES = {
+    1: 'none',
+    5: 'lzw',
+    7: 'jpeg',
+    8: 'deflate',
+    32946: 'deflate',
+    34887: 'lerc',
+    50000: 'zstd',
+    50001: 'webp',
+}
+
+
+def parse_gdal_metadata(xml_text):
+    """ Dataset level items and per band items of GDAL_METADATA tag. """
+    dataset_metadata = {}
+    bands_metadata = {}
+
+    if not xml_text:
+        return dataset_metadata, bands_metadata
+
+    root = ET.fromstring(xml_text)
+    for item in root.iter('Item'):
+        name = item.get('name')
+        value = item.text or ''
+        if item.get('sample') is None:
+            dataset_metadata[name] = value
+        elif not item.get('role'):
+            bands_metadata.setdefault(int(item.get('sample')), {})[name] = value
+
+    return dataset_metadata, bands_metadata
+
+
+class CogValidationService():
+    def __init__(
+        self,
+        *,
+        location,
+        dataset_template_id,
+        job_token,
+        block_size=256,
+        allowed_compressions: Optional[list[str]]=None,
+        require_nodata=False,
+        approximate_statistics=False
+    ):
+
+        self.project_service = get_project_service(job_token)
+
+        self.location = location
+        self.dataset_template_id = dataset_template_id
+        self.block_size = block_size
+        self.allowed_compressions = allowed_compressions or ['deflate', 'lzw', 'zstd', 'webp', 'jpeg', 'lerc']
+        self.require_nodata = require_nodata
+        self.approximate_statistics = approximate_statistics
+
+        self.errors = []
+        self.warnings = []
+        self.report = {'location': location}
+
+    def set_validation_rules(self):
+        self.rules = None
+        if self.dataset_template_id:
+            dataset_template_details = self.project_service.get_dataset_template_details(self.dataset_template_id)
+            self.rules = dataset_template_details.get('rules')
+
+            assert self.rules, \
+                f"No dataset template rules found for dataset_template id: \
+                    {self.dataset_template_id}"
+
+    def check_structure(self, tiff, ifds):
+        main_ifd = ifds[0]
+        image_ifds = [ifd for ifd in ifds if not ifd.is_mask]
+        overview_ifds = [ifd for ifd in image_ifds[1:] if ifd.is_reduced_resolution]
+
+        self.report['bigtiff'] = tiff.bigtiff
+        self.report['width'] = main_ifd.width
+        self.report['height'] = main_ifd.height
+        self.report['overviews'] = [[ifd.width, ifd.height] for ifd in overview_ifds]
+
+        for i, ifd in enumerate(ifds):
+            name = 'main image' if i == 0 else f"IFD {i}"
+
+            if not ifd.is_tiled or STRIP_OFFSETS in ifd.lazy_tags:
+                self.errors.append(f"{name} is not tiled")
+                continue
+
+            block_size = (ifd.get(TILE_WIDTH), ifd.get(TILE_LENGTH))
+            if block_size != (self.block_size, self.block_size):
+                self.errors.append(
+                    f"{name} block size is {block_size[0]}x{block_size[1]}, expected {self.block_size}x{self.block_size}"
+                )
+
+        compression = COMPRESSION_NAMES.get(main_ifd.get(COMPRESSION), str(main_ifd.get(COMPRESSION)))
+        self.report['compression'] = compression
+        if compression not in self.allowed_compressions:
+            self.errors.append(f"Compression '{compression}' is not one of {self.allowed_compressions}")
+
+        if max(main_ifd.width, main_ifd.height) > self.block_size and not overview_ifds:
+            self.errors.append("Image is larger than one block but has no overviews")
+
+        previous = main_ifd
+        for ifd in overview_ifds:
+            if ifd.width >= previous.width or ifd.height >= previous.height:
+                self.errors.append("Overviews are not ordered from largest to smallest")
+                break
+            previous = ifd
+
+        nodata = main_ifd.get(GDAL_NODATA)
+        self.report['nodata'] = nodata
+        if nodata is None:
+            message = "No nodata value (GDAL_NODATA tag) set"
+            if self.require_nodata:
+                self.errors.append(message)
+            else:
+                self.warnings.append(message)
+
+    def check_layout(self, tiff, ifds):
+        """
+        IFDs must all be located before tile data, and tile data of smaller
+        overviews must come before larger ones. Only the first tile offset of
+        every IFD is read.
+        """
+        ghost_area = tiff.read_ghost_area()
+        self.report['layout'] = ghost_area.get('LAYOUT')
+        if ghost_area.get('LAYOUT') != 'IFDS_BEFORE_DATA':
+            self.warnings.append("GDAL structural metadata does not declare LAYOUT=IFDS_BEFORE_DATA")
+
+        tiled_ifds = [ifd for ifd in ifds if ifd.is_tiled]
+        if not tiled_ifds:
+            return
+
+        first_data_offsets = [
+            tiff.read_lazy_value(ifd, TILE_OFFSETS, 0) for ifd in tiled_ifds
+        ]
+
+        data_offsets = [offset for offset in first_data_offsets if offset]
+        if not data_offsets:
+            # sparse file whose first tile is empty in every IFD: no data location to compare with
+            self.warnings.append("First tile of every IFD is empty, tile data layout not checked")
+            return
+
+        if any(ifd.offset > min(data_offsets) for ifd in ifds):
+            self.errors.append("IFDs are not all located before tile data")
+
+        image_offsets = [
+            offset for ifd, offset in zip(tiled_ifds, first_data_offsets) if not ifd.is_mask and offset
+        ]
+        if image_offsets != sorted(image_offsets, reverse=True):
+            self.errors.append("Tile data of smaller overviews is not located before larger ones")
+
+    def check_metadata(self, main_ifd):
+        dataset_metadata, bands_metadata = parse_gdal_metadata(main_ifd.get(GDAL_METADATA))
+        self.report['metadata'] = dataset_metadata
+        self.report['bands_metadata'] = bands_metadata
+
+        if not self.rules:
+            return
+
+        try:
+            Draft202012Validator(self.rules['root']).validate(dataset_metadata)
+        except SchemaError as schema_error:
+            raise ValueError(
+                f"Schema itself is not valid with template id. Template id: {self.dataset_template_id}. Original exception: {str(schema_error)}"
+            )
+        except ValidationError as validation_error:
+            self.errors.append(
+                f"Invalid metadata. Template id: {self.dataset_template_id}. Original exception: {validation_error.message}"
+            )
+
+    def get_gdal_path(self):
+        if self.location.startswith(('http://', 'https://')):
+            return f"/vsicurl/{self.location}"
+        if self.location.startswith('s3://'):
+            return f"/vsis3/{self.location[len('s3://'):]}"
+        return self.location
+
+    def compute_approximate_statistics(self, overview_count):
+        """ Statistics of the lowest resolution overview instead of full resolution pixels. """
+        import rasterio
+
+        open_options = {}
+        if overview_count:
+            open_options['overview_level'] = overview_count - 1
+
+        statistics = {}
+        with rasterio.open(self.get_gdal_path(), **open_options) as src:
+            for band_index in range(1, src.count + 1):
+                data = src.read(band_index, masked=True)
+                if data.count() == 0:
+                    continue
+                statistics[band_index] = {
+                    'min': float(data.min()),
+                    'max': float(data.max()),
+                    'mean': float(data.mean()),
+                    'std': float(data.std()),
+                    'width': src.width,
+                    'height': src.height,
+                }
+        return statistics
+
+    def __call__(self):
+        self.set_validation_rules()
+
+        reader = RangeReader(self.location)
+        try:
+            tiff = TiffHeaderReader(reader)
+            ifds = tiff.read_ifds()
+
+            self.check_structure(tiff, ifds)
+            self.check_layout(tiff, ifds)
+            self.check_metadata(ifds[0])
+        finally:
+            reader.close()
+
+        self.report['bytes_read'] = reader.bytes_read
+        self.report['requests'] = reader.requests
+
+        if self.approximate_statistics:
+            self.report['approximate_statistics'] = self.compute_approximate_statistics(
+                len(self.report['overviews'])
+            )
+
+        self.report['errors'] = self.errors
+        self.report['warnings'] = self.warnings
+
+        print(json.dumps(self.report, indent=2, default=str))
+
+        if self.errors:
+            print("\n" + "!" * 80)
+            print("!!! INVALID COG DETECTED !!!".center(80))
+            print("!" * 80)
+            for error_msg in self.errors:
+                print("\n--- ERROR ---")
+                print(f"Details: {error_msg}")
+            print("\n" + "!" * 80)
+            raise ValueError("Invalid COG: File does not comply with COG layout or template rules.")
+
+        print('COG validation complete')
+        return self.report
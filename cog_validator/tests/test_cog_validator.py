@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip('rasterio')
+pytest.importorskip('rio_cogeo')
+
+from rasterio.transform import from_origin
+from rio_cogeo.cogeo import cog_translate
+from rio_cogeo.profiles import cog_profiles
+
+from service import CogValidationService
+from tiff_ifd import BLOCK_SIZE, TILE_OFFSETS, RangeReader, TiffHeaderReader
+
+
+def write_tif(path, size=1024, **options):
+    data = np.random.default_rng(0).random((size, size)).astype('float32')
+    with rasterio.open(
+        path, 'w', driver='GTiff', width=size, height=size, count=1, dtype='float32', crs='EPSG:4326',
+        transform=from_origin(0, 10, 0.01, 0.01), nodata=-9999, **options
+    ) as dst:
+        dst.write(data, 1)
+        dst.update_tags(source='fixture')
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def backend(tmp_path, monkeypatch):
+    monkeypatch.setenv('ACC_JOB_BACKEND', 'local')
+    monkeypatch.setenv('ACC_LOCAL_BACKEND_DIRECTORY', str(tmp_path / 'backend'))
+
+
+@pytest.fixture
+def cog_path(tmp_path):
+    profile = cog_profiles.get('deflate')
+    profile.update(blockxsize=256, blockysize=256)
+    cog_translate(write_tif(tmp_path / 'source.tif'), str(tmp_path / 'cog.tif'), profile, quiet=True)
+    return str(tmp_path / 'cog.tif')
+
+
+def validate(location):
+    return CogValidationService(location=location, dataset_template_id=None, job_token=None)()
+
+
+def test_read_ifds(cog_path):
+    reader = RangeReader(cog_path)
+    try:
+        tiff = TiffHeaderReader(reader)
+        ifds = tiff.read_ifds()
+        first_tile_offset = tiff.read_lazy_value(ifds[0], TILE_OFFSETS, 0)
+    finally:
+        reader.close()
+
+    with rasterio.open(cog_path) as src:
+        assert [(ifd.width, ifd.height) for ifd in ifds if not ifd.is_mask] == [(1024, 1024), (512, 512), (256, 256)]
+        assert first_tile_offset == int(src.get_tag_item('BLOCK_OFFSET_0_0', 'TIFF', bidx=1))
+    assert tiff.read_ghost_area()['LAYOUT'] == 'IFDS_BEFORE_DATA'
+
+
+def test_valid_cog_is_read_in_one_request(cog_path):
+    report = validate(cog_path)
+
+    assert report['errors'] == []
+    assert report['overviews'] == [[512, 512], [256, 256]]
+    assert report['compression'] == 'deflate'
+    assert report['nodata'] == '-9999'
+    assert report['metadata']['source'] == 'fixture'
+    # header, IFDs and first tile offsets all lie in the first block
+    assert (report['bytes_read'], report['requests']) == (BLOCK_SIZE, 1)
+
+
+def test_stripped_tiff_is_rejected(tmp_path):
+    service = CogValidationService(
+        location=write_tif(tmp_path / 'striped.tif'), dataset_template_id=None, job_token=None
+    )
+
+    with pytest.raises(ValueError, match='Invalid COG'):
+        service()
+
+    assert "main image is not tiled" in service.errors
+    assert "Image is larger than one block but has no overviews" in service.errors
+
+
+def test_sparse_first_tiles(tmp_path):
+    # only the last of four tiles is written, the others have offset 0
+    path = str(tmp_path / 'sparse.tif')
+    with rasterio.open(
+        path, 'w', driver='GTiff', width=512, height=512, count=1, dtype='float32', crs='EPSG:4326',
+        transform=from_origin(0, 10, 0.01, 0.01), tiled=True, blockxsize=256, blockysize=256, sparse_ok=True,
+    ) as dst:
+        dst.write(np.ones((256, 256), dtype='float32'), 1, window=rasterio.windows.Window(256, 256, 256, 256))
+
+    service = CogValidationService(location=path, dataset_template_id=None, job_token=None)
+    reader = RangeReader(path)
+    try:
+        tiff = TiffHeaderReader(reader)
+        service.check_layout(tiff, tiff.read_ifds())
+    finally:
+        reader.close()
+
+    assert service.errors == []
+    assert "First tile of every IFD is empty, tile data layout not checked" in service.warnings
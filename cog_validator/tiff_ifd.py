@@ -0,0 +1,263 @@
+import struct
+import urllib.request
+
+# TIFF field type -> (struct format, size in bytes)
+FIELD_TYPES = {
+    1: ('B', 1),
+    2: ('s', 1),
+    3: ('H', 2),
+    4: ('I', 4),
+    5: ('II', 8),
+    6: ('b', 1),
+    7: ('B', 1),
+    8: ('h', 2),
+    9: ('i', 4),
+    10: ('ii', 8),
+    11: ('f', 4),
+    12: ('d', 8),
+    16: ('Q', 8),
+    17: ('q', 8),
+    18: ('Q', 8),
+}
+
+NEW_SUBFILE_TYPE = 254
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+STRIP_OFFSETS = 273
+SAMPLES_PER_PIXEL = 277
+TILE_WIDTH = 322
+TILE_LENGTH = 323
+TILE_OFFSETS = 324
+TILE_BYTE_COUNTS = 325
+SAMPLE_FORMAT = 339
+GDAL_METADATA = 42112
+GDAL_NODATA = 42113
+
+# Arrays that can be huge. Only their location is recorded, values are read on demand.
+LAZY_TAGS = [STRIP_OFFSETS, TILE_OFFSETS, TILE_BYTE_COUNTS, 279]
+
+BLOCK_SIZE = 16 * 1024
+
+
+class RangeReader():
+    """
+    Reads byte ranges of a local file, http(s) url or s3 object.
+
+    Reads are aligned to BLOCK_SIZE blocks which are cached, so walking
+    the IFDs of a COG costs a handful of requests.
+    """
+
+    def __init__(self, location):
+        self.location = location
+        self.blocks = {}
+        self.bytes_read = 0
+        self.requests = 0
+
+        if location.startswith(('http://', 'https://')):
+            self.fetch = self.fetch_http
+        elif location.startswith('s3://'):
+            import s3fs
+            self.s3_file = s3fs.S3FileSystem().open(location, 'rb', block_size=BLOCK_SIZE)
+            self.fetch = self.fetch_file
+        else:
+            self.file = open(location, 'rb')
+            self.fetch = self.fetch_file
+
+    def fetch_http(self, start, end):
+        request = urllib.request.Request(
+            self.location,
+            headers={'Range': f"bytes={start}-{end - 1}"}
+        )
+        with urllib.request.urlopen(request) as response:
+            if response.status == 206:
+                return response.read()
+            # server ignoring Range sends the whole object, usable only from its start
+            if response.status == 200 and start == 0:
+                return response.read(end)
+            raise ValueError(
+                f"Range request bytes={start}-{end - 1} of {self.location} not honoured (status {response.status})"
+            )
+
+    def fetch_file(self, start, end):
+        file = getattr(self, 's3_file', None) or self.file
+        file.seek(start)
+        return file.read(end - start)
+
+    def read(self, offset, size):
+        first_block = offset // BLOCK_SIZE
+        last_block = (offset + size - 1) // BLOCK_SIZE
+
+        missing = [i for i in range(first_block, last_block + 1) if i not in self.blocks]
+        if missing:
+            # one request for the whole missing span
+            data = self.fetch(missing[0] * BLOCK_SIZE, (missing[-1] + 1) * BLOCK_SIZE)
+            self.requests += 1
+            self.bytes_read += len(data)
+            for i in range(missing[0], missing[-1] + 1):
+                start = (i - missing[0]) * BLOCK_SIZE
+                self.blocks[i] = data[start:start + BLOCK_SIZE]
+
+        data = b''.join(self.blocks[i] for i in range(first_block, last_block + 1))
+        start = offset - first_block * BLOCK_SIZE
+        return data[start:start + size]
+
+    def close(self):
+        file = getattr(self, 's3_file', None) or getattr(self, 'file', None)
+        if file:
+            file.close()
+
+
+class TiffIfd():
+    def __init__(self, offset, tags, lazy_tags):
+        self.offset = offset
+        self.tags = tags
+        self.lazy_tags = lazy_tags
+
+    def get(self, tag, default=None):
+        value = self.tags.get(tag, default)
+        if isinstance(value, tuple) and len(value) == 1:
+            return value[0]
+        return value
+
+    @property
+    def width(self):
+        return self.get(IMAGE_WIDTH)
+
+    @property
+    def height(self):
+        return self.get(IMAGE_LENGTH)
+
+    @property
+    def is_tiled(self):
+        return TILE_WIDTH in self.tags and TILE_OFFSETS in self.lazy_tags
+
+    @property
+    def is_mask(self):
+        return bool((self.get(NEW_SUBFILE_TYPE) or 0) & 4)
+
+    @property
+    def is_reduced_resolution(self):
+        return bool((self.get(NEW_SUBFILE_TYPE) or 0) & 1)
+
+
+class TiffHeaderReader():
+    """ Parses TIFF / BigTIFF header and IFDs without touching pixel data. """
+
+    def __init__(self, reader: RangeReader):
+        self.reader = reader
+
+        header = reader.read(0, 16)
+        if header[:2] == b'II':
+            self.byte_order = '<'
+        elif header[:2] == b'MM':
+            self.byte_order = '>'
+        else:
+            raise ValueError("Not a TIFF file")
+
+        magic, = struct.unpack(self.byte_order + 'H', header[2:4])
+        if magic == 42:
+            self.bigtiff = False
+            self.first_ifd_offset, = struct.unpack(self.byte_order + 'I', header[4:8])
+            self.header_size = 8
+        elif magic == 43:
+            self.bigtiff = True
+            self.first_ifd_offset, = struct.unpack(self.byte_order + 'Q', header[8:16])
+            self.header_size = 16
+        else:
+            raise ValueError(f"Unknown TIFF magic number {magic}")
+
+    def unpack(self, fmt, data):
+        return struct.unpack(self.byte_order + fmt, data)
+
+    def read_values(self, field_type, count, offset):
+        fmt, size = FIELD_TYPES[field_type]
+        data = self.reader.read(offset, size * count)
+        return self.decode_values(field_type, count, data)
+
+    def decode_values(self, field_type, count, data):
+        fmt, size = FIELD_TYPES[field_type]
+        if field_type == 2:
+            return data[:count].rstrip(b'\x00').decode('latin-1')
+        if field_type in [5, 10]:
+            values = self.unpack(fmt[0] * (2 * count), data[:size * count])
+            return tuple(values[i] / values[i + 1] if values[i + 1] else 0 for i in range(0, len(values), 2))
+        return self.unpack(fmt * count, data[:size * count])
+
+    def read_ifd(self, offset):
+        if self.bigtiff:
+            count_fmt, count_size, entry_size, offset_fmt = 'Q', 8, 20, 'Q'
+        else:
+            count_fmt, count_size, entry_size, offset_fmt = 'H', 2, 12, 'I'
+        inline_size = struct.calcsize(offset_fmt)
+
+        entry_count, = self.unpack(count_fmt, self.reader.read(offset, count_size))
+        entries = self.reader.read(offset + count_size, entry_count * entry_size + inline_size)
+
+        tags = {}
+        lazy_tags = {}
+        for i in range(entry_count):
+            entry = entries[i * entry_size:(i + 1) * entry_size]
+            if self.bigtiff:
+                tag, field_type, count = self.unpack('HHQ', entry[:12])
+                value_data = entry[12:20]
+            else:
+                tag, field_type, count = self.unpack('HHI', entry[:8])
+                value_data = entry[8:12]
+
+            if field_type not in FIELD_TYPES:
+                continue
+
+            size = FIELD_TYPES[field_type][1] * count
+            inline = size <= inline_size
+
+            if inline:
+                value_offset = None
+            else:
+                value_offset, = self.unpack(offset_fmt, value_data)
+
+            if tag in LAZY_TAGS:
+                lazy_tags[tag] = (field_type, count, value_offset, value_data if inline else None)
+            elif inline:
+                tags[tag] = self.decode_values(field_type, count, value_data)
+            else:
+                tags[tag] = self.read_values(field_type, count, value_offset)
+
+        next_offset, = self.unpack(offset_fmt, entries[entry_count * entry_size:])
+
+        return TiffIfd(offset, tags, lazy_tags), next_offset
+
+    def read_ifds(self):
+        ifds = []
+        offset = self.first_ifd_offset
+        while offset:
+            ifd, offset = self.read_ifd(offset)
+            ifds.append(ifd)
+        return ifds
+
+    def read_lazy_value(self, ifd, tag, index):
+        """ Single element of an offsets / byte counts array. """
+        field_type, count, value_offset, inline_data = ifd.lazy_tags[tag]
+        size = FIELD_TYPES[field_type][1]
+        if inline_data is not None:
+            return self.decode_values(field_type, count, inline_data)[index]
+        return self.read_values(field_type, 1, value_offset + index * size)[0]
+
+    def read_ghost_area(self):
+        """ GDAL_STRUCTURAL_METADATA written by GDAL right after the header of a COG. """
+        data = self.reader.read(self.header_size, 256)
+        prefix = b'GDAL_STRUCTURAL_METADATA_SIZE='
+        if not data.startswith(prefix):
+            return {}
+
+        size = int(data[len(prefix):len(prefix) + 6])
+        start = data.index(b'\n') + 1
+        content = self.reader.read(self.header_size + start, size).decode('ascii', 'ignore')
+
+        ghost_area = {}
+        for line in content.splitlines():
+            if '=' in line:
+                key, value = line.split('=', 1)
+                ghost_area[key.strip()] = value.strip()
+        return ghost_area
@@ -0,0 +1,98 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from common.project_service import get_project_service
+
+
+class AsyncProjectService():
+    """
+    Asyncio facade over AjobCliService (or LocalAjobCliService).
+
+    Gateway calls run on a pool of `max_concurrency` worker threads, which
+    bounds the calls in flight. Every worker thread creates its own client
+    with `client_factory` and reuses it, so connections are pooled per
+    worker and never shared by two concurrent calls.
+
+    Uploads take a local file path; the file is opened in the worker thread.
+
+        async with get_async_project_service(job_token) as project_service:
+            csv_id, parquet_id = await asyncio.gather(
+                project_service.add_job_output_from_path('merged.csv', 'inputs/a.csv'),
+                project_service.add_validation_supporter_from_path('merged.csv.parquet', 'inputs/a.csv.parquet'),
+            )
+    """
+
+    def __init__(self, client_factory, *, max_concurrency=4):
+        self.client_factory = client_factory
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix='project-service'
+        )
+
+    def get_client(self):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.client_factory()
+        return client
+
+    async def run(self, function):
+        """ Runs function(client) on a worker thread. """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: function(self.get_client()))
+
+    async def call(self, method_name, *args):
+        return await self.run(lambda client: getattr(client, method_name)(*args))
+
+    async def upload(self, method_name, filepath, local_filepath):
+        def upload_file(client):
+            with open(local_filepath, "rb") as file_stream:
+                return getattr(client, method_name)(filepath, file_stream)
+
+        return await self.run(upload_file)
+
+    async def get_dataset_template_details(self, dataset_template_id):
+        return await self.call('get_dataset_template_details', dataset_template_id)
+
+    async def get_filename_validation_details(self, filepath):
+        return await self.call('get_filename_validation_details', filepath)
+
+    async def get_filename_dataset_type(self, filepath):
+        return await self.call('get_filename_dataset_type', filepath)
+
+    async def replace_bucket_object_id_content_from_path(self, filepath, local_filepath):
+        return await self.upload('replace_bucket_object_id_content', filepath, local_filepath)
+
+    async def add_validation_supporter_from_path(self, filepath, local_filepath):
+        return await self.upload('add_filestream_as_validation_supporter', filepath, local_filepath)
+
+    async def add_job_output_from_path(self, filepath, local_filepath):
+        return await self.upload('add_filestream_as_job_output', filepath, local_filepath)
+
+    async def register_validation(self, bucket_object_id, dataset_template_id, validation_metadata, supporters):
+        return await self.call(
+            'register_validation',
+            bucket_object_id,
+            dataset_template_id,
+            validation_metadata,
+            supporters
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def get_async_project_service(job_token):
+    """ AsyncProjectService over get_project_service; ACC_GATEWAY_CONCURRENCY calls in flight (default 4). """
+    return AsyncProjectService(
+        lambda: get_project_service(job_token),
+        max_concurrency=int(os.environ.get('ACC_GATEWAY_CONCURRENCY', 4)),
+    )
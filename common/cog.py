@@ -0,0 +1,456 @@
+import json
+import math
+import morecantile
+import numpy as np
+import rasterio
+from concurrent.futures import ThreadPoolExecutor
+from rasterio.windows import Window
+from rio_cogeo.cogeo import cog_translate
+from rio_cogeo.profiles import cog_profiles
+from rio_cogeo.utils import get_web_optimized_params
+
+
+COG_TRANSLATE_CONFIG = {
+    "GDAL_NUM_THREADS": "ALL_CPUS",
+    "GDAL_TIFF_INTERNAL_MASK": True,
+    "GDAL_TIFF_OVR_BLOCKSIZE": "256",
+}
+
+
+WEB_MERCATOR_QUAD = morecantile.tms.get("WebMercatorQuad")
+WEB_TILE_SIZE = 256
+
+COG_LAYOUTS = ['native', 'web']
+
+
+STATISTICS_PERCENTILES = (2, 5, 25, 50, 75, 95, 98)
+HISTOGRAM_BINS = 256
+# Exact mode derives percentiles from a histogram this fine, i.e. to 1 / 65536 of its range
+PERCENTILE_HISTOGRAM_BINS = HISTOGRAM_BINS * 256
+# Blocks read up front to estimate the histogram range of bands without a small integer dtype
+RANGE_SAMPLE_BLOCKS = 64
+# Values outside the estimated range kept as they are, beyond which exact mode reads a band twice
+MAX_RANGE_OUTLIERS = 1024**2
+
+
+def read_valid_data(dataset, band_index, nodata_value, window=None):
+    """ Band (window) as float array with masked, nodata and non-finite pixels set to NaN. """
+    block = dataset.read(band_index, window=window, masked=True)
+    dtype = block.dtype if np.issubdtype(block.dtype, np.floating) else np.float64
+    data = block.astype(dtype).filled(np.nan)
+
+    invalid = ~np.isfinite(data)
+    if nodata_value is not None:
+        invalid |= data == nodata_value
+    data[invalid] = np.nan
+    return data
+
+
+def combine_moments(moments, other):
+    """ Chan et al. parallel combination of (count, mean, sum of squared deviations). """
+    count_a, mean_a, m2_a = moments
+    count_b, mean_b, m2_b = other
+
+    count = count_a + count_b
+    if not count:
+        return 0, 0.0, 0.0
+
+    delta = mean_b - mean_a
+    return (
+        count,
+        mean_a + delta * count_b / count,
+        m2_a + m2_b + delta * delta * count_a * count_b / count,
+    )
+
+
+def get_moments(data):
+    """ (count, min, max, mean, m2) of the non NaN values of data with nan-aware kernels. """
+    count = int(np.count_nonzero(~np.isnan(data)))
+    if not count:
+        return 0, math.inf, -math.inf, 0.0, 0.0
+
+    mean = float(np.nanmean(data, dtype=np.float64))
+    return (
+        count,
+        float(np.nanmin(data)),
+        float(np.nanmax(data)),
+        mean,
+        float(np.nansum(np.square(np.subtract(data, mean, dtype=np.float64)))),
+    )
+
+
+def reduce_moments(moments):
+    count, minimum, maximum, mean, m2 = 0, math.inf, -math.inf, 0.0, 0.0
+    for other_count, other_minimum, other_maximum, other_mean, other_m2 in moments:
+        minimum = min(minimum, other_minimum)
+        maximum = max(maximum, other_maximum)
+        count, mean, m2 = combine_moments((count, mean, m2), (other_count, other_mean, other_m2))
+    return count, minimum, maximum, mean, m2
+
+
+def get_histogram(data, value_range, bins):
+    values = data[~np.isnan(data)]
+    if not values.size:
+        return np.zeros(bins, dtype=np.int64)
+    return np.histogram(values, bins=bins, range=value_range)[0]
+
+
+def get_percentiles_from_histogram(histogram, value_range, percentiles, *, discrete=False, below=(), above=()):
+    """
+    Percentiles interpolated linearly within the histogram bin holding them
+    (the bin's lower edge when every bin holds a single integer value).
+    `below` and `above` are the sorted values outside value_range.
+    """
+    minimum, maximum = value_range
+    bin_width = (maximum - minimum) / len(histogram)
+    cumulative = np.cumsum(histogram)
+    total = len(below) + cumulative[-1] + len(above)
+
+    result = {}
+    for percentile in percentiles:
+        target = percentile / 100 * total
+        if len(below) and target <= len(below):
+            value = below[max(math.ceil(target), 1) - 1]
+        elif len(above) and target > total - len(above):
+            value = above[math.ceil(target - (total - len(above))) - 1]
+        elif minimum == maximum:
+            value = minimum
+        else:
+            target -= len(below)
+            index = min(int(np.searchsorted(cumulative, target, side='left')), len(histogram) - 1)
+            before = cumulative[index - 1] if index else 0
+            fraction = (target - before) / histogram[index] if histogram[index] and not discrete else 0.0
+            value = minimum + (index + fraction) * bin_width
+        result[f"p{percentile}"] = float(value)
+    return result
+
+
+def rebin_histogram(histogram, value_range, target_range, bins, *, discrete=False):
+    """
+    Histogram over value_range regrouped into `bins` bins over target_range,
+    placing every bin's count at its centre (its value when discrete).
+    """
+    minimum, maximum = value_range
+    offset = 0.0 if discrete else 0.5
+    values = minimum + (np.arange(len(histogram)) + offset) * (maximum - minimum) / len(histogram)
+    rebinned = np.histogram(np.clip(values, *target_range), bins=bins, range=target_range, weights=histogram)[0]
+    return rebinned.astype(np.int64)
+
+
+def get_statistics_windows(src, band_index, max_pixels=4 * 1024**2):
+    """ Windows of whole blocks covering the band, each of at most max_pixels (or one block). """
+    block_height, block_width = src.block_shapes[band_index - 1]
+
+    window_width = min(src.width, max(1, max_pixels // (block_height * block_width)) * block_width)
+    window_height = max(block_height, (max_pixels // window_width) // block_height * block_height)
+
+    return [
+        Window(col_off, row_off, min(window_width, src.width - col_off), min(window_height, src.height - row_off))
+        for row_off in range(0, src.height, window_height)
+        for col_off in range(0, src.width, window_width)
+    ]
+
+
+def map_window_groups(src, windows, threads, process):
+    """
+    Runs process(dataset, windows) for `threads` interleaved groups of
+    windows on a thread pool. Every thread opens its own dataset handle;
+    GDAL releases the GIL while reading and decompressing blocks.
+    """
+    def run(group):
+        with rasterio.open(src.name) as dataset:
+            return process(dataset, group)
+
+    groups = [windows[i::threads] for i in range(threads) if windows[i::threads]]
+    if len(groups) <= 1:
+        return [process(src, windows)]
+
+    with ThreadPoolExecutor(max_workers=len(groups), thread_name_prefix='statistics') as executor:
+        return list(executor.map(run, groups))
+
+
+def get_statistics(moments, histogram, percentiles, *, valid_percent, approximate=False, overview_factor=None):
+    count, minimum, maximum, mean, m2 = moments
+
+    return {
+        'approximate': approximate,
+        'overview_factor': overview_factor,
+        'count': count,
+        'valid_percent': valid_percent,
+        'min': minimum,
+        'max': maximum,
+        'mean': mean,
+        'std': math.sqrt(m2 / count),
+        'percentiles': percentiles,
+        'histogram': {
+            'min': minimum,
+            'max': maximum,
+            'counts': [int(bin_count) for bin_count in histogram],
+        },
+    }
+
+
+def get_histogram_range(src, band_index, nodata_value):
+    """
+    (range, bins, discrete) of the histogram gathered alongside the moments,
+    or None when no valid value is found before reading the band.
+
+    - 8 and 16 bit integers: the dtype range, one bin per value.
+    - other types: the 1st to 99th percentile of RANGE_SAMPLE_BLOCKS evenly
+      spread blocks, widened by its span on both sides so that outliers
+      do not coarsen the bins.
+    """
+    dtype = np.dtype(src.dtypes[band_index - 1])
+    if np.issubdtype(dtype, np.integer) and dtype.itemsize <= 2:
+        info = np.iinfo(dtype)
+        return (float(info.min), float(info.max) + 1), int(info.max) - int(info.min) + 1, True
+
+    block_height, block_width = src.block_shapes[band_index - 1]
+    blocks = [
+        Window(col_off, row_off, min(block_width, src.width - col_off), min(block_height, src.height - row_off))
+        for row_off in range(0, src.height, block_height)
+        for col_off in range(0, src.width, block_width)
+    ]
+    sample = np.concatenate([
+        read_valid_data(src, band_index, nodata_value, window).ravel()
+        for window in blocks[::max(1, len(blocks) // RANGE_SAMPLE_BLOCKS)]
+    ])
+    sample = sample[~np.isnan(sample)]
+    if not sample.size:
+        return None
+
+    minimum, maximum = (float(value) for value in np.percentile(sample, (1, 99)))
+    margin = maximum - minimum or abs(minimum) or 1.0
+    return (minimum - margin, maximum + margin), PERCENTILE_HISTOGRAM_BINS, False
+
+
+def compute_exact_band_statistics(src, band_index, nodata_value, *, threads=1):
+    """
+    Moments (count, min, max, mean, std) and a fine histogram, from which
+    percentiles and the styling histogram derive, in one pass over block
+    aligned windows split across threads. Values outside the histogram range
+    (get_histogram_range) are kept aside; only without a range or with more
+    than MAX_RANGE_OUTLIERS of them is the band read again over [min, max].
+    """
+    windows = get_statistics_windows(src, band_index)
+
+    def statistics_of_group(dataset, group, histogram_range):
+        moments, histogram, outliers, outlier_count = [], None, [], 0
+        if histogram_range:
+            value_range, bins, _ = histogram_range
+            histogram = np.zeros(bins, dtype=np.int64)
+
+        for window in group:
+            data = read_valid_data(dataset, band_index, nodata_value, window)
+            moments.append(get_moments(data))
+            if histogram_range:
+                histogram += get_histogram(data, value_range, bins)
+                outside = data[(data < value_range[0]) | (data > value_range[1])]
+                outlier_count += outside.size
+                if outlier_count <= MAX_RANGE_OUTLIERS:
+                    outliers.append(outside)
+        return reduce_moments(moments), histogram, outliers, outlier_count
+
+    def read_band(histogram_range):
+        """ Moments, histogram and sorted outliers; the outliers are None when too many or not gathered. """
+        results = map_window_groups(
+            src, windows, threads, lambda dataset, group: statistics_of_group(dataset, group, histogram_range)
+        )
+        moments = reduce_moments(result[0] for result in results)
+        if not histogram_range or sum(result[3] for result in results) > MAX_RANGE_OUTLIERS:
+            return moments, None, None
+        return (
+            moments,
+            np.sum([result[1] for result in results], axis=0),
+            np.sort(np.concatenate([outside for result in results for outside in result[2]])),
+        )
+
+    histogram_range = get_histogram_range(src, band_index, nodata_value)
+    moments, percentile_histogram, outliers = read_band(histogram_range)
+    if not moments[0]:
+        return None
+    value_range = moments[1:3]
+
+    if outliers is None:
+        if histogram_range:
+            print(f"Band {band_index} of {src.name} has too many values outside its sampled range, reading it again")
+        histogram_range = (value_range, PERCENTILE_HISTOGRAM_BINS, False)
+        _, percentile_histogram, outliers = read_band(histogram_range)
+
+    histogram_value_range, _, discrete = histogram_range
+    histogram = rebin_histogram(
+        percentile_histogram, histogram_value_range, value_range, HISTOGRAM_BINS, discrete=discrete
+    )
+    histogram += np.histogram(outliers, bins=HISTOGRAM_BINS, range=value_range)[0]
+
+    percentiles = get_percentiles_from_histogram(
+        percentile_histogram,
+        histogram_value_range,
+        STATISTICS_PERCENTILES,
+        discrete=discrete,
+        below=outliers[outliers < histogram_value_range[0]],
+        above=outliers[outliers > histogram_value_range[1]],
+    )
+
+    return get_statistics(
+        moments,
+        histogram,
+        {name: min(max(value, value_range[0]), value_range[1]) for name, value in percentiles.items()},
+        valid_percent=100 * moments[0] / (src.width * src.height),
+    )
+
+
+def get_overview_level(src, band_index, max_pixels):
+    """ Index of the finest overview with at most max_pixels (coarsest if none is that small); None without overviews. """
+    factors = src.overviews(band_index)
+    if not factors:
+        return None
+
+    for level, factor in enumerate(factors):
+        if math.ceil(src.width / factor) * math.ceil(src.height / factor) <= max_pixels:
+            return level
+    return len(factors) - 1
+
+
+def compute_overview_band_statistics(src, band_index, nodata_value, overview_level):
+    """ Statistics of one overview level read at once; percentiles are exact for the overview. """
+    factor = src.overviews(band_index)[overview_level]
+
+    with rasterio.open(src.name, overview_level=overview_level) as overview:
+        data = read_valid_data(overview, band_index, nodata_value)
+
+    moments = get_moments(data)
+    if not moments[0]:
+        return None
+
+    values = data[~np.isnan(data)]
+    return get_statistics(
+        moments,
+        np.histogram(values, bins=HISTOGRAM_BINS, range=moments[1:3])[0],
+        {
+            f"p{percentile}": float(value)
+            for percentile, value in zip(STATISTICS_PERCENTILES, np.percentile(values, STATISTICS_PERCENTILES))
+        },
+        valid_percent=100 * moments[0] / data.size,
+        approximate=True,
+        overview_factor=factor,
+    )
+
+
+def compute_band_statistics(src, band_index, nodata_value, *, mode='exact', threads=1, max_overview_pixels=1024**2):
+    """
+    Band statistics (count, min, max, mean, std, percentiles, histogram) or
+    None for a band without valid pixels.
+
+    - `exact`: every pixel, block aligned windows split across `threads`.
+    - `approximate`: from the finest internal overview of at most
+      `max_overview_pixels` pixels; falls back to exact without overviews.
+    """
+    if mode not in ['exact', 'approximate']:
+        raise ValueError(f"Unknown statistics mode: {mode}")
+
+    if mode == 'approximate':
+        overview_level = get_overview_level(src, band_index, max_overview_pixels)
+        if overview_level is not None:
+            return compute_overview_band_statistics(src, band_index, nodata_value, overview_level)
+        print(f"No overviews in {src.name}, computing exact statistics")
+
+    return compute_exact_band_statistics(src, band_index, nodata_value, threads=threads)
+
+
+def get_statistics_tags(statistics):
+    """ GDAL style STATISTICS_* band tags; percentiles and histogram (json) for styling tiles. """
+    if not statistics:
+        return {}
+
+    tags = {
+        "STATISTICS_MINIMUM": str(statistics['min']),
+        "STATISTICS_MAXIMUM": str(statistics['max']),
+        "STATISTICS_MEAN": str(statistics['mean']),
+        "STATISTICS_STDDEV": str(statistics['std']),
+        "STATISTICS_VALID_PERCENT": str(statistics['valid_percent']),
+        "STATISTICS_HISTOGRAM": json.dumps(statistics['histogram']),
+    }
+    for name, value in statistics['percentiles'].items():
+        tags[f"STATISTICS_{name.upper()}"] = str(value)
+    if statistics['approximate']:
+        tags["STATISTICS_APPROXIMATE"] = "YES"
+    return tags
+
+
+def get_cog_profile(nodata_value):
+    dst_profile = cog_profiles.get("deflate")
+    dst_profile.update({
+        "dtype": "float32",
+        "nodata": nodata_value,
+        "blockxsize": 256,
+        "blockysize": 256,
+        "BIGTIFF": "IF_SAFER",
+    })
+    return dst_profile
+
+
+def get_resampling(dtype, categorical=None):
+    """
+    Resampling of a band: mode for categorical data (class codes must not
+    be averaged into codes that do not exist), average for continuous data.
+    Integer bands count as categorical unless `categorical` says otherwise.
+    """
+    if categorical is None:
+        categorical = not np.issubdtype(np.dtype(dtype), np.floating)
+    return "mode" if categorical else "average"
+
+
+def get_web_overview_level(src, tms=WEB_MERCATOR_QUAD):
+    """
+    Overview levels of a web optimized COG: one per zoom level below the
+    max zoom of `src`, until the coarsest overview fits into a single tile.
+    """
+    params = get_web_optimized_params(src, zoom_level_strategy="auto", tms=tms)
+    size = max(params["width"], params["height"])
+    return max(0, math.ceil(math.log2(size / WEB_TILE_SIZE)))
+
+
+def translate_to_cog(src, output_path, band_index, nodata_value, band_tags, quiet=False, *, layout='native', categorical=None):
+    """
+    `layout='native'` keeps the source grid. `layout='web'` reprojects once
+    to the WebMercatorQuad grid at the max zoom of the source resolution and
+    aligns the raster to the tiles of the coarsest overview, so every
+    256 px block of the full resolution image and of each overview is
+    exactly one web tile of a zoom level. Reprojection and overviews
+    resample per data type (see get_resampling).
+    """
+    if layout not in COG_LAYOUTS:
+        raise ValueError(f"Unknown COG layout: {layout}")
+
+    if layout == 'web':
+        resampling = get_resampling(src.dtypes[band_index - 1], categorical)
+        overview_level = get_web_overview_level(src)
+        layout_options = {
+            "web_optimized": True,
+            "aligned_levels": overview_level,
+            "overview_level": overview_level,
+            "overview_resampling": resampling,
+            "resampling": resampling,
+        }
+    else:
+        layout_options = {
+            "aligned_levels": None,
+            "resampling": "nearest",
+        }
+
+    cog_translate(
+        src,
+        output_path,
+        get_cog_profile(nodata_value),
+        indexes=[band_index],
+        nodata=nodata_value,
+        config=COG_TRANSLATE_CONFIG,
+        in_memory=False,
+        quiet=quiet,
+        forward_band_tags=True,
+        additional_cog_metadata=band_tags,
+        tms=WEB_MERCATOR_QUAD,
+        zoom_level_strategy="auto",
+        **layout_options
+    )
@@ -0,0 +1,286 @@
+import io
+import os
+import bz2
+import gzip
+import struct
+import zstandard
+
+from common.streaming import open_location, get_size
+
+GZIP_MAGIC = b'\x1f\x8b'
+BZ2_MAGIC = b'BZh'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Seekable zstd format (zstd contrib/seekable_format): a skippable frame at the end lists every frame
+SEEK_TABLE_FRAME_MAGIC = 0x184D2A5E
+SEEK_TABLE_FOOTER_MAGIC = 0x8F92EAB1
+SEEK_TABLE_FOOTER_SIZE = 9
+SEEK_TABLE_ENTRY_SIZE = 8
+
+DEFAULT_FRAME_BYTES = 4 * 1024**2
+DEFAULT_ZSTD_LEVEL = 3
+
+COPY_BUFFER_SIZE = 1024**2
+
+
+def detect_compression(filepath):
+    """ 'gzip', 'zstd', 'bz2' or None by magic bytes; file extensions are not trusted. """
+    with open_location(filepath) as file:
+        magic = file.read(4)
+
+    if magic.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if magic.startswith(ZSTD_MAGIC):
+        return 'zstd'
+    if magic.startswith(BZ2_MAGIC):
+        return 'bz2'
+    return None
+
+
+class OwningReader(io.BufferedReader):
+    """ Buffered decompressor that also closes the file it reads from. """
+
+    def __init__(self, raw, source):
+        super().__init__(raw, buffer_size=COPY_BUFFER_SIZE)
+        self.source = source
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.source.close()
+
+
+def open_input(filepath, mode='rb', *, encoding=None, compression=None):
+    """
+    Opens a plain, gzip, bz2 or zstd file as a streaming (decompressing)
+    file object. `mode` is 'rb' or 'r'; text mode decodes with `encoding`
+    and keeps line endings. zstd streams are read across frames, so
+    concatenated and seekable files read as one stream. http(s) and s3
+    locations are streamed with read-ahead (see common/streaming.py).
+    """
+    compression = compression or detect_compression(filepath)
+
+    source = open_location(filepath)
+
+    if compression is None:
+        binary_file = source
+    elif compression == 'gzip':
+        binary_file = OwningReader(gzip.GzipFile(fileobj=source, mode='rb'), source)
+    elif compression == 'bz2':
+        binary_file = OwningReader(bz2.BZ2File(source), source)
+    elif compression == 'zstd':
+        binary_file = io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(source, read_across_frames=True, closefd=True),
+            buffer_size=COPY_BUFFER_SIZE
+        )
+    else:
+        source.close()
+        raise ValueError(f"Unsupported compression: {compression}")
+
+    if mode == 'r':
+        return io.TextIOWrapper(binary_file, encoding=encoding, newline='')
+    return binary_file
+
+
+def decompress_file(source_filepath, target_filepath):
+    """ Streams a (possibly compressed) file into a plain file; returns bytes written. """
+    written = 0
+    with open_input(source_filepath) as source, open(target_filepath, 'wb') as target:
+        while True:
+            data = source.read(COPY_BUFFER_SIZE)
+            if not data:
+                break
+            target.write(data)
+            written += len(data)
+    return written
+
+
+def iter_line_frames(lines, frame_bytes):
+    """ Groups binary lines into chunks of about `frame_bytes`; the first line (header) is a chunk of its own. """
+    lines = iter(lines)
+
+    header = next(lines, None)
+    if header is None:
+        return
+    yield header
+
+    chunk = []
+    chunk_bytes = 0
+    for line in lines:
+        chunk.append(line)
+        chunk_bytes += len(line)
+        if chunk_bytes >= frame_bytes:
+            yield b''.join(chunk)
+            chunk = []
+            chunk_bytes = 0
+
+    if chunk:
+        yield b''.join(chunk)
+
+
+def get_seek_table_frame(entries):
+    """ Skippable frame with the seek table of (compressed size, decompressed size) entries, without checksums. """
+    table = b''.join(struct.pack('<II', compressed, decompressed) for compressed, decompressed in entries)
+    footer = struct.pack('<IBI', len(entries), 0, SEEK_TABLE_FOOTER_MAGIC)
+    return struct.pack('<II', SEEK_TABLE_FRAME_MAGIC, len(table) + len(footer)) + table + footer
+
+
+def compress_seekable(source_filepath, target_filepath, *, frame_bytes=DEFAULT_FRAME_BYTES, level=DEFAULT_ZSTD_LEVEL):
+    """
+    Writes a (possibly compressed) csv as seekable zstd: the header line is
+    frame 0, data follows in independent frames of whole lines of about
+    `frame_bytes`, and a seek table closes the file. The last line gets a
+    line break if it has none, so files can be concatenated frame-wise
+    (see concatenate_seekable). Returns the seek table entries.
+    """
+    compressor = zstandard.ZstdCompressor(level=level, write_content_size=True)
+    entries = []
+
+    with open_input(source_filepath) as source, open(target_filepath, 'wb') as target:
+        previous = None
+        for chunk in iter_line_frames(source, frame_bytes):
+            if previous is not None:
+                entries.append(write_frame(target, compressor, previous))
+            previous = chunk
+
+        if previous is not None:
+            if not previous.endswith((b'\n', b'\r')):
+                previous += b'\n'
+            entries.append(write_frame(target, compressor, previous))
+
+        target.write(get_seek_table_frame(entries))
+
+    return entries
+
+
+def write_frame(target, compressor, data):
+    frame = compressor.compress(data)
+    target.write(frame)
+    return len(frame), len(data)
+
+
+def read_seek_table(filepath):
+    """ Seek table entries of a seekable zstd file, or None if the file has no seek table. """
+    with open_location(filepath) as file:
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        if size < SEEK_TABLE_FOOTER_SIZE + 8:
+            return None
+
+        file.seek(size - SEEK_TABLE_FOOTER_SIZE)
+        frames, descriptor, magic = struct.unpack('<IBI', file.read(SEEK_TABLE_FOOTER_SIZE))
+        if magic != SEEK_TABLE_FOOTER_MAGIC or descriptor & 0x80:
+            return None
+
+        table_size = frames * SEEK_TABLE_ENTRY_SIZE
+        if size < table_size + SEEK_TABLE_FOOTER_SIZE + 8:
+            return None
+
+        file.seek(size - SEEK_TABLE_FOOTER_SIZE - table_size - 8)
+        frame_magic, frame_size = struct.unpack('<II', file.read(8))
+        if frame_magic != SEEK_TABLE_FRAME_MAGIC or frame_size != table_size + SEEK_TABLE_FOOTER_SIZE:
+            return None
+
+        table = file.read(table_size)
+
+    return [struct.unpack_from('<II', table, i * SEEK_TABLE_ENTRY_SIZE) for i in range(frames)]
+
+
+def read_header_frame(filepath, entries):
+    """ Decompressed frame 0 of a seekable zstd file written by compress_seekable. """
+    with open_location(filepath) as file:
+        frame = file.read(entries[0][0])
+    return zstandard.ZstdDecompressor().decompress(frame)
+
+
+def is_frame_concatenable(filepaths):
+    """
+    True if every file is seekable zstd with a header line of its own as
+    frame 0 and all headers are equal, i.e. concatenate_seekable applies.
+    """
+    header = None
+    for filepath in filepaths:
+        if detect_compression(filepath) != 'zstd':
+            return False
+
+        entries = read_seek_table(filepath)
+        if not entries:
+            return False
+
+        frame_header = read_header_frame(filepath, entries)
+        if frame_header.count(b'\n') != 1 or not frame_header.endswith(b'\n'):
+            return False
+        if header is not None and frame_header != header:
+            return False
+        header = frame_header
+
+    return True
+
+
+def concatenate_seekable(filepaths, target_filepath):
+    """
+    Concatenates seekable zstd csv files without recompressing: all frames
+    of the first file, the data frames (frame 1 onwards) of the others and
+    one seek table for the result. Returns compressed bytes copied.
+    """
+    entries = []
+    copied = 0
+
+    with open(target_filepath, 'wb') as target:
+        for index, filepath in enumerate(filepaths):
+            file_entries = read_seek_table(filepath)
+            skipped_entries = file_entries[:1] if index else []
+            copied_entries = file_entries[1:] if index else file_entries
+
+            with open_location(filepath) as source:
+                source.seek(sum(compressed for compressed, _ in skipped_entries))
+                remaining = sum(compressed for compressed, _ in copied_entries)
+                while remaining:
+                    data = source.read(min(COPY_BUFFER_SIZE, remaining))
+                    if not data:
+                        raise ValueError(f"Truncated seekable zstd file: {filepath}")
+                    target.write(data)
+                    remaining -= len(data)
+                    copied += len(data)
+
+            entries.extend(copied_entries)
+
+        target.write(get_seek_table_frame(entries))
+
+    return copied
+
+
+def estimate_uncompressed_size(filepath, compression=None, *, sample_bytes=8 * 1024**2):
+    """
+    Decompressed size of a file: exact for plain and seekable zstd files
+    and for files decompressing to less than `sample_bytes`, otherwise
+    extrapolated from the compression ratio of the first `sample_bytes`.
+    """
+    compression = compression or detect_compression(filepath)
+    size = get_size(filepath)
+
+    if compression is None:
+        return size
+
+    if compression == 'zstd':
+        entries = read_seek_table(filepath)
+        if entries:
+            return sum(decompressed for _, decompressed in entries)
+
+    with open_location(filepath) as raw_file:
+        if compression == 'gzip':
+            reader = gzip.GzipFile(fileobj=raw_file, mode='rb')
+        elif compression == 'bz2':
+            reader = bz2.BZ2File(raw_file)
+        else:
+            reader = zstandard.ZstdDecompressor().stream_reader(raw_file, read_across_frames=True, closefd=False)
+
+        decompressed = 0
+        while decompressed < sample_bytes:
+            data = reader.read(COPY_BUFFER_SIZE)
+            if not data:
+                return decompressed
+            decompressed += len(data)
+
+        return int(decompressed * size / max(raw_file.tell(), 1))
@@ -0,0 +1,89 @@
+import os
+import uuid
+import duckdb
+from common.resources import get_memory_limit, get_cpu_limit
+
+# Share of the container memory limit given to DuckDB unless DUCKDB_MEMORY_LIMIT is set
+DUCKDB_MEMORY_FRACTION = 0.6
+
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def quote_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def read_csv_sql(filepaths, fieldnames, *, header=True, compression=None):
+    """
+    read_csv table function reading every column of `fieldnames` as VARCHAR; short rows are padded with NULL.
+    `compression` is 'gzip', 'zstd' or None (plain) for all files, as detected by common/compression.py.
+    """
+    if isinstance(filepaths, str):
+        filepaths = [filepaths]
+
+    columns = ', '.join(f"{quote_literal(name)}: 'VARCHAR'" for name in fieldnames)
+
+    return (
+        f"read_csv([{', '.join(quote_literal(path) for path in filepaths)}], "
+        f"header={'true' if header else 'false'}, columns={{{columns}}}, "
+        f"delim=',', quote='\"', escape='\"', null_padding=true, strict_mode=false, auto_detect=false, "
+        f"compression={quote_literal(compression or 'none')})"
+    )
+
+
+class DuckdbWorkspace():
+    """
+    On disk DuckDB database for one job step, removed on close.
+
+    `memory_limit` bounds the buffer manager; tables, sorts and joins larger
+    than that spill to `temp_directory`. Configured from DUCKDB_MEMORY_LIMIT
+    (default 60% of the container memory limit), DUCKDB_TEMP_DIRECTORY
+    (default duckdb_spill) and DUCKDB_THREADS (default the container cpu
+    limit) by get_duckdb_workspace.
+    """
+
+    def __init__(self, *, memory_limit='1GB', temp_directory='duckdb_spill', threads=None):
+        self.temp_directory = temp_directory
+        os.makedirs(self.temp_directory, exist_ok=True)
+
+        self.database_path = os.path.join(self.temp_directory, f"{uuid.uuid4().hex}.duckdb")
+        self.connection = duckdb.connect(self.database_path)
+
+        self.connection.execute(f"SET memory_limit = {quote_literal(memory_limit)}")
+        self.connection.execute(f"SET temp_directory = {quote_literal(self.temp_directory)}")
+        self.connection.execute("SET preserve_insertion_order = false")
+        if threads:
+            self.connection.execute(f"SET threads = {int(threads)}")
+
+    def execute(self, sql, parameters=None):
+        return self.connection.execute(sql, parameters) if parameters else self.connection.execute(sql)
+
+    def close(self):
+        self.connection.close()
+        for path in [self.database_path, f"{self.database_path}.wal"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def get_default_memory_limit():
+    memory_limit = get_memory_limit()
+    if not memory_limit:
+        return '1GB'
+    return f"{int(memory_limit * DUCKDB_MEMORY_FRACTION) // 1024**2}MB"
+
+
+def get_duckdb_workspace():
+    return DuckdbWorkspace(
+        memory_limit=os.environ.get('DUCKDB_MEMORY_LIMIT') or get_default_memory_limit(),
+        temp_directory=os.environ.get('DUCKDB_TEMP_DIRECTORY', 'duckdb_spill'),
+        threads=os.environ.get('DUCKDB_THREADS') or get_cpu_limit(),
+    )
@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import time
+import resource
+
+TRUE_VALUES = ['True', 'true', '1', 'TRUE']
+
+
+def get_peak_rss():
+    """ Peak resident set size in bytes of this process and of finished children (e.g. sort). """
+    # ru_maxrss is in kilobytes on linux and in bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit,
+    }
+
+
+class Stage():
+    """
+    Accumulates wall and CPU time over every enter / exit of a named stage.
+
+    A stage is not reentrant: entering it while it is running raises. An
+    untimed stage only counts calls, rows and bytes.
+    """
+
+    __slots__ = ['name', 'timed', 'wall', 'cpu', 'calls', 'rows', 'bytes', '_running', '_wall_start', '_cpu_start']
+
+    def __init__(self, name, timed=True):
+        self.name = name
+        self.timed = timed
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.calls = 0
+        self.rows = 0
+        self.bytes = 0
+        self._running = False
+
+    def __enter__(self):
+        if self._running:
+            raise RuntimeError(f"Profiling stage '{self.name}' entered while already running")
+        self._running = True
+        if self.timed:
+            self._wall_start = time.perf_counter()
+            self._cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.timed:
+            self.wall += time.perf_counter() - self._wall_start
+            self.cpu += time.process_time() - self._cpu_start
+        self.calls += 1
+        self._running = False
+        return False
+
+    def get_report(self):
+        return {
+            'wall_seconds': round(self.wall, 6),
+            'cpu_seconds': round(self.cpu, 6),
+            'calls': self.calls,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'rows_per_second': round(self.rows / self.wall, 2) if self.wall and self.rows else None,
+            'bytes_per_second': round(self.bytes / self.wall, 2) if self.wall and self.bytes else None,
+        }
+
+
+class JobProfiler():
+    """
+    Per stage timers, throughput counters and peak RSS of a routine.
+
+    Usage:
+
+        profiler = JobProfiler('csv_regional_timeseries_validator')
+        with profiler.stage('sort'):
+            ...
+        profiler.stage('parsing').rows += 1
+
+    Stage timers are always on. Stages entered once per row (row_stage and
+    iterate) cost two clock reads per enter / exit, so they are only timed
+    when PROFILE_REPORT=True and otherwise just count. With
+    PROFILE_REPORT=True the json report is
+    written (and uploaded as job output by the routine). PROFILER=cprofile or
+    PROFILER=pyinstrument additionally dumps a full profile of the run.
+    """
+
+    def __init__(self, name, output_directory='outputs'):
+        self.name = name
+        self.output_directory = output_directory
+        self.stages = {}
+        self.metadata = {}
+
+        self.report_enabled = os.environ.get('PROFILE_REPORT') in TRUE_VALUES
+        self.profiler_kind = (os.environ.get('PROFILER') or '').lower() or None
+        self.profiler = None
+
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    def stage(self, name):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage(name)
+        return stage
+
+    def row_stage(self, name):
+        """ Stage entered once per row, timed only when the report is enabled. """
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage(name, timed=self.report_enabled)
+        return stage
+
+    def iterate(self, name, iterator):
+        """ Counts items of an iterator as rows of a stage, timing every next() when the report is enabled. """
+        stage = self.row_stage(name)
+
+        if not stage.timed:
+            for item in iterator:
+                stage.rows += 1
+                yield item
+            return
+
+        iterator = iter(iterator)
+        while True:
+            with stage:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            stage.rows += 1
+            yield item
+
+    def start(self):
+        if self.profiler_kind == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif self.profiler_kind == 'pyinstrument':
+            from pyinstrument import Profiler
+            self.profiler = Profiler()
+            self.profiler.start()
+        elif self.profiler_kind:
+            print(f"Unknown PROFILER '{self.profiler_kind}'. Use cprofile or pyinstrument.")
+
+    def stop(self):
+        """ Stops profiler if any and returns path of the dump. """
+        if self.profiler is None:
+            return None
+
+        os.makedirs(self.output_directory, exist_ok=True)
+
+        if self.profiler_kind == 'cprofile':
+            self.profiler.disable()
+            dump_path = os.path.join(self.output_directory, f"{self.name}.prof")
+            self.profiler.dump_stats(dump_path)
+        else:
+            self.profiler.stop()
+            dump_path = os.path.join(self.output_directory, f"{self.name}.pyinstrument.html")
+            with open(dump_path, 'w') as dump_file:
+                dump_file.write(self.profiler.output_html())
+
+        self.profiler = None
+        return dump_path
+
+    def get_report(self):
+        return {
+            'name': self.name,
+            'wall_seconds': round(time.perf_counter() - self._wall_start, 6),
+            'cpu_seconds': round(time.process_time() - self._cpu_start, 6),
+            'peak_rss_bytes': get_peak_rss(),
+            'stages': {name: stage.get_report() for name, stage in self.stages.items()},
+            'metadata': self.metadata,
+        }
+
+    def write_report(self):
+        """ Writes json report when enabled and returns its path. """
+        if not self.report_enabled:
+            return None
+
+        os.makedirs(self.output_directory, exist_ok=True)
+        report_path = os.path.join(self.output_directory, f"{self.name}.profile.json")
+        with open(report_path, 'w') as report_file:
+            json.dump(self.get_report(), report_file, indent=2)
+
+        return report_path
+
+    def finish(self, upload=None):
+        """
+        Writes report and profile dump. Every written file is passed to
+        upload (e.g. a function adding it as job output) when given.
+        """
+        written = [path for path in [self.stop(), self.write_report()] if path]
+
+        for path in written:
+            print(f"Profile written: {path}")
+            if upload:
+                upload(path)
+
+        return written
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import shutil
+import threading
+from urllib.parse import quote
+
+
+def json_default(obj):
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class LocalAjobCliService():
+    """
+    Filesystem backed stand-in for accli AjobCliService.
+
+    Layout of the backend directory:
+
+        dataset_templates/<dataset_template_id>.json   template details, must contain 'rules'
+        validation_details/<quoted filepath>.json       written by register_validation
+        bucket/<filepath>                               uploaded and replaced objects
+
+    `latency` seconds are slept before every call and uploads are throttled
+    to `bandwidth` bytes per second when given, so end to end runs have
+    realistic I/O timing without the job gateway.
+    """
+
+    def __init__(self, root_directory, *, latency=0.0, bandwidth=None, job_id=None):
+        self.root_directory = root_directory
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.job_id = job_id or 'local'
+
+        self.lock = threading.Lock()
+
+        for directory in ['dataset_templates', 'validation_details', 'bucket']:
+            os.makedirs(os.path.join(self.root_directory, directory), exist_ok=True)
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def read_json(self, *path):
+        with open(os.path.join(self.root_directory, *path)) as json_file:
+            return json.load(json_file)
+
+    def write_json(self, data, *path):
+        with open(os.path.join(self.root_directory, *path), 'w') as json_file:
+            json.dump(data, json_file, indent=2, default=json_default)
+
+    def get_validation_details_filename(self, filepath):
+        return f"{quote(filepath.strip('/'), safe='')}.json"
+
+    def store(self, bucket_filepath, file_stream):
+        bucket_filepath = bucket_filepath.strip('/')
+        local_filepath = os.path.join(self.root_directory, 'bucket', bucket_filepath)
+        os.makedirs(os.path.dirname(local_filepath), exist_ok=True)
+
+        self.wait()
+
+        start = time.perf_counter()
+        written = 0
+        with open(local_filepath, 'wb') as bucket_file:
+            while True:
+                dat = file_stream.read(1024**2)
+                if not dat:
+                    break
+                bucket_file.write(dat)
+                written += len(dat)
+
+                if self.bandwidth:
+                    ahead = written / self.bandwidth - (time.perf_counter() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+        return bucket_filepath
+
+    def get_dataset_template_details(self, dataset_template_id):
+        self.wait()
+        return self.read_json('dataset_templates', f"{dataset_template_id}.json")
+
+    def get_filename_validation_details(self, filepath):
+        self.wait()
+        return self.read_json('validation_details', self.get_validation_details_filename(filepath))
+
+    def get_filename_dataset_type(self, filepath):
+        self.wait()
+        details_filename = self.get_validation_details_filename(filepath)
+        if not os.path.exists(os.path.join(self.root_directory, 'validation_details', details_filename)):
+            return None
+        return self.read_json('validation_details', details_filename)['dataset_template_id']
+
+    def replace_bucket_object_id_content(self, filepath, file_stream):
+        return self.store(filepath, file_stream)
+
+    def add_filestream_as_validation_supporter(self, filepath, file_stream):
+        return self.store(filepath, file_stream)
+
+    def add_filestream_as_job_output(self, filepath, file_stream):
+        return self.store(f"job-outputs/{self.job_id}/{filepath}", file_stream)
+
+    def register_validation(self, bucket_object_id, dataset_template_id, validation_metadata, supporters):
+        self.wait()
+        with self.lock:
+            self.write_json(
+                {
+                    'dataset_template_id': dataset_template_id,
+                    'validation_metadata': validation_metadata,
+                    'supporters': supporters,
+                },
+                'validation_details',
+                self.get_validation_details_filename(bucket_object_id)
+            )
+
+    def get_file_url_from_repo(self, filepath):
+        """ Stands in for the presigned download url: the bucket file itself. """
+        self.wait()
+        return os.path.join(self.root_directory, 'bucket', filepath.strip('/'))
+
+    def copy_to_bucket(self, local_filepath, bucket_filepath):
+        """ Seeds an object into the local bucket (e.g. inputs of a merge). """
+        destination = os.path.join(self.root_directory, 'bucket', bucket_filepath.strip('/'))
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(local_filepath, destination)
+
+
+def get_project_service(job_token):
+    """
+    AjobCliService of the job gateway, or LocalAjobCliService when
+    ACC_JOB_BACKEND=local (directory from ACC_LOCAL_BACKEND_DIRECTORY,
+    optional ACC_LOCAL_BACKEND_LATENCY seconds per call and
+    ACC_LOCAL_BACKEND_BANDWIDTH bytes per second for uploads).
+    """
+    if os.environ.get('ACC_JOB_BACKEND') == 'local':
+        bandwidth = os.environ.get('ACC_LOCAL_BACKEND_BANDWIDTH')
+        return LocalAjobCliService(
+            os.environ.get('ACC_LOCAL_BACKEND_DIRECTORY', 'local_backend'),
+            latency=float(os.environ.get('ACC_LOCAL_BACKEND_LATENCY', 0)),
+            bandwidth=float(bandwidth) if bandwidth else None,
+            job_id=os.environ.get('JOB_ID'),
+        )
+
+    from accli import AjobCliService
+
+    return AjobCliService(
+        job_token,
+        server_url=os.environ.get('ACC_JOB_GATEWAY_SERVER'),
+        verify_cert=False
+    )
@@ -0,0 +1,133 @@
+import os
+import re
+import time
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)$')
+SEND_BUFFER_SIZE = 64 * 1024
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """ Files of the served directory with single range GET and HEAD, throttled per connection. """
+
+    # set by LocalRangeServer
+    latency = 0.0
+    bandwidth = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        filepath = self.translate_path(self.path)
+        if not os.path.isfile(filepath):
+            self.send_error(404, "File not found")
+            return None, None
+
+        size = os.path.getsize(filepath)
+        start, end = 0, size
+
+        range_header = self.headers.get('Range')
+        match = RANGE_PATTERN.match(range_header or '')
+        if range_header and not match:
+            self.send_error(400, "Unsupported range")
+            return None, None
+
+        if match:
+            first, last = match.groups()
+            if first:
+                start, end = int(first), min(int(last) + 1 if last else size, size)
+            else:
+                start, end = max(0, size - int(last)), size
+            if start >= size or start >= end:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.end_headers()
+                return None, None
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end - 1}/{size}")
+        else:
+            self.send_response(200)
+
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.end_headers()
+        return filepath, (start, end)
+
+    def do_HEAD(self):
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_head()
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+        filepath, byte_range = self.send_head()
+        if not filepath:
+            return
+
+        start, end = byte_range
+        began = time.perf_counter()
+        sent = 0
+        with open(filepath, 'rb') as served_file:
+            served_file.seek(start)
+            while sent < end - start:
+                data = served_file.read(min(SEND_BUFFER_SIZE, end - start - sent))
+                if not data:
+                    break
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # client cancelled its read-ahead
+                    return
+                sent += len(data)
+
+                if self.bandwidth:
+                    ahead = sent / self.bandwidth - (time.perf_counter() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+
+class LocalRangeServer():
+    """
+    Local stand-in for bucket object urls: serves `directory` (e.g. the
+    bucket of LocalAjobCliService) over http with range requests, on a
+    free port in a background thread. `latency` seconds are slept per
+    request and every connection is throttled to `bandwidth` bytes per
+    second, so streamed input can be benchmarked against download first.
+
+        with LocalRangeServer('local_backend/bucket', bandwidth=50 * 1024**2) as server:
+            os.environ['INPUT_BASE_URL'] = server.url
+    """
+
+    def __init__(self, directory, *, latency=0.0, bandwidth=None, host='127.0.0.1', port=0):
+        handler = type(
+            'ThrottledRangeRequestHandler',
+            (RangeRequestHandler,),
+            {'latency': latency, 'bandwidth': bandwidth},
+        )
+
+        def get_handler(*args, **kwargs):
+            return handler(*args, directory=directory, **kwargs)
+
+        self.server = ThreadingHTTPServer((host, port), get_handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
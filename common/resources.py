@@ -0,0 +1,268 @@
+import os
+import csv
+import sys
+import math
+import itertools
+
+from common.compression import detect_compression, open_input, estimate_uncompressed_size
+from common.streaming import get_size
+
+CGROUP_DIRECTORY = '/sys/fs/cgroup'
+
+# cgroup v1 reports "no limit" as a huge page aligned number
+UNLIMITED_MEMORY = 2**60
+
+# Rows of a validator chunk exist as columns of csv strings (ColumnarChunk) and as an arrow table while it is
+# written, about the profiled row_memory at peak; the rest is headroom for arrow temporaries
+CHUNK_MEMORY_FACTOR = 1.5
+# Chunks read with pandas (merger) exist as parser buffers, a DataFrame and an arrow table
+DATAFRAME_CHUNK_MEMORY_FACTOR = 3
+DEFAULT_MEMORY_FRACTION = 0.25
+MIN_CHUNK_ROWS = 1000
+MAX_CHUNK_ROWS = 1_000_000
+DEFAULT_ROW_GROUP_BYTES = 128 * 1024**2
+# Chunk rows requested resources are sized for, independent of the limit of the profiling pod
+RECOMMENDED_CHUNK_ROWS = 100_000
+
+# Interpreter, pyarrow and template lookups
+BASE_RAM = 512 * 1024**2
+MAX_SORT_BUFFER = 2 * 1024**3
+MIN_SORT_BUFFER = 64 * 1024**2
+RAM_GRANULARITY = 256 * 1024**2
+STORAGE_GRANULARITY = 1024**3
+
+
+def read_cgroup_file(*path_parts):
+    try:
+        with open(os.path.join(CGROUP_DIRECTORY, *path_parts)) as cgroup_file:
+            return cgroup_file.read().strip()
+    except OSError:
+        return None
+
+
+def get_physical_memory():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def get_memory_limit():
+    """ Memory available to this container in bytes: cgroup v2 or v1 limit, else physical memory. """
+    limits = [get_physical_memory()]
+
+    for path_parts in [('memory.max',), ('memory', 'memory.limit_in_bytes')]:
+        value = read_cgroup_file(*path_parts)
+        if value and value != 'max' and int(value) < UNLIMITED_MEMORY:
+            limits.append(int(value))
+            break
+
+    limits = [limit for limit in limits if limit]
+    return min(limits) if limits else None
+
+
+def get_cpu_limit():
+    """ Cores available to this container: cgroup v2 or v1 cpu quota, else cpu affinity. """
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+
+    quota = period = None
+    cpu_max = read_cgroup_file('cpu.max')
+    if cpu_max:
+        quota, period = cpu_max.split()
+    else:
+        quota, period = read_cgroup_file('cpu', 'cpu.cfs_quota_us'), read_cgroup_file('cpu', 'cpu.cfs_period_us')
+
+    if quota and period and quota not in ['max', '-1']:
+        cores = min(cores, max(1, math.ceil(int(quota) / int(period))))
+
+    return cores
+
+
+def get_resident_memory():
+    """ Current resident set size of this process in bytes. """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        # peak instead of current where /proc is missing (macOS reports bytes)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+def get_row_memory(row):
+    """ Approximate bytes held by a csv row as a dict of strings or lists of strings. """
+    size = sys.getsizeof(row)
+    for value in row.values():
+        size += sys.getsizeof(value)
+        if isinstance(value, list):
+            size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+def profile_csv_input(filepath, *, list_columns=None, sample_rows=10_000):
+    """
+    Profile of a (possibly compressed) csv from its first `sample_rows`
+    rows: average csv bytes and in-memory bytes per row (with `list_columns`,
+    a mapping of column to x-split separator, split as in validation),
+    distinct values per column within the sample, average items of list
+    columns and the estimated number of rows of the whole file.
+    """
+    list_columns = list_columns or {}
+    compression = detect_compression(filepath)
+    uncompressed_bytes = estimate_uncompressed_size(filepath, compression)
+
+    sample_bytes = 0
+
+    def iter_decoded_lines(input_file):
+        nonlocal sample_bytes
+        for line in input_file:
+            sample_bytes += len(line)
+            yield line.decode('utf-8-sig')
+
+    with open_input(filepath) as input_file:
+        lines = iter_decoded_lines(input_file)
+        fieldnames = [name.lower() for name in next(csv.reader(lines), [])]
+        header_bytes = sample_bytes
+
+        distinct_values = {name: set() for name in fieldnames}
+        list_items = {name: 0 for name in list_columns}
+        rows = 0
+        row_memory = 0
+
+        for values in itertools.islice(csv.reader(lines), sample_rows):
+            row = dict(zip(fieldnames, values))
+            for name, value in row.items():
+                distinct_values[name].add(value)
+            for name, separator in list_columns.items():
+                if row.get(name):
+                    row[name] = row[name].split(separator)
+                    list_items[name] += len(row[name])
+            row_memory += get_row_memory(row)
+            rows += 1
+
+    row_bytes = max(1, (sample_bytes - header_bytes) // rows) if rows else 1
+
+    return {
+        'file_bytes': get_size(filepath),
+        'compression': compression,
+        'uncompressed_bytes': uncompressed_bytes,
+        'sample_rows': rows,
+        'row_bytes': row_bytes,
+        'row_memory': row_memory // rows if rows else 0,
+        'estimated_rows': max(0, uncompressed_bytes - header_bytes) // row_bytes,
+        'distinct_values': {name: len(values) for name, values in distinct_values.items()},
+        'list_items': {name: round(items / rows, 2) if rows else 0 for name, items in list_items.items()},
+    }
+
+
+def clamp(value, lower, upper):
+    return max(lower, min(upper, value))
+
+
+def plan_chunks(
+    profile,
+    *,
+    memory_limit=None,
+    memory_fraction=DEFAULT_MEMORY_FRACTION,
+    row_group_bytes=DEFAULT_ROW_GROUP_BYTES,
+    memory_factor=CHUNK_MEMORY_FACTOR
+):
+    """
+    Rows per parquet writer chunk, so that `memory_fraction` of the memory
+    limit holds a chunk in all its representations (`memory_factor` times
+    the profiled row memory), and rows per parquet row group of about
+    `row_group_bytes` csv bytes (never more than a chunk).
+    """
+    memory_limit = memory_limit or get_memory_limit() or 4 * 1024**3
+    row_memory = max(profile['row_memory'], 1) * memory_factor
+
+    chunk_rows = clamp(
+        min(int(memory_limit * memory_fraction / row_memory), profile['estimated_rows'] + 1),
+        MIN_CHUNK_ROWS,
+        MAX_CHUNK_ROWS
+    )
+    row_group_rows = clamp(row_group_bytes // profile['row_bytes'], MIN_CHUNK_ROWS, chunk_rows)
+
+    return {
+        'memory_limit': memory_limit,
+        'chunk_rows': chunk_rows,
+        'row_group_rows': row_group_rows,
+        'chunk_memory': int(chunk_rows * row_memory),
+    }
+
+
+def get_sort_buffer(uncompressed_bytes, memory_limit=None):
+    """ GNU sort buffer: the whole input if it fits in a quarter of the memory limit, bounded. """
+    memory_limit = memory_limit or get_memory_limit() or 4 * 1024**3
+    return clamp(min(uncompressed_bytes, memory_limit // 4), MIN_SORT_BUFFER, MAX_SORT_BUFFER)
+
+
+def get_sort_resource_option_text(uncompressed_bytes):
+    """ -S and --parallel for GNU sort, which otherwise sizes both from the host instead of the container. """
+    return f"-S {get_sort_buffer(uncompressed_bytes) // 1024}K --parallel={get_cpu_limit()}"
+
+
+def round_up(value, granularity):
+    return math.ceil(value / granularity) * granularity
+
+
+def recommend_resources(profile):
+    """
+    wkube resource requests for validating the profiled file: RAM for the
+    interpreter, a chunk of up to RECOMMENDED_CHUNK_ROWS rows and a sort
+    buffer holding the file where possible; local storage for input,
+    validated and sorted csv, sort temporaries and parquet.
+    """
+    uncompressed_bytes = profile['uncompressed_bytes']
+    sort_buffer = clamp(uncompressed_bytes, MIN_SORT_BUFFER, MAX_SORT_BUFFER)
+    chunk_rows = min(profile['estimated_rows'], RECOMMENDED_CHUNK_ROWS)
+    chunk_memory = int(chunk_rows * profile['row_memory'] * CHUNK_MEMORY_FACTOR)
+
+    return {
+        'required_ram': round_up(BASE_RAM + chunk_memory + sort_buffer, RAM_GRANULARITY),
+        'required_storage_local': round_up(profile['file_bytes'] + 4 * uncompressed_bytes, STORAGE_GRANULARITY),
+        'required_cores': 1,
+    }
+
+
+class AdaptiveChunkSize():
+    """
+    Rows per chunk of a streaming writer that shrinks under memory
+    pressure. Every `check_interval` rows `should_flush` compares the
+    resident memory with `high_water` of the memory limit; above it the
+    chunk is flushed early and later chunks are capped at half its length.
+    Readers taking the chunk size up front ask `get_rows` before every chunk.
+    """
+
+    def __init__(self, rows, *, memory_limit=None, high_water=0.8, min_rows=MIN_CHUNK_ROWS, check_interval=10_000):
+        self.rows = rows
+        self.memory_limit = memory_limit or get_memory_limit()
+        self.high_water = high_water
+        self.min_rows = min_rows
+        self.check_interval = check_interval
+        self.shrinks = 0
+
+    def is_under_pressure(self):
+        return bool(self.memory_limit) and get_resident_memory() > self.high_water * self.memory_limit
+
+    def shrink(self, chunk_rows):
+        self.rows = max(self.min_rows, chunk_rows // 2)
+        self.shrinks += 1
+        print(f"Memory pressure: chunks capped at {self.rows} rows")
+
+    def should_flush(self, chunk_rows):
+        if chunk_rows >= self.rows:
+            return True
+        if chunk_rows % self.check_interval or not self.is_under_pressure():
+            return False
+
+        self.shrink(chunk_rows)
+        return True
+
+    def get_rows(self):
+        if self.rows > self.min_rows and self.is_under_pressure():
+            self.shrink(self.rows)
+        return self.rows
@@ -0,0 +1,271 @@
+import io
+import os
+import time
+import socket
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+REMOTE_PREFIXES = ('http://', 'https://', 's3://')
+
+DEFAULT_CHUNK_BYTES = 8 * 1024**2
+DEFAULT_READ_AHEAD = 4
+# First request after opening or seeking, so header and sample reads stay small; later requests double up to the chunk size
+INITIAL_FETCH_BYTES = 64 * 1024
+RECEIVE_BUFFER_SIZE = 256 * 1024
+
+FETCH_RETRIES = 3
+RETRY_BACKOFF = 0.5
+# seconds without progress on a connection before a request fails (and is retried)
+REQUEST_TIMEOUT = 60
+# client errors worth a retry; others (e.g. 403 of an expired presigned url) fail right away
+RETRIED_CLIENT_ERRORS = (408, 429)
+
+
+def is_remote(location):
+    return location.startswith(REMOTE_PREFIXES)
+
+
+def join_location(base_url, filepath):
+    """ Object url of a bucket file path below INPUT_BASE_URL. """
+    return f"{base_url.rstrip('/')}/{filepath.lstrip('/')}"
+
+
+def is_retried(error):
+    if isinstance(error, urllib.error.HTTPError):
+        return not 400 <= error.code < 500 or error.code in RETRIED_CLIENT_ERRORS
+    return True
+
+
+def get_input_location(filepath, *, input_base_url=None, project_service=None):
+    """
+    Location a bucket file path is streamed from: below `input_base_url`
+    when given (credentials of s3 urls from the environment), otherwise
+    the download url the project service signs for the job, so the pod
+    needs no bucket credentials.
+    """
+    if input_base_url:
+        return join_location(input_base_url, filepath)
+
+    location = project_service.get_file_url_from_repo(filepath)
+    if not location:
+        raise ValueError(f"No download url for {filepath}")
+    return location
+
+
+class HttpFetcher():
+    """ Byte ranges of an http(s) url, e.g. a presigned bucket url or the local range server. """
+
+    def __init__(self, url):
+        self.url = url
+
+    def get_size(self):
+        # ranged GET instead of HEAD, since presigned urls are signed for GET only
+        request = urllib.request.Request(self.url, headers={'Range': 'bytes=0-0'})
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                if response.status == 206:
+                    size = (response.headers['Content-Range'] or '').split('/')[-1]
+                else:
+                    size = response.headers['Content-Length']
+        except urllib.error.HTTPError as error:
+            # empty object
+            if error.code != 416:
+                raise
+            size = (error.headers['Content-Range'] or '').split('/')[-1]
+
+        if not size or not size.isdigit():
+            raise ValueError(f"{self.url} does not report its size")
+        return int(size)
+
+    def fetch(self, start, end, cancelled=None):
+        """ Bytes [start, end); stops early (the result is discarded) once `cancelled` is set. """
+        request = urllib.request.Request(self.url, headers={'Range': f"bytes={start}-{end - 1}"})
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            if response.status != 206 and start > 0:
+                raise ValueError(f"{self.url} does not support range requests")
+
+            parts = []
+            remaining = end - start
+            while remaining > 0:
+                if cancelled and cancelled.is_set():
+                    return b''
+                part = response.read(min(RECEIVE_BUFFER_SIZE, remaining))
+                if not part:
+                    break
+                parts.append(part)
+                remaining -= len(part)
+            return b''.join(parts)
+
+
+class S3Fetcher():
+    """ Byte ranges of an s3 object (credentials and endpoint from the environment, as s3fs reads them). """
+
+    def __init__(self, location):
+        import s3fs
+        self.filesystem = s3fs.S3FileSystem()
+        self.path = location[len('s3://'):]
+
+    def get_size(self):
+        return self.filesystem.size(self.path)
+
+    def fetch(self, start, end, cancelled=None):
+        return self.filesystem.cat_file(self.path, start=start, end=end)
+
+
+def get_fetcher(location):
+    if location.startswith('s3://'):
+        return S3Fetcher(location)
+    return HttpFetcher(location)
+
+
+class RangedFile(io.RawIOBase):
+    """
+    Seekable, read only file over ranged requests. Sequential reads keep
+    `read_ahead` requests in flight, so parsing starts with the first chunk
+    and overlaps the transfer of the next ones. Requests start small and
+    double up to `chunk_bytes`, so reading a header or a sample does not
+    pull megabytes. A seek outside the fetched window cancels the read-ahead
+    and starts over with one small request.
+    """
+
+    def __init__(self, location, *, chunk_bytes=DEFAULT_CHUNK_BYTES, read_ahead=DEFAULT_READ_AHEAD):
+        self.location = location
+        self.fetcher = get_fetcher(location)
+        self.size = self.fetcher.get_size()
+        self.chunk_bytes = chunk_bytes
+        self.read_ahead = read_ahead
+
+        self.executor = ThreadPoolExecutor(max_workers=max(1, read_ahead))
+        self.position = 0
+        self.buffer = b''
+        self.buffer_start = 0
+        # chunk start -> future, in request order
+        self.pending = {}
+        self.next_start = 0
+        self.next_bytes = INITIAL_FETCH_BYTES
+        self.cancelled = threading.Event()
+
+        self.requests = 0
+        self.bytes_fetched = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        self.position = max(0, self.position)
+        return self.position
+
+    def fetch(self, start, end, cancelled=None):
+        for attempt in range(FETCH_RETRIES):
+            try:
+                data = self.fetcher.fetch(start, end, cancelled)
+                # a short response is a dropped connection, not the end of the file
+                if len(data) < end - start and not (cancelled and cancelled.is_set()):
+                    raise ConnectionError(f"{self.location}: got {len(data)} of {end - start} bytes at {start}")
+                break
+            except (urllib.error.URLError, ConnectionError, TimeoutError, socket.timeout) as error:
+                if attempt == FETCH_RETRIES - 1 or not is_retried(error):
+                    raise
+                time.sleep(RETRY_BACKOFF * 2**attempt)
+
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        return data
+
+    def schedule(self):
+        """ Keeps read_ahead requests in flight from next_start on. """
+        while len(self.pending) < self.read_ahead and self.next_start < self.size:
+            end = min(self.next_start + self.next_bytes, self.size)
+            self.pending[self.next_start] = self.executor.submit(self.fetch, self.next_start, end, self.cancelled)
+            self.next_start = end
+            self.next_bytes = min(self.next_bytes * 2, self.chunk_bytes)
+
+    def drop_pending(self):
+        self.cancelled.set()
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+        self.cancelled = threading.Event()
+
+    def fill(self):
+        """ Makes the buffer cover the current position. """
+        buffer_end = self.buffer_start + len(self.buffer)
+
+        if self.position not in self.pending:
+            if not (self.buffer and self.position == buffer_end == self.next_start):
+                # random access: one small request, streaming starts if reads continue past it
+                self.drop_pending()
+                self.buffer = self.fetch(self.position, min(self.position + INITIAL_FETCH_BYTES, self.size))
+                self.buffer_start = self.position
+                self.next_start = self.position + len(self.buffer)
+                self.next_bytes = min(INITIAL_FETCH_BYTES * 2, self.chunk_bytes)
+                return
+            self.schedule()
+
+        self.buffer = self.pending.pop(self.position).result()
+        self.buffer_start = self.position
+        self.schedule()
+
+    def readinto(self, target):
+        if self.position >= self.size or not len(target):
+            return 0
+
+        if not self.buffer_start <= self.position < self.buffer_start + len(self.buffer):
+            self.fill()
+
+        offset = self.position - self.buffer_start
+        data = self.buffer[offset:offset + len(target)]
+        target[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.drop_pending()
+            self.executor.shutdown(wait=False)
+        super().close()
+
+
+def open_location(location, *, chunk_bytes=DEFAULT_CHUNK_BYTES, read_ahead=DEFAULT_READ_AHEAD):
+    """ Binary file object of a local path or a streamed http(s) / s3 location. """
+    if not is_remote(location):
+        return open(location, 'rb')
+    return io.BufferedReader(
+        RangedFile(location, chunk_bytes=chunk_bytes, read_ahead=read_ahead),
+        buffer_size=1024**2
+    )
+
+
+def get_size(location):
+    if not is_remote(location):
+        return os.path.getsize(location)
+    return get_fetcher(location).get_size()
+
+
+def stream_to_file(location, target_filepath, **options):
+    """ Copies a location to a local file chunk by chunk (read-ahead overlaps the writes); returns bytes written. """
+    written = 0
+    with open_location(location, **options) as source, open(target_filepath, 'wb') as target:
+        while True:
+            data = source.read(DEFAULT_CHUNK_BYTES)
+            if not data:
+                break
+            target.write(data)
+            written += len(data)
+    return written
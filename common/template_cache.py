@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import hashlib
+
+TRUE_VALUES = ['True', 'true', '1', 'TRUE']
+
+
+def get_template_revision(dataset_template_details):
+    """ Revision reported by the gateway, or a hash of the rules when there is none. """
+    for key in ['revision', 'updated_at', 'modified_at']:
+        if dataset_template_details.get(key) is not None:
+            return str(dataset_template_details[key])
+
+    return hashlib.sha256(
+        json.dumps(dataset_template_details.get('rules'), sort_keys=True).encode()
+    ).hexdigest()
+
+
+class TemplateRulesCache():
+    """
+    Dataset template details keyed by template id and revision.
+
+    Entries live in memory (shared by every service of the job process) and
+    optionally on disk in `cache_directory` for later jobs. An entry older
+    than `ttl` seconds is refetched; if the revision did not change, the
+    structures derived from its rules (see get_derived) are kept.
+    """
+
+    entries = {}
+    invalidated_once = False
+
+    def __init__(self, project_service, *, cache_directory=None, ttl=3600):
+        self.project_service = project_service
+        self.cache_directory = cache_directory
+        self.ttl = ttl
+
+        if self.cache_directory:
+            os.makedirs(self.cache_directory, exist_ok=True)
+
+    def get_cache_filepath(self, dataset_template_id):
+        return os.path.join(self.cache_directory, f"{dataset_template_id}.json")
+
+    def read_disk_entry(self, dataset_template_id):
+        if not self.cache_directory:
+            return None
+
+        cache_filepath = self.get_cache_filepath(dataset_template_id)
+        if not os.path.exists(cache_filepath):
+            return None
+
+        with open(cache_filepath) as cache_file:
+            entry = json.load(cache_file)
+        entry['derived'] = {}
+        return entry
+
+    def write_disk_entry(self, dataset_template_id, entry):
+        if not self.cache_directory:
+            return
+
+        cache_filepath = self.get_cache_filepath(dataset_template_id)
+        with open(f"{cache_filepath}.tmp", 'w') as cache_file:
+            json.dump(
+                {key: value for key, value in entry.items() if key != 'derived'},
+                cache_file
+            )
+        os.replace(f"{cache_filepath}.tmp", cache_filepath)
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def get_entry(self, dataset_template_id):
+        key = str(dataset_template_id)
+
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.read_disk_entry(key)
+            if entry is not None:
+                self.entries[key] = entry
+
+        if entry is not None and self.is_fresh(entry):
+            return entry
+
+        details = self.project_service.get_dataset_template_details(dataset_template_id)
+        revision = get_template_revision(details)
+
+        if entry is not None and entry['revision'] == revision:
+            entry['details'] = details
+            entry['fetched_at'] = time.time()
+        else:
+            entry = {
+                'details': details,
+                'revision': revision,
+                'fetched_at': time.time(),
+                'derived': {},
+            }
+
+        self.entries[key] = entry
+        self.write_disk_entry(key, entry)
+        return entry
+
+    def get_dataset_template_details(self, dataset_template_id):
+        return self.get_entry(dataset_template_id)['details']
+
+    def get_derived(self, dataset_template_id, name, builder):
+        """ builder(rules) computed once per template revision and name. """
+        entry = self.get_entry(dataset_template_id)
+        if name not in entry['derived']:
+            entry['derived'][name] = builder(entry['details'].get('rules'))
+        return entry['derived'][name]
+
+    def invalidate(self, dataset_template_id=None):
+        """ Drops one template (or every template) from memory and disk. """
+        keys = [str(dataset_template_id)] if dataset_template_id is not None else list(self.entries)
+
+        if dataset_template_id is None and self.cache_directory:
+            keys += [
+                filename[:-len('.json')] for filename in os.listdir(self.cache_directory)
+                if filename.endswith('.json')
+            ]
+
+        for key in set(keys):
+            self.entries.pop(key, None)
+            if self.cache_directory and os.path.exists(self.get_cache_filepath(key)):
+                os.remove(self.get_cache_filepath(key))
+
+
+def get_template_rules_cache(project_service):
+    """
+    TemplateRulesCache configured from TEMPLATE_CACHE_TTL (seconds, default
+    3600), TEMPLATE_CACHE_DIRECTORY (optional, persists across jobs) and
+    TEMPLATE_CACHE_INVALIDATE=True (drop cached templates once per job
+    process, so files of the job still share the refetched template).
+    """
+    template_cache = TemplateRulesCache(
+        project_service,
+        cache_directory=os.environ.get('TEMPLATE_CACHE_DIRECTORY'),
+        ttl=float(os.environ.get('TEMPLATE_CACHE_TTL', 3600)),
+    )
+
+    if os.environ.get('TEMPLATE_CACHE_INVALIDATE') in TRUE_VALUES and not TemplateRulesCache.invalidated_once:
+        template_cache.invalidate()
+        TemplateRulesCache.invalidated_once = True
+
+    return template_cache
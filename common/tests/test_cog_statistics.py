@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip('rasterio')
+pytest.importorskip('rio_cogeo')
+
+from rasterio.transform import from_origin
+
+from common import cog
+from common.cog import compute_band_statistics
+
+PERCENTILES = [f"p{percentile}" for percentile in cog.STATISTICS_PERCENTILES]
+
+
+def write_tif(path, data, nodata=None):
+    with rasterio.open(
+        path, 'w', driver='GTiff', width=data.shape[1], height=data.shape[0], count=1, dtype=data.dtype,
+        crs='EPSG:4326', transform=from_origin(0, 10, 0.01, 0.01), tiled=True, blockxsize=256, blockysize=256,
+        nodata=nodata,
+    ) as dst:
+        dst.write(data, 1)
+    return path
+
+
+def get_statistics(path, nodata=None, **kwargs):
+    with rasterio.open(path) as src:
+        return compute_band_statistics(src, 1, nodata, **kwargs)
+
+
+def test_integer_statistics(tmp_path):
+    data = np.random.default_rng(0).integers(0, 200, (700, 600)).astype('uint8')
+    statistics = get_statistics(write_tif(tmp_path / 'band.tif', data, 0), 0, threads=3)
+
+    values = data[data != 0].astype(np.float64)
+    assert statistics['count'] == values.size
+    assert (statistics['min'], statistics['max']) == (values.min(), values.max())
+    assert statistics['mean'] == pytest.approx(values.mean())
+    assert statistics['std'] == pytest.approx(values.std())
+    assert [statistics['percentiles'][name] for name in PERCENTILES] == list(
+        np.percentile(values, cog.STATISTICS_PERCENTILES, method='inverted_cdf')
+    )
+    assert statistics['histogram']['counts'] == list(np.histogram(values, 256, (values.min(), values.max()))[0])
+
+
+def test_float_statistics_with_outliers(tmp_path, monkeypatch):
+    data = np.random.default_rng(0).normal(5, 2, (700, 600)).astype('float32')
+    data[3, 4], data[500, 500] = 1e6, -1e5
+    path = write_tif(tmp_path / 'band.tif', data)
+    values = data.astype(np.float64).ravel()
+
+    reads = []
+    read_valid_data = cog.read_valid_data
+    monkeypatch.setattr(cog, 'read_valid_data', lambda *args: reads.append(args[3]) or read_valid_data(*args))
+
+    statistics = get_statistics(path, threads=2)
+
+    # the range sample and a single pass over the statistics windows
+    with rasterio.open(path) as src:
+        sampled = len(reads) - len(cog.get_statistics_windows(src, 1))
+    assert 0 < sampled <= cog.RANGE_SAMPLE_BLOCKS
+    assert (statistics['min'], statistics['max']) == (-1e5, 1e6)
+    for name, expected in zip(PERCENTILES, np.percentile(values, cog.STATISTICS_PERCENTILES)):
+        assert statistics['percentiles'][name] == pytest.approx(expected, abs=1e-3)
+    assert sum(statistics['histogram']['counts']) == values.size
+
+
+def test_float_statistics_second_pass(tmp_path, monkeypatch, capsys):
+    data = np.random.default_rng(0).normal(5, 2, (700, 600)).astype('float32')
+    data[:, :3] = 1e3
+    path = write_tif(tmp_path / 'band.tif', data)
+
+    monkeypatch.setattr(cog, 'MAX_RANGE_OUTLIERS', 0)
+    statistics = get_statistics(path)
+
+    assert 'reading it again' in capsys.readouterr().out
+    values = data.astype(np.float64).ravel()
+    assert statistics['histogram']['counts'] == list(np.histogram(values, 256, (values.min(), values.max()))[0])
+    for name, expected in zip(PERCENTILES, np.percentile(values, cog.STATISTICS_PERCENTILES)):
+        assert statistics['percentiles'][name] == pytest.approx(expected, abs=(values.max() - values.min()) / 65536)
+
+
+def test_statistics_without_valid_pixels(tmp_path):
+    path = write_tif(tmp_path / 'band.tif', np.full((300, 300), -9999, dtype='float32'), -9999)
+
+    assert get_statistics(path, -9999) is None
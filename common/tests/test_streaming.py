@@ -0,0 +1,152 @@
+import os
+import time
+import random
+import threading
+import urllib.error
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler, BaseHTTPRequestHandler
+
+import pytest
+
+from common import streaming
+from common.project_service import LocalAjobCliService
+from common.range_server import LocalRangeServer
+from common.streaming import HttpFetcher, RangedFile, get_input_location, get_size, open_location, stream_to_file
+
+
+@pytest.fixture
+def content():
+    return random.Random(0).randbytes(300 * 1024 + 17)
+
+
+@pytest.fixture
+def server(tmp_path, content):
+    (tmp_path / 'data.csv').write_bytes(content)
+    (tmp_path / 'empty.csv').write_bytes(b'')
+    with LocalRangeServer(str(tmp_path)) as range_server:
+        yield range_server
+
+
+def test_sequential_read(server, content):
+    location = f"{server.url}/data.csv"
+    assert get_size(location) == len(content)
+
+    ranged_file = RangedFile(location, chunk_bytes=100 * 1024, read_ahead=2)
+    with open_location(location) as streamed_file:
+        assert streamed_file.read() == content
+
+    parts = []
+    while True:
+        part = ranged_file.read(10000)
+        if not part:
+            break
+        parts.append(part)
+    ranged_file.close()
+
+    assert b''.join(parts) == content
+    assert ranged_file.requests > 1
+
+
+def test_seek(server, content):
+    with open_location(f"{server.url}/data.csv", chunk_bytes=64 * 1024) as streamed_file:
+        for offset, length in [(250000, 100), (5, 70000), (len(content) - 10, 100), (0, 1)]:
+            streamed_file.seek(offset)
+            assert streamed_file.read(length) == content[offset:offset + length]
+
+        streamed_file.seek(-3, os.SEEK_END)
+        assert streamed_file.read() == content[-3:]
+
+
+def test_empty_file(server, tmp_path):
+    location = f"{server.url}/empty.csv"
+    assert get_size(location) == 0
+    assert stream_to_file(location, str(tmp_path / 'copy.csv')) == 0
+
+
+def test_short_response_raises(server, monkeypatch):
+    monkeypatch.setattr(streaming, 'RETRY_BACKOFF', 0)
+
+    ranged_file = RangedFile(f"{server.url}/data.csv")
+    ranged_file.fetcher.fetch = lambda start, end, cancelled=None: b''
+
+    with pytest.raises(ConnectionError):
+        ranged_file.read(10)
+    ranged_file.close()
+
+
+def test_server_without_ranges(tmp_path, content):
+    (tmp_path / 'data.csv').write_bytes(content)
+    plain_server = ThreadingHTTPServer(
+        ('127.0.0.1', 0),
+        partial(SimpleHTTPRequestHandler, directory=str(tmp_path))
+    )
+    threading.Thread(target=plain_server.serve_forever, daemon=True).start()
+    location = f"http://127.0.0.1:{plain_server.server_address[1]}/data.csv"
+
+    try:
+        assert get_size(location) == len(content)
+        with RangedFile(location) as ranged_file:
+            # a full response serves the start of the file
+            assert ranged_file.read(1000) == content[:1000]
+            ranged_file.seek(200000)
+            with pytest.raises(ValueError):
+                ranged_file.read(10)
+    finally:
+        plain_server.shutdown()
+        plain_server.server_close()
+
+
+def test_get_input_location(tmp_path):
+    project_service = LocalAjobCliService(str(tmp_path))
+
+    assert get_input_location('project/data.csv', input_base_url='http://bucket/') == 'http://bucket/project/data.csv'
+    assert get_input_location('project/data.csv', project_service=project_service) == \
+        os.path.join(str(tmp_path), 'bucket', 'project/data.csv')
+
+
+class SizelessHandler(BaseHTTPRequestHandler):
+    """ Full responses without Content-Length. """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b'data')
+
+
+@pytest.fixture
+def sizeless_server():
+    sizeless_server = ThreadingHTTPServer(('127.0.0.1', 0), SizelessHandler)
+    threading.Thread(target=sizeless_server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{sizeless_server.server_address[1]}"
+    sizeless_server.shutdown()
+    sizeless_server.server_close()
+
+
+def test_unknown_size(sizeless_server):
+    with pytest.raises(ValueError, match='size'):
+        get_size(f"{sizeless_server}/data.csv")
+
+
+def test_client_errors_are_not_retried(server, monkeypatch):
+    monkeypatch.setattr(streaming, 'RETRY_BACKOFF', 60)
+
+    ranged_file = RangedFile(f"{server.url}/data.csv")
+    ranged_file.fetcher.url = f"{server.url}/missing.csv"
+
+    started = time.perf_counter()
+    with pytest.raises(urllib.error.HTTPError):
+        ranged_file.read(10)
+    assert time.perf_counter() - started < 5
+    ranged_file.close()
+
+
+def test_stalled_connection_times_out(tmp_path, content, monkeypatch):
+    monkeypatch.setattr(streaming, 'REQUEST_TIMEOUT', 0.2)
+    (tmp_path / 'data.csv').write_bytes(content)
+
+    with LocalRangeServer(str(tmp_path), latency=2) as stalled_server:
+        with pytest.raises(OSError):
+            HttpFetcher(f"{stalled_server.url}/data.csv").fetch(0, 10)
@@ -1,10 +1,15 @@
 import os
 from service import CSVRegionalTimeseriesMergeService 
+from common.streaming import join_location
 
 input_directory = 'inputs'
 
 filepaths = os.environ.get('selected_filenames', '').split(',')
 
+# Inputs are streamed from <INPUT_BASE_URL>/<filepath> instead of read from inputs/ when set,
+# or with STREAM_INPUT from download urls of the project service
+input_base_url = os.environ.get('INPUT_BASE_URL')
+
 print(f"_____________Merging following files: {filepaths} _____________")
 
 merged_filename = os.environ['merged_filename']
@@ -13,6 +18,11 @@ csv_regional_timeseries_merge_service = CSVRegionalTimeseriesMergeService(
     filename=merged_filename,
     files=[f"inputs/{filepath.split('/')[-1]}" for filepath in filepaths],
     job_token=os.environ.get('ACC_JOB_TOKEN'),
-    filepaths=filepaths
+    filepaths=filepaths,
+    execution_backend=os.environ.get('EXECUTION_BACKEND', 'python'),
+    deduplicate=os.environ.get('MERGE_DEDUPLICATE') in ['True', 'true', '1', 'TRUE'],
+    output_compression=os.environ.get('OUTPUT_COMPRESSION', 'none'),
+    input_locations=[join_location(input_base_url, filepath) for filepath in filepaths] if input_base_url else None,
+    stream_inputs=os.environ.get('STREAM_INPUT') in ['True', 'true', '1', 'TRUE'],
 )
 csv_regional_timeseries_merge_service()
\ No newline at end of file
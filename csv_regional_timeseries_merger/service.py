@@ -1,11 +1,27 @@
 import io
 import os
+import csv
+import asyncio
 import json
 import uuid
 import pyarrow as pa
 import pyarrow.parquet as pq
 import pandas as pd
-from accli import AjobCliService
+from typing import Optional
+from common.project_service import get_project_service
+from common.async_project_service import get_async_project_service
+from common.duckdb_backend import get_duckdb_workspace, quote_identifier, quote_literal, read_csv_sql
+from common.profiling import JobProfiler
+from common.resources import DATAFRAME_CHUNK_MEMORY_FACTOR, AdaptiveChunkSize, profile_csv_input, plan_chunks
+from common.compression import (
+    detect_compression,
+    open_input,
+    decompress_file,
+    compress_seekable,
+    is_frame_concatenable,
+    concatenate_seekable,
+)
+from common.streaming import get_input_location
 
 
 class CSVRegionalTimeseriesMergeService:
@@ -15,18 +31,20 @@ class CSVRegionalTimeseriesMergeService:
         filename: str,
         files: list[str],
         job_token,
-        filepaths: list[str]
+        filepaths: list[str],
+        execution_backend='python',
+        deduplicate=False,
+        output_compression='none',
+        input_locations: Optional[list[str]]=None,
+        stream_inputs=False
     ):
         
         if not filename:
             raise ValueError("Filename for merged file is required.")
 
 
-        self.project_service = AjobCliService(
-            job_token,
-            server_url=os.environ.get('ACC_JOB_GATEWAY_SERVER'),
-            verify_cert=False
-        )
+        self.job_token = job_token
+        self.project_service = get_project_service(job_token)
 
         self.template_rules = None
 
@@ -34,20 +52,44 @@ class CSVRegionalTimeseriesMergeService:
 
         self.files = files
         self.filepaths = filepaths
+
+        # http(s) or s3 urls the inputs are streamed from (see common/streaming.py); `files` are then
+        # only written where a local copy is needed (the merged file is built in place of the first)
+        if input_locations and len(input_locations) != len(files):
+            raise ValueError("Every input requires a location.")
+        self.input_locations = input_locations
+        if stream_inputs and not input_locations:
+            # download urls of `filepaths` signed by the project service
+            self.input_locations = [
+                get_input_location(filepath, project_service=self.project_service) for filepath in filepaths
+            ]
+
+        # 'duckdb' merges, sorts and writes the parquet out-of-core (see merge_with_duckdb)
+        if execution_backend not in ['python', 'duckdb']:
+            raise ValueError(f"Unknown execution backend: {execution_backend}")
+        if deduplicate and execution_backend != 'duckdb':
+            raise ValueError("Deduplication requires the duckdb execution backend.")
+        self.execution_backend = execution_backend
+        self.deduplicate = deduplicate
+
+        # 'zstd' writes the merged csv as seekable zstd (see common/compression.py)
+        if output_compression not in ['none', 'zstd']:
+            raise ValueError(f"Unknown output compression: {output_compression}")
+        self.output_compression = output_compression
+
+        self.profiler = JobProfiler(f"{self.output_filename}_merge")
     
-    def check_input_files(self):
+    async def check_input_files(self, project_service):
         
         if len(self.files) < 2:
             raise ValueError("Argument files should be at least two items.")
         
-        first_file_type_id = self.project_service.get_filename_dataset_type(
-            self.filepaths[0]
-        )
+        first_file_type_id, *other_file_type_ids = await asyncio.gather(*[
+            project_service.get_filename_dataset_type(filepath)
+            for filepath in self.filepaths
+        ])
         
-        for filepath in self.filepaths[1:]:
-            other_file_type_id = self.project_service.get_filename_dataset_type(
-                filepath
-            )
+        for other_file_type_id in other_file_type_ids:
 
             if (first_file_type_id != None) and (first_file_type_id != other_file_type_id):
                 raise ValueError(
@@ -66,10 +108,21 @@ class CSVRegionalTimeseriesMergeService:
         return breaks
 
         
-    def get_merged_validated_metadata(self):
-        first_validation_details = self.project_service.get_filename_validation_details(self.filepaths[0])
+    async def fetch_validation_details(self, project_service):
+        """ Validation details of every input, then the template of the first one. """
+        validation_details = await asyncio.gather(*[
+            project_service.get_filename_validation_details(filepath)
+            for filepath in self.filepaths
+        ])
+
+        dataset_template_details = await project_service.get_dataset_template_details(
+            validation_details[0]['dataset_template_id']
+        )
+
+        return validation_details, dataset_template_details
 
-        dataset_template_details = self.project_service.get_dataset_template_details(first_validation_details['dataset_template_id'])
+    def get_merged_validated_metadata(self, validation_details, dataset_template_details):
+        first_validation_details = validation_details[0]
 
         rules =  dataset_template_details.get('rules')
 
@@ -81,8 +134,11 @@ class CSVRegionalTimeseriesMergeService:
 
         first_validation_metadata = first_validation_details['validation_metadata']
 
-        for filepath in self.filepaths[1:]:
-            next_validation_metadata = self.project_service.get_filename_validation_details(filepath)['validation_metadata']
+        # Series checks of single inputs do not hold for the merged file
+        first_validation_metadata.pop('series_checks', None)
+
+        for filepath, next_validation_details in zip(self.filepaths[1:], validation_details[1:]):
+            next_validation_metadata = next_validation_details['validation_metadata']
 
             for key in first_validation_metadata:
 
@@ -112,55 +168,212 @@ class CSVRegionalTimeseriesMergeService:
         return first_validation_metadata, first_validation_details['dataset_template_id']
 
     
-    def create_associated_parquet(self, merged_filepath):
-        chunksize = 100_000
+    def get_parquet_chunks(self, reader, chunk_plan):
+        """ Chunks of the merged csv, halved under memory pressure (checked before every chunk). """
+        chunk_size = AdaptiveChunkSize(chunk_plan['chunk_rows'])
+        while True:
+            try:
+                yield reader.get_chunk(chunk_size.get_rows())
+            except StopIteration:
+                return
 
+    def create_associated_parquet(self, merged_filepath):
         value_dimension = self.rules['root_schema_declarations']['value_dimension']
         time_dimension = self.rules['root_schema_declarations']['time_dimension']
 
         parquet_writer = None
 
-        for i, chunk in enumerate(pd.read_csv(merged_filepath, chunksize=chunksize)):
-            
-            if value_dimension in chunk.columns:
-                chunk[value_dimension] = chunk[value_dimension].astype('float32')
+        with self.profiler.stage('input_profiling'):
+            chunk_plan = plan_chunks(profile_csv_input(merged_filepath), memory_factor=DATAFRAME_CHUNK_MEMORY_FACTOR)
+        self.profiler.metadata['chunk_plan'] = chunk_plan
 
-            if time_dimension in chunk.columns:
-                chunk[time_dimension] = chunk[time_dimension].astype('int32')
+        # the merged file may be seekable zstd
+        with open_input(merged_filepath) as merged_file, pd.read_csv(merged_file, iterator=True) as reader:
+            for i, chunk in enumerate(self.get_parquet_chunks(reader, chunk_plan)):
 
-            for col in chunk.columns:
-                if col != value_dimension:
-                    chunk[col] = chunk[col].astype('category')
+                if value_dimension in chunk.columns:
+                    chunk[value_dimension] = chunk[value_dimension].astype('float32')
 
-            table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if time_dimension in chunk.columns:
+                    chunk[time_dimension] = chunk[time_dimension].astype('int32')
 
-            if parquet_writer is None:
-                parquet_writer = pq.ParquetWriter(
-                    self.files[0] + '.parquet',
-                    table.schema,
-                    compression='snappy'
-                )
+                for col in chunk.columns:
+                    if col != value_dimension:
+                        chunk[col] = chunk[col].astype('category')
+
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+
+                # pandas category codes are int8 or int16 depending on the categories of a chunk
+                table = table.cast(pa.schema([
+                    pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type))
+                    if pa.types.is_dictionary(field.type) else field
+                    for field in table.schema
+                ]))
+
+                if parquet_writer is None:
+                    parquet_writer = pq.ParquetWriter(
+                        self.files[0] + '.parquet',
+                        table.schema,
+                        compression='snappy'
+                    )
 
-            parquet_writer.write_table(table)
+                parquet_writer.write_table(table, row_group_size=chunk_plan['row_group_rows'])
+                self.profiler.stage('parquet_writing').rows += len(chunk)
 
         # Finalize writer
         if parquet_writer:
             parquet_writer.close()
 
 
+    def merge_with_duckdb(self):
+        """
+        Replaces concatenation and create_associated_parquet: all inputs are
+        read by DuckDB (spilling to disk beyond its memory limit), optionally
+        deduplicated, sorted like the validator sorts and written back to the
+        first file, plus its parquet.
+        """
+        time_dimension = self.rules['root_schema_declarations']['time_dimension']
+        value_dimension = self.rules['root_schema_declarations']['value_dimension']
+
+        if self.input_locations:
+            self.download_inputs()
+
+        # DuckDB reads plain, gzip and zstd, one compression for all inputs
+        compressions = {detect_compression(file) for file in self.files}
+        if len(compressions) == 1 and compressions <= {None, 'gzip', 'zstd'}:
+            compression = compressions.pop()
+        else:
+            self.decompress_inputs()
+            compression = None
+
+        with open_input(self.files[0], 'r', encoding='utf-8-sig') as first_file:
+            fieldnames = next(csv.reader(first_file))
+
+        order_by = ', '.join(
+            [
+                f"TRY_CAST({quote_identifier(name)} AS DOUBLE)" if name == time_dimension else quote_identifier(name)
+                for name in fieldnames if name != value_dimension
+            ] + [quote_identifier(value_dimension)]
+        )
+
+        parquet_columns = []
+        for name in fieldnames:
+            if name == time_dimension:
+                parquet_columns.append(f"CAST({quote_identifier(name)} AS INTEGER) AS {quote_identifier(name)}")
+            elif name == value_dimension:
+                parquet_columns.append(f"CAST({quote_identifier(name)} AS FLOAT) AS {quote_identifier(name)}")
+            else:
+                parquet_columns.append(quote_identifier(name))
+
+        merged_filepath = f"{self.files[0]}.merged"
+
+        with get_duckdb_workspace() as workspace:
+            with self.profiler.stage('duckdb_load') as load_stage:
+                workspace.execute(
+                    f"CREATE TABLE merged AS SELECT {'DISTINCT ' if self.deduplicate else ''}* "
+                    f"FROM {read_csv_sql(self.files, fieldnames, compression=compression)}"
+                )
+                load_stage.rows += workspace.execute("SELECT count(*) FROM merged").fetchone()[0]
+            load_stage.bytes += sum(os.path.getsize(file) for file in self.files)
+
+            with self.profiler.stage('sort'):
+                workspace.execute(
+                    f"COPY (SELECT * FROM merged ORDER BY {order_by}) "
+                    f"TO {quote_literal(merged_filepath)} (HEADER, DELIMITER ',')"
+                )
+
+            with self.profiler.stage('parquet_writing') as parquet_writing:
+                workspace.execute(
+                    f"COPY (SELECT {', '.join(parquet_columns)} FROM merged ORDER BY {order_by}) "
+                    f"TO {quote_literal(self.files[0] + '.parquet')} (FORMAT parquet, COMPRESSION snappy)"
+                )
+            parquet_writing.rows += load_stage.rows
+
+        if self.output_compression == 'zstd':
+            with self.profiler.stage('compression') as compression_stage:
+                compress_seekable(merged_filepath, self.files[0])
+            compression_stage.bytes += os.path.getsize(merged_filepath)
+            os.remove(merged_filepath)
+        else:
+            os.replace(merged_filepath, self.files[0])
+
+    def upload_job_output(self, local_file_path):
+        with open(local_file_path, "rb") as file_stream:
+            return self.project_service.add_filestream_as_job_output(
+                os.path.basename(local_file_path),
+                file_stream,
+            )
+
     def __call__(self):
-        self.check_input_files()
+        self.profiler.start()
+        try:
+            self.merge_and_register()
+        finally:
+            self.profiler.finish(upload=self.upload_job_output)
+
+    def download_inputs(self):
+        """ Local plain copies of streamed inputs, for readers that need files (DuckDB). """
+        for location, file in zip(self.input_locations, self.files):
+            with self.profiler.stage('download') as download:
+                download.bytes += decompress_file(location, file)
+
+    def decompress_inputs(self):
+        """ Decompresses gzip, zstd and bz2 inputs in place, so they concatenate as plain csv. """
+        for file in self.files:
+            if detect_compression(file):
+                with self.profiler.stage('decompression') as decompression:
+                    decompression.bytes += decompress_file(file, f"{file}.plain")
+                os.replace(f"{file}.plain", file)
+
+    def compress_merged_file(self):
+        merged_filepath = self.files[0]
+        with self.profiler.stage('compression') as compression:
+            compress_seekable(merged_filepath, f"{merged_filepath}.zst")
+        compression.bytes += os.path.getsize(merged_filepath)
+        os.replace(f"{merged_filepath}.zst", merged_filepath)
+
+    def create_merged_file(self):
+        """
+        Merged csv in place of the first input. Seekable zstd inputs (as
+        written with OUTPUT_COMPRESSION=zstd) are concatenated frame by frame
+        without recompressing when the output is zstd too; otherwise inputs
+        are decompressed, concatenated and optionally compressed. Streamed
+        inputs are decompressed while they are concatenated.
+        """
+        input_locations = self.input_locations or self.files
+
+        if self.output_compression == 'zstd' and is_frame_concatenable(input_locations):
+            merged_filepath = f"{self.files[0]}.merged"
+            with self.profiler.stage('frame_concatenation') as frame_concatenation:
+                frame_concatenation.bytes += concatenate_seekable(input_locations, merged_filepath)
+            os.replace(merged_filepath, self.files[0])
+            return
+
+        if not self.input_locations:
+            self.decompress_inputs()
+        self.concatenate_files()
 
+        if self.output_compression == 'zstd':
+            self.compress_merged_file()
+
+    def concatenate_files(self):
         first_downloaded_filepath = self.files[0]
 
-        for file in self.files[1:]:
+        concatenation = self.profiler.stage('concatenation')
+
+        if self.input_locations:
+            # the first streamed input becomes the merged file
+            with concatenation:
+                concatenation.bytes += decompress_file(self.input_locations[0], first_downloaded_filepath)
+
+        for file in (self.input_locations or self.files)[1:]:
 
             possible_line_breaks = self.get_possible_file_line_break(first_downloaded_filepath)
 
             next_downloaded_filepath = file
 
             with open(first_downloaded_filepath, "ab") as merged_file:
-                with open(next_downloaded_filepath, 'rb') as being_merged_file:
+                with open_input(next_downloaded_filepath) as being_merged_file:
                     
                     if not set([b'\n', b'\r\n', b'\r', b'\n\r']).intersection(set(possible_line_breaks)):
                         dat = '\n'
@@ -169,56 +382,105 @@ class CSVRegionalTimeseriesMergeService:
                     # Skip the first line of the being_merged_file
                     first_line = being_merged_file.readline()
 
-                    while True:
-                        dat = being_merged_file.read(1024**2)
-                        if not dat:
-                            break
-                        merged_file.write(dat)
+                    with concatenation:
+                        while True:
+                            dat = being_merged_file.read(1024**2)
+                            if not dat:
+                                break
+                            merged_file.write(dat)
+                            concatenation.bytes += len(dat)
+
+    def merge_and_register(self):
+        asyncio.run(self.merge_and_register_concurrently())
+
+    async def merge_and_register_concurrently(self):
+        """
+        Independent steps overlap: validation details lookups run while
+        files are concatenated, and the merged csv is uploaded while its
+        parquet is written. Registration waits for all. Input checks finish
+        before concatenation starts, as it appends to the first input.
+        """
+        loop = asyncio.get_running_loop()
 
-                
         merge_only = True if os.environ.get('MERGE_ONLY') in ['True', 'true', '1', 'TRUE'] else False
-        
-        if merge_only:
-            print('Merge complete. Validation of merge not registered in server as MERGE_ONLY is set.')
-            return
 
-        validation_metadata, dataset_template_id = self.get_merged_validated_metadata()
+        # MERGE_ONLY never fetches the template, so it keeps plain concatenation
+        merge_with_duckdb = self.execution_backend == 'duckdb' and not merge_only
 
+        async with get_async_project_service(self.job_token) as project_service:
 
-        self.create_associated_parquet(first_downloaded_filepath)
+            async def check():
+                with self.profiler.stage('input_check'):
+                    await self.check_input_files(project_service)
 
-        with open(first_downloaded_filepath, "rb") as file_stream:
-            uploaded_bucket_object_id = self.project_service.add_filestream_as_job_output(
-                f"{self.output_filename}.csv",
-                file_stream,
-            )
+            async def fetch():
+                if merge_only:
+                    return None
+                with self.profiler.stage('metadata_fetch'):
+                    return await self.fetch_validation_details(project_service)
 
-        with open(f"{first_downloaded_filepath}.parquet", "rb") as file_stream:
-            uploaded_parquet_bucket_object_id = self.project_service.add_filestream_as_validation_supporter(
-                f"job-outputs/{os.environ['JOB_ID']}/{self.output_filename}.csv.parquet",
-                file_stream,
-            )
+            await check()
 
-        # Monkey patch serializer
-        def monkey_patched_json_encoder_default(encoder, obj):
-            if isinstance(obj, set):
-                return list(obj)
-            return json.JSONEncoder.default(encoder, obj)
+            if merge_with_duckdb:
+                fetched = await fetch()
+            else:
+                fetched, _ = await asyncio.gather(
+                    fetch(),
+                    loop.run_in_executor(None, self.create_merged_file),
+                )
 
-        json.JSONEncoder.default = monkey_patched_json_encoder_default
-        # Monkey patch serializer
+            first_downloaded_filepath = self.files[0]
 
+            if merge_only:
+                print('Merge complete. Validation of merge not registered in server as MERGE_ONLY is set.')
+                return
 
-        self.project_service.register_validation(
-            uploaded_bucket_object_id,
-            dataset_template_id,
-            validation_metadata,
-            [uploaded_parquet_bucket_object_id]
-        )
-        print('Merge complete')
+            with self.profiler.stage('metadata_merge'):
+                validation_metadata, dataset_template_id = self.get_merged_validated_metadata(*fetched)
+
+            if merge_with_duckdb:
+                await loop.run_in_executor(None, self.merge_with_duckdb)
+
+            csv_upload = asyncio.ensure_future(
+                project_service.add_job_output_from_path(
+                    f"{self.output_filename}.csv",
+                    first_downloaded_filepath,
+                )
+            )
+
+            if not merge_with_duckdb:
+                with self.profiler.stage('parquet_writing'):
+                    try:
+                        await loop.run_in_executor(None, self.create_associated_parquet, first_downloaded_filepath)
+                    except BaseException:
+                        csv_upload.cancel()
+                        raise
+
+            with self.profiler.stage('upload') as upload_stage:
+                uploaded_bucket_object_id, uploaded_parquet_bucket_object_id = await asyncio.gather(
+                    csv_upload,
+                    project_service.add_validation_supporter_from_path(
+                        f"job-outputs/{os.environ['JOB_ID']}/{self.output_filename}.csv.parquet",
+                        f"{first_downloaded_filepath}.parquet",
+                    ),
+                )
+            upload_stage.bytes += os.path.getsize(first_downloaded_filepath) + os.path.getsize(f"{first_downloaded_filepath}.parquet")
 
+            # Monkey patch serializer
+            def monkey_patched_json_encoder_default(encoder, obj):
+                if isinstance(obj, set):
+                    return list(obj)
+                return json.JSONEncoder.default(encoder, obj)
 
-          
+            json.JSONEncoder.default = monkey_patched_json_encoder_default
+            # Monkey patch serializer
 
 
-        
\ No newline at end of file
+            with self.profiler.stage('registration'):
+                await project_service.register_validation(
+                    uploaded_bucket_object_id,
+                    dataset_template_id,
+                    validation_metadata,
+                    [uploaded_parquet_bucket_object_id]
+                )
+        print('Merge complete')
@@ -0,0 +1,390 @@
+import string
+import pyarrow as pa
+from jsonschema import Draft202012Validator
+from common.duckdb_backend import quote_identifier, quote_literal, read_csv_sql
+
+# JSON schema keywords translated to SQL; other validation keywords of the
+# draft raise ValueError (annotations and unknown keywords are ignored, as
+# jsonschema ignores them)
+SUPPORTED_ROOT_KEYWORDS = ['type', 'properties', 'required']
+SUPPORTED_PROPERTY_KEYWORDS = ['type', 'enum', 'pattern']
+SUPPORTED_ARRAY_KEYWORDS = ['type', 'items']
+SUPPORTED_TYPES = ['string', 'number', 'array']
+
+
+def get_unsupported_keywords(schema, supported_keywords):
+    return [
+        keyword for keyword in schema
+        if keyword in Draft202012Validator.VALIDATORS and keyword not in supported_keywords
+    ]
+
+
+class DuckdbValidation():
+    """
+    Out-of-core validation of a regional timeseries csv with DuckDB.
+
+    The csv is loaded once into a lower cased VARCHAR table. Schema types,
+    map membership and template validators are evaluated in one SQL pass
+    (first failing check per row is reported, as in the row by row path),
+    metadata is harvested with aggregates, and the sorted csv and its
+    parquet are exported with COPY. Memory use stays within the memory
+    limit of the workspace; larger intermediates spill to disk.
+
+    Template validator pointers must be a single '{field}' or start with a
+    '&document' (see lookups.py); other pointers raise ValueError, as do
+    JSON schema keywords without a SQL translation (see check_schema).
+    """
+
+    def __init__(
+        self,
+        workspace,
+        *,
+        rules,
+        lookups,
+        input_filepath,
+        input_fieldnames,
+        header,
+        validated_headers,
+        input_compression=None
+    ):
+        self.workspace = workspace
+        self.rules = rules
+        self.lookups = lookups
+        self.input_filepath = input_filepath
+        self.input_fieldnames = input_fieldnames
+        self.header = header
+        self.validated_headers = validated_headers
+        self.input_compression = input_compression
+
+        declarations = rules['root_schema_declarations']
+        self.time_dimension = declarations['time_dimension']
+        self.value_dimension = declarations['value_dimension']
+        self.unit_dimension = declarations['unit_dimension']
+        self.variable_dimension = declarations['variable_dimension']
+
+        self.properties = rules['root']['properties']
+        self.lookup_table_count = 0
+
+        self.check_schema()
+
+    def check_schema(self):
+        """ Raises before loading for schemas using keywords the SQL checks do not cover. """
+        root = self.rules['root']
+
+        unsupported = [f"root: {keyword}" for keyword in get_unsupported_keywords(root, SUPPORTED_ROOT_KEYWORDS)]
+        if root.get('type', 'object') != 'object':
+            unsupported.append(f"root: type {root['type']!r}")
+
+        for key, schema in self.properties.items():
+            if 'type' in schema and schema['type'] not in SUPPORTED_TYPES:
+                unsupported.append(f"{key}: type {schema.get('type')!r}")
+
+            if schema.get('type') == 'array':
+                keywords = get_unsupported_keywords(schema, SUPPORTED_ARRAY_KEYWORDS)
+                # items are strings of the x-split column, anything else needs the row by row path
+                keywords += [f"items.{keyword}" for keyword in get_unsupported_keywords(schema.get('items', {}), ['type'])]
+            else:
+                keywords = get_unsupported_keywords(schema, SUPPORTED_PROPERTY_KEYWORDS)
+            unsupported += [f"{key}: {keyword}" for keyword in keywords]
+
+        if unsupported:
+            raise ValueError(
+                f"Schema keywords not supported by the duckdb execution backend ({'; '.join(unsupported)}). "
+                "Use the python execution backend."
+            )
+
+    def column(self, name):
+        return quote_identifier(name.lower())
+
+    def load(self):
+        """ Loads the csv into table `rows`; returns number of rows. Blank rows are skipped. """
+        columns = [quote_identifier(name) for name in self.input_fieldnames]
+
+        self.workspace.execute(f"""
+            CREATE TABLE rows AS
+            SELECT * FROM (
+                SELECT {', '.join(f"lower(coalesce({column}, '')) AS {column}" for column in columns)}
+                FROM {read_csv_sql(self.input_filepath, self.input_fieldnames, header=self.header, compression=self.input_compression)}
+            )
+            WHERE NOT ({' AND '.join(f"trim({column}) = ''" for column in columns)})
+        """)
+
+        return self.workspace.execute("SELECT count(*) FROM rows").fetchone()[0]
+
+    def create_lookup_table(self, columns, rows):
+        name = f"lookup_{self.lookup_table_count}"
+        self.lookup_table_count += 1
+
+        table = pa.table({
+            column: pa.array([row[i] for row in rows], type=pa.string())
+            for i, column in enumerate(columns)
+        })
+        self.workspace.connection.register(f"{name}_arrow", table)
+        self.workspace.execute(f"CREATE TEMP TABLE {name} AS SELECT * FROM {name}_arrow")
+        self.workspace.connection.unregister(f"{name}_arrow")
+        return name
+
+    def get_key_condition(self, table_name, fields):
+        return ' AND '.join(
+            [f"{table_name}.key_{i} = rows.{self.column(field)}" for i, field in enumerate(fields)]
+        ) or 'true'
+
+    def get_pointer_table(self, tables, pointer_array):
+        table = tables.get(tuple(pointer_array))
+        if table is None:
+            raise ValueError(f"Pointer {pointer_array} is not supported by the duckdb execution backend")
+        return table
+
+    def pointer_sql(self, pointer_array):
+        """ Scalar SQL expression resolving a template pointer for the current row; NULL when missing. """
+        if len(pointer_array) == 1 and pointer_array[0].startswith('{') and pointer_array[0].endswith('}'):
+            return f"rows.{self.column(pointer_array[0][1:-1])}"
+
+        fields, entries = self.get_pointer_table(self.lookups.pointer_tables, pointer_array)
+
+        # only string targets can equal a (string) csv value
+        table_name = self.create_lookup_table(
+            [f"key_{i}" for i in range(len(fields))] + ['target'],
+            [(*key, value) for key, value in entries.items() if isinstance(value, str)]
+        )
+        return f"(SELECT target FROM {table_name} WHERE {self.get_key_condition(table_name, fields)})"
+
+    def not_member_sql(self, pointer_array, lhs):
+        fields, entries = self.get_pointer_table(self.lookups.member_tables, pointer_array)
+
+        table_name = self.create_lookup_table(
+            [f"key_{i}" for i in range(len(fields))] + ['member'],
+            [
+                (*key, member)
+                for key, members in entries.items() if isinstance(members, frozenset)
+                for member in members if isinstance(member, str)
+            ]
+        )
+        return (
+            f"NOT EXISTS (SELECT 1 FROM {table_name} "
+            f"WHERE {self.get_key_condition(table_name, fields)} AND {table_name}.member = {lhs})"
+        )
+
+    def regex_sql(self, directive, lhs):
+        """ regexf formatted per row; NULL when a context pointer cannot be resolved. """
+        parts = []
+        for literal, field_name, _, _ in string.Formatter().parse(directive['regexf']):
+            if literal:
+                parts.append(quote_literal(literal))
+            if field_name is None:
+                continue
+            if field_name == 'lhs':
+                parts.append(lhs)
+            else:
+                parts.append(self.pointer_sql(directive['fcontext'][field_name]))
+        return ' || '.join(parts) or "''"
+
+    def quoted_value_message(self, column, text):
+        """ SQL message "'<value>' <text>" """
+        return f"'''' || {column} || " + quote_literal(f"' {text}")
+
+    def get_checks(self):
+        """ (condition, message) SQL pairs in the order the row by row path checks them. """
+        checks = []
+
+        for key, schema in self.properties.items():
+            column = f"rows.{self.column(key)}"
+
+            if schema.get('type') == 'array':
+                if not schema.get('x-split'):
+                    raise ValueError(
+                        f"Field '{key}' is an array but does not have 'x-split' rule defined in the schema."
+                    )
+                if schema.get('items', {}).get('type') != 'string':
+                    raise ValueError(
+                        f"Field '{key}' uses x-split but its items are not strings (found: {schema.get('items', {}).get('type')})"
+                    )
+
+            if schema.get('type') == 'number':
+                checks.append((
+                    f"TRY_CAST({column} AS DOUBLE) IS NULL",
+                    self.quoted_value_message(column, f"is not of type 'number' ({key})")
+                ))
+
+            if 'enum' in schema:
+                checks.append((
+                    f"{column} NOT IN ({', '.join(quote_literal(value) for value in schema['enum'])})",
+                    self.quoted_value_message(column, f"is not one of {schema['enum']} ({key})")
+                ))
+
+            if 'pattern' in schema:
+                checks.append((
+                    f"NOT regexp_matches({column}, {quote_literal(schema['pattern'])})",
+                    self.quoted_value_message(column, f"does not match {schema['pattern']!r} ({key})")
+                ))
+
+        for key, schema in self.properties.items():
+            members = self.lookups.map_members.get(key)
+            if not members:
+                continue
+
+            column = f"rows.{self.column(key)}"
+            table_name = self.create_lookup_table(['member'], [(member,) for member in members if isinstance(member, str)])
+
+            if schema.get('type') == 'array':
+                condition = (
+                    f"{column} <> '' AND EXISTS (SELECT 1 FROM unnest(string_split({column}, {quote_literal(schema['x-split'])})) AS items(item) "
+                    f"WHERE item NOT IN (SELECT member FROM {table_name}))"
+                )
+            else:
+                condition = f"{column} NOT IN (SELECT member FROM {table_name})"
+
+            checks.append((
+                condition,
+                self.quoted_value_message(column, f"must be one of map_{key}")
+            ))
+
+        template_validators = self.rules.get('template_validators')
+        if template_validators and template_validators != 'not defined':
+            for row_key, condition_object in template_validators.items():
+                lhs = f"rows.{self.column(row_key)}"
+
+                for condition, directive in condition_object.items():
+                    if condition == 'value_equals':
+                        rhs = self.pointer_sql(directive)
+                        checks.append((
+                            f"{lhs} IS DISTINCT FROM {rhs}",
+                            f"{lhs} || {quote_literal(f' in {row_key} column must be equal to ')} || coalesce({rhs}, 'nothing') || '.'"
+                        ))
+                    elif condition == 'is_subset_of_map':
+                        checks.append((
+                            self.not_member_sql(directive, lhs),
+                            f"{lhs} || {quote_literal(f' in {row_key} column must be member of {directive}.')}"
+                        ))
+                    elif condition == 'regex':
+                        pattern = self.regex_sql(directive, lhs)
+                        checks.append((
+                            f"coalesce(NOT regexp_matches(trim({lhs}), '^(?:' || {pattern} || ')'), true)",
+                            f"'Value ' || {lhs} || ' did not match pattern ' || coalesce({pattern}, {quote_literal(directive['regexf'])})"
+                        ))
+
+        return checks
+
+    def find_errors(self, error_budget=50):
+        """ Distinct error messages (with one offending row each, most frequent first) and number of invalid rows. """
+        required = list(self.properties) + [
+            key for key in self.rules['root'].get('required', []) if key not in self.properties
+        ]
+        missing = [key for key in required if key.lower() not in self.input_fieldnames]
+        if missing:
+            row_count = self.workspace.execute("SELECT count(*) FROM rows").fetchone()[0]
+            return {f"Columns {missing} are missing": str(self.input_fieldnames)}, row_count
+
+        checks = self.get_checks()
+        if not checks:
+            return {}, 0
+
+        case = ' '.join(f"WHEN {condition} THEN {message}" for condition, message in checks)
+        row_data = ', '.join(
+            f"{quote_identifier(name)} := {quote_identifier(name)}" for name in self.input_fieldnames
+        )
+
+        results = self.workspace.execute(f"""
+            SELECT message, any_value(row_data), count(*) AS invalid_rows, sum(count(*)) OVER () AS total_invalid_rows
+            FROM (
+                SELECT message, CAST(struct_pack({row_data}) AS VARCHAR) AS row_data
+                FROM (SELECT *, CASE {case} END AS message FROM rows)
+                WHERE message IS NOT NULL
+            )
+            GROUP BY message
+            ORDER BY invalid_rows DESC
+            LIMIT {error_budget + 1}
+        """).fetchall()
+
+        errors = {message: row_data for message, row_data, _, _ in results}
+        invalid_rows = int(results[0][3]) if results else 0
+        return errors, invalid_rows
+
+    def harvest_metadata(self, harvest_limit=1000):
+        """ Same keys as validate_maps_and_harvest_metadata harvests row by row. """
+        validation_metadata = {
+            f"{self.time_dimension}_meta": {
+                "min_value": float('+inf'),
+                "max_value": float('-inf')
+            }
+        }
+
+        time_column = self.column(self.time_dimension)
+        min_value, max_value, row_count = self.workspace.execute(
+            f"SELECT min(TRY_CAST({time_column} AS DOUBLE)), max(TRY_CAST({time_column} AS DOUBLE)), count(*) FROM rows"
+        ).fetchone()
+
+        if not row_count:
+            return validation_metadata
+
+        validation_metadata[f"{self.time_dimension}_meta"] = {
+            "min_value": min_value,
+            "max_value": max_value
+        }
+
+        for key, schema in self.properties.items():
+            if schema['type'] == 'array' or key in [self.variable_dimension, self.unit_dimension, self.value_dimension]:
+                continue
+
+            validation_metadata[key] = {
+                value for (value,) in self.workspace.execute(
+                    f"SELECT DISTINCT {self.column(key)} FROM rows LIMIT {harvest_limit + 1}"
+                ).fetchall()
+            }
+
+        validation_metadata['variable-unit'] = set(
+            self.workspace.execute(
+                f"SELECT DISTINCT {self.column(self.variable_dimension)}, {self.column(self.unit_dimension)} "
+                f"FROM rows LIMIT {harvest_limit + 1}"
+            ).fetchall()
+        )
+
+        return validation_metadata
+
+    def get_order_by(self):
+        """ Same order as the shell sort: every dimension, time numerically, then value. """
+        return ', '.join(
+            f"TRY_CAST({self.column(header)} AS DOUBLE)" if header == self.time_dimension else self.column(header)
+            for header in self.validated_headers
+        )
+
+    def sort(self):
+        """
+        Materialises table `sorted_rows` once for both exports. Insertion
+        order is preserved from here on so the exports keep the sort.
+        """
+        self.workspace.execute("SET preserve_insertion_order = true")
+        self.workspace.execute(f"CREATE TABLE sorted_rows AS SELECT * FROM rows ORDER BY {self.get_order_by()}")
+        self.workspace.execute("DROP TABLE rows")
+
+    def export_sorted_csv(self, output_filepath):
+        columns = ', '.join(
+            f"{self.column(header)} AS {quote_identifier(header)}" for header in self.validated_headers
+        )
+        self.workspace.execute(
+            f"COPY (SELECT {columns} FROM sorted_rows) "
+            f"TO {quote_literal(output_filepath)} (HEADER, DELIMITER ',')"
+        )
+
+    def export_parquet(self, output_filepath):
+        """ x-split columns as lists, value as float; dictionary encoding is left to the parquet writer. """
+        properties = {key.lower(): schema for key, schema in self.properties.items()}
+
+        columns = []
+        for name in self.input_fieldnames:
+            column = quote_identifier(name)
+            schema = properties.get(name, {})
+            if schema.get('type') == 'array':
+                columns.append(
+                    f"CASE WHEN {column} = '' THEN []::VARCHAR[] "
+                    f"ELSE string_split({column}, {quote_literal(schema['x-split'])}) END AS {column}"
+                )
+            elif name == self.value_dimension.lower():
+                columns.append(f"CAST({column} AS FLOAT) AS {column}")
+            else:
+                columns.append(column)
+
+        self.workspace.execute(
+            f"COPY (SELECT {', '.join(columns)} FROM sorted_rows) "
+            f"TO {quote_literal(output_filepath)} (FORMAT parquet, COMPRESSION snappy)"
+        )
@@ -0,0 +1,190 @@
+import os
+import json
+import uuid
+import zlib
+import shutil
+import hashlib
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Part of the context hash; bumped when rows.parquet or the checks of a block change
+CACHE_VERSION = 3
+
+
+def json_default(obj):
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def iter_content_defined_blocks(file, *, average_lines=65536):
+    """
+    Splits a binary file object into blocks of whole csv records.
+
+    A block ends after a line whose crc32 is divisible by `average_lines`
+    (bounded to a quarter and four times `average_lines`). Boundaries only
+    depend on line content, so appending or editing rows changes the
+    blocks around the edit while all other blocks keep their hash.
+
+    A line ending inside a quoted field (odd number of quotes so far, as
+    escaped quotes come in pairs) never ends a block, so a multiline
+    record stays in one block.
+    """
+    min_lines = max(1, average_lines // 4)
+    max_lines = average_lines * 4
+
+    lines = []
+    in_quotes = False
+    for line in file:
+        lines.append(line)
+        if line.count(b'"') % 2:
+            in_quotes = not in_quotes
+        if not in_quotes and (len(lines) >= max_lines or (
+            len(lines) >= min_lines and zlib.crc32(line) % average_lines == 0
+        )):
+            yield lines
+            lines = []
+
+    if lines:
+        yield lines
+
+
+def get_block_hash(lines):
+    block_hash = hashlib.sha256()
+    for line in lines:
+        block_hash.update(line)
+    return block_hash.hexdigest()
+
+
+def merge_validation_metadata(validation_metadata, partial, time_dimension, harvest_limit=1000):
+    """ Merges metadata harvested from one block (as loaded from json) into `validation_metadata`. """
+    time_meta_key = f"{time_dimension}_meta"
+
+    for key, value in partial.items():
+        if key == time_meta_key:
+            time_meta = validation_metadata[time_meta_key]
+            time_meta['min_value'] = min(time_meta['min_value'], value['min_value'])
+            time_meta['max_value'] = max(time_meta['max_value'], value['max_value'])
+            continue
+
+        items = [tuple(item) for item in value] if key == 'variable-unit' else value
+        harvested = validation_metadata.setdefault(key, set())
+        for item in items:
+            if len(harvested) > harvest_limit:
+                break
+            harvested.add(item)
+
+
+def write_result(directory, validation_metadata, errors, invalid_rows):
+    """ result.json of a validated block or shard: harvested metadata, errors and invalid row count. """
+    with open(os.path.join(directory, 'result.json'), 'w') as result_file:
+        json.dump(
+            {'validation_metadata': validation_metadata, 'errors': errors, 'invalid_rows': invalid_rows},
+            result_file,
+            default=json_default
+        )
+
+
+def load_result(directory):
+    with open(os.path.join(directory, 'result.json')) as result_file:
+        return json.load(result_file)
+
+
+class ValidationBlockCache():
+    """
+    Partial validation results per content block of one file and template.
+
+    Layout:
+
+        <cache_directory>/<context hash>/<block hash>/
+            result.json     metadata harvested from the block, its errors and invalid row count
+            run.csv         validated rows of the block, sorted, no header
+            rows.parquet    parquet rows of the block in input order
+
+    The context hash covers the cache version, template rules, csv
+    fieldnames, the header read from the file and file path, so a changed
+    template or header never reuses results.
+    """
+
+    def __init__(self, cache_directory, context):
+        context_hash = hashlib.sha256(
+            json.dumps({**context, 'cache_version': CACHE_VERSION}, sort_keys=True, default=json_default).encode()
+        ).hexdigest()
+
+        self.directory = os.path.join(cache_directory, context_hash)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get_block_directory(self, block_hash):
+        return os.path.join(self.directory, block_hash)
+
+    def get_run_filepath(self, block_hash):
+        return os.path.join(self.get_block_directory(block_hash), 'run.csv')
+
+    def get_parquet_filepath(self, block_hash):
+        return os.path.join(self.get_block_directory(block_hash), 'rows.parquet')
+
+    def has(self, block_hash):
+        return os.path.exists(os.path.join(self.get_block_directory(block_hash), 'result.json'))
+
+    def load_result(self, block_hash):
+        return load_result(self.get_block_directory(block_hash))
+
+    def create_staging_directory(self):
+        staging_directory = os.path.join(self.directory, f"staging-{uuid.uuid4().hex}")
+        os.makedirs(staging_directory)
+        return staging_directory
+
+    def commit(self, staging_directory, block_hash, validation_metadata, errors, invalid_rows):
+        """ result.json is written last and the directory renamed, so a block is either complete or absent. """
+        write_result(staging_directory, validation_metadata, errors, invalid_rows)
+
+        block_directory = self.get_block_directory(block_hash)
+        if os.path.exists(block_directory):
+            # identical block seen twice in the same file
+            shutil.rmtree(staging_directory)
+        else:
+            os.replace(staging_directory, block_directory)
+
+    def prune(self, block_hashes):
+        """ Drops blocks (and leftover staging directories) not in the current file. """
+        for name in os.listdir(self.directory):
+            if name not in block_hashes:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+
+def widen_dictionaries(schema):
+    return pa.schema([
+        field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+        if pa.types.is_dictionary(field.type) else field
+        for field in schema
+    ])
+
+
+def concat_parquet_files(parquet_filepaths, output_filepath):
+    """
+    Concatenates block parquets in order. Dictionary columns are normalized
+    to int32 indices, so blocks agree on the index type whatever wrote
+    them, and block schemas are unified (e.g. an all empty column of one
+    block is null typed), missing columns being filled with nulls.
+    """
+    parquet_filepaths = [
+        parquet_filepath for parquet_filepath in parquet_filepaths if os.path.exists(parquet_filepath)
+    ]
+    if not parquet_filepaths:
+        return
+
+    schema = pa.unify_schemas(
+        [widen_dictionaries(pq.read_schema(parquet_filepath)) for parquet_filepath in parquet_filepaths],
+        promote_options='permissive'
+    )
+
+    with pq.ParquetWriter(output_filepath, schema, compression='snappy') as parquet_writer:
+        for parquet_filepath in parquet_filepaths:
+            parquet_file = pq.ParquetFile(parquet_filepath)
+
+            for row_group_index in range(parquet_file.num_row_groups):
+                table = parquet_file.read_row_group(row_group_index)
+                for field in schema:
+                    if field.name not in table.column_names:
+                        table = table.append_column(field, pa.nulls(table.num_rows, field.type))
+                parquet_writer.write_table(table.select(schema.names).cast(schema))
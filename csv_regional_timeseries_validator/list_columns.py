@@ -0,0 +1,111 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+import numpy as np
+
+
+def split_list_column(values, separator):
+    """
+    x-split column of csv strings as a list array with dictionary encoded
+    items, split in one pass over the string buffer. Empty strings are
+    empty lists, as preprocess_row splits them.
+    """
+    strings = pa.array(values, type=pa.string())
+    lists = pc.split_pattern(strings, pattern=separator)
+
+    # '' splits into [''], which is no item
+    empty = pc.equal(strings, '').to_numpy(zero_copy_only=False)
+    lengths = np.where(empty, 0, pc.list_value_length(lists).to_numpy(zero_copy_only=False))
+    items = lists.flatten()
+    if empty.any():
+        items = items.filter(pa.array(~empty[pc.list_parent_indices(lists).to_numpy()]))
+
+    offsets = np.zeros(len(strings) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=offsets[1:])
+
+    return pa.ListArray.from_arrays(pa.array(offsets), pc.dictionary_encode(items))
+
+
+def get_member_values(members):
+    """ String members of a map (see lookups.get_member_set) as an Arrow value set. """
+    return pa.array(sorted(member for member in members if isinstance(member, str)), type=pa.string())
+
+
+def find_non_members(list_array, member_values):
+    """
+    (row index, item) of every list item missing from `member_values`.
+    Membership is decided once per distinct item (the dictionary of the
+    items), then mapped to the flattened items and their rows.
+    """
+    items = list_array.flatten()
+    if not len(items):
+        return []
+
+    dictionary_members = pc.is_in(items.dictionary, value_set=member_values)
+    missing = pc.invert(dictionary_members.take(items.indices))
+    if not pc.any(missing).as_py():
+        return []
+
+    rows = pc.list_parent_indices(list_array).filter(missing)
+    missing_items = items.dictionary.take(items.indices.filter(missing))
+    return list(zip(rows.to_pylist(), missing_items.to_pylist()))
+
+
+class ColumnarChunk():
+    """
+    Validated rows of one parquet chunk, kept as a list of csv strings per
+    column instead of a dict (and lists of x-split items) per row. x-split
+    columns are split when the chunk becomes an Arrow table.
+    """
+
+    def __init__(self, list_separators):
+        self.list_separators = list_separators
+        self.columns = {}
+        self.rows = 0
+        self.list_arrays = None
+
+    def __len__(self):
+        return self.rows
+
+    def append(self, row):
+        if not self.columns:
+            # the first row fixes the column order of the chunk and its parquet
+            self.columns = {name: [] for name in row}
+        for name, values in self.columns.items():
+            values.append(row.get(name))
+        self.rows += 1
+        self.list_arrays = None
+
+    def get_row(self, index):
+        return {name: values[index] for name, values in self.columns.items()}
+
+    def get_list_arrays(self):
+        if self.list_arrays is None:
+            self.list_arrays = {
+                name: split_list_column(self.columns[name], separator)
+                for name, separator in self.list_separators.items()
+                if name in self.columns
+            }
+        return self.list_arrays
+
+    def to_table(self, value_dimension):
+        """ x-split columns as lists of dictionary items, value as float32, other columns dictionary encoded. """
+        list_arrays = self.get_list_arrays()
+
+        arrays = []
+        for name, values in self.columns.items():
+            if name in list_arrays:
+                arrays.append(list_arrays[name])
+            elif name == value_dimension:
+                arrays.append(get_float_array(values))
+            else:
+                arrays.append(pc.dictionary_encode(pa.array(values, type=pa.string())))
+
+        return pa.Table.from_arrays(arrays, names=list(self.columns))
+
+
+def get_float_array(values):
+    try:
+        return pc.cast(pa.array(values, type=pa.string()), pa.float32())
+    except pa.ArrowInvalid:
+        # forms float() accepts but Arrow does not (surrounding whitespace, digit separators)
+        return pa.array([float(value) for value in values], type=pa.float32())
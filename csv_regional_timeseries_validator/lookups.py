@@ -0,0 +1,143 @@
+import sys
+
+
+def resolve_pointer(pointer_array, root_schema, row):
+    """
+    Resolves a template pointer such as ['&map_variable', '{variable}', 'unit']:
+    '&name' starts at a root document, '{field}' indexes with the row value
+    of field and anything else indexes literally.
+    """
+    value = None
+    for pointer in pointer_array:
+        if pointer.startswith('&'):
+            value = root_schema[pointer[1:]]
+        elif pointer.startswith('{') and pointer.endswith('}'):
+            if value:
+                value = value[row[pointer[1:-1]]]
+            else:
+                value = row[pointer[1:-1]]
+
+        else:
+            value = value[pointer]
+    return value
+
+
+def get_member_set(value):
+    """ Membership set of a container including lowercased variants; other values unchanged. """
+    if isinstance(value, (dict, list, tuple, set, frozenset)):
+        members = set()
+        for item in value:
+            if isinstance(item, str):
+                members.add(sys.intern(item))
+                members.add(sys.intern(item.lower()))
+            else:
+                members.add(item)
+        return frozenset(members)
+    return value
+
+
+def expand_pointer(pointer_array, root_schema):
+    """
+    All targets of a pointer that starts at a root document, keyed by the
+    tuple of row values of its '{field}' parts (original and lowercased
+    keys). Returns None for pointers that cannot be enumerated.
+    """
+    if not pointer_array or not pointer_array[0].startswith('&'):
+        return None
+
+    fields = []
+    entries = {(): root_schema[pointer_array[0][1:]]}
+
+    for pointer in pointer_array[1:]:
+        expanded = {}
+        if pointer.startswith('{') and pointer.endswith('}'):
+            fields.append(pointer[1:-1])
+            for key, value in entries.items():
+                if not isinstance(value, dict):
+                    return None
+                for item_key, item in value.items():
+                    expanded[key + (sys.intern(item_key),)] = item
+                    expanded.setdefault(key + (sys.intern(item_key.lower()),), item)
+        else:
+            for key, value in entries.items():
+                try:
+                    expanded[key] = value[pointer]
+                except (KeyError, IndexError, TypeError):
+                    # resolving this target raises for the row, as without the table
+                    continue
+        entries = expanded
+
+    return fields, entries
+
+
+class TemplateLookups():
+    """
+    Lookup tables built once per template revision:
+
+    - `map_members[field]`: frozenset of the keys (dict documents) or items
+      (list documents) of `map_<field>`, plus their lowercased variants the
+      csv reader produces.
+    - pointer tables of every `template_validators` pointer (rhs of
+      `value_equals` / `is_subset_of_map` and regex `fcontext`), so a row
+      resolves a target by one dict lookup. `is_subset_of_map` targets are
+      stored as frozensets.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+
+        self.map_members = {
+            key[len('map_'):]: get_member_set(document)
+            for key, document in rules.items()
+            if key.startswith('map_') and isinstance(document, (dict, list, tuple))
+        }
+
+        self.pointer_tables = {}
+        self.member_tables = {}
+
+        template_validators = rules.get('template_validators')
+        if not template_validators or template_validators == 'not defined':
+            return
+
+        for condition_object in template_validators.values():
+            for condition, directive in condition_object.items():
+                if condition in ['value_equals', 'is_subset_of_map']:
+                    self.add_pointer(directive, members=condition == 'is_subset_of_map')
+                elif condition == 'regex':
+                    for key_pointer in directive['fcontext'].values():
+                        self.add_pointer(key_pointer)
+
+    def add_pointer(self, pointer_array, members=False):
+        pointer_key = tuple(pointer_array)
+        if pointer_key in self.pointer_tables:
+            table = self.pointer_tables[pointer_key]
+        else:
+            table = self.pointer_tables[pointer_key] = expand_pointer(pointer_array, self.rules)
+
+        if members and table is not None:
+            fields, entries = table
+            self.member_tables[pointer_key] = (
+                fields, {key: get_member_set(value) for key, value in entries.items()}
+            )
+
+    def lookup(self, tables, pointer_array, row):
+        table = tables.get(tuple(pointer_array))
+        if table is None:
+            return resolve_pointer(pointer_array, self.rules, row)
+
+        fields, entries = table
+        try:
+            key = tuple(row[field] for field in fields)
+            return entries[key]
+        except (KeyError, TypeError):
+            # missing or unhashable (x-split) values raise as plain resolution does
+            return resolve_pointer(pointer_array, self.rules, row)
+
+    def resolve(self, pointer_array, row):
+        return self.lookup(self.pointer_tables, pointer_array, row)
+
+    def resolve_members(self, pointer_array, row):
+        """ Target to test `in` against; frozenset when the pointer could be expanded. """
+        if tuple(pointer_array) in self.member_tables:
+            return self.lookup(self.member_tables, pointer_array, row)
+        return self.resolve(pointer_array, row)
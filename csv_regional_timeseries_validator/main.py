@@ -1,10 +1,16 @@
 import os
 from service import CsvRegionalTimeseriesVerificationService 
+from sharding import parse_byte_range
+from common.streaming import join_location
 
 input_directory = 'inputs'
 
 filepaths = os.environ.get('selected_filenames', '').split(',')
 
+# Inputs are streamed from <INPUT_BASE_URL>/<filepath> instead of read from inputs/ when set,
+# or with STREAM_INPUT from download urls of the project service
+input_base_url = os.environ.get('INPUT_BASE_URL')
+
 
 for filepath in filepaths:
     
@@ -14,8 +20,20 @@ for filepath in filepaths:
         filename=f"inputs/{filepath.split('/')[-1]}",
         dataset_template_id=os.environ.get('dataset_template_id'),
         job_token=os.environ.get('ACC_JOB_TOKEN'),
-        original_filepath=filepath
-
+        original_filepath=filepath,
+        validation_cache_directory=os.environ.get('VALIDATION_CACHE_DIRECTORY'),
+        validation_cache_block_lines=int(os.environ.get('VALIDATION_CACHE_BLOCK_LINES', 65536)),
+        fail_fast=os.environ.get('FAIL_FAST') in ['True', 'true', '1', 'TRUE'],
+        sample_pre_validation=os.environ.get('PRE_VALIDATION_SAMPLE') in ['True', 'true', '1', 'TRUE'],
+        execution_backend=os.environ.get('EXECUTION_BACKEND', 'python'),
+        reject_duplicate_keys=os.environ.get('REJECT_DUPLICATE_KEYS') in ['True', 'true', '1', 'TRUE'],
+        shard_byte_range=parse_byte_range(os.environ['SHARD_BYTE_RANGE']) if os.environ.get('SHARD_BYTE_RANGE') else None,
+        shard_output_directory=os.environ.get('SHARD_OUTPUT_DIRECTORY'),
+        shard_input_directories=os.environ['SHARD_INPUT_DIRECTORIES'].split(',') if os.environ.get('SHARD_INPUT_DIRECTORIES') else None,
+        output_compression=os.environ.get('OUTPUT_COMPRESSION', 'none'),
+        chunk_rows=int(os.environ['CHUNK_ROWS']) if os.environ.get('CHUNK_ROWS') else None,
+        input_location=join_location(input_base_url, filepath) if input_base_url else None,
+        stream_input=os.environ.get('STREAM_INPUT') in ['True', 'true', '1', 'TRUE'],
     )
 
     csv_regional_timeseries_verification_service()
@@ -0,0 +1,84 @@
+import os
+import random
+
+
+def has_odd_quotes(line):
+    """ Line starts or ends a quoted field spanning lines (escaped quotes come in pairs). """
+    return line.count(b'"') % 2 == 1
+
+
+def iter_sampled_lines(
+    input_file,
+    *,
+    data_start,
+    head_lines=1000,
+    tail_lines=1000,
+    random_offsets=200,
+    lines_per_offset=5,
+    tail_bytes=1024**2,
+    seed=None
+):
+    """
+    Stratified sample of the data lines of a binary file object: the first
+    `head_lines` lines after `data_start`, the last `tail_lines` lines and
+    `lines_per_offset` lines after each of `random_offsets` random byte
+    offsets. Partial lines at random offsets and at the tail window are
+    dropped. Lines may be yielded more than once on small files.
+
+    Quoted fields spanning lines are kept whole at the head and tail: the
+    head reads on until its quotes balance, and the tail starts at a line
+    with an even number of quotes after it (the file ends outside quotes).
+    Whether a random offset fell inside a quoted field cannot be told, so
+    offset windows with a line of odd quote count are skipped. A window
+    lying entirely inside a long multiline field without quotes is not
+    detected and fails as an invalid row.
+    """
+    # seekable file objects without a file descriptor (streamed inputs) included
+    file_size = input_file.seek(0, os.SEEK_END)
+
+    input_file.seek(data_start)
+    in_quotes = False
+    lines_read = 0
+    while lines_read < head_lines or in_quotes:
+        line = input_file.readline()
+        if not line:
+            return
+        if has_odd_quotes(line):
+            in_quotes = not in_quotes
+        lines_read += 1
+        yield line
+
+    head_end = input_file.tell()
+    if head_end >= file_size:
+        return
+
+    rng = random.Random(seed)
+    for offset in sorted(rng.randrange(head_end, file_size) for _ in range(random_offsets)):
+        input_file.seek(offset)
+        input_file.readline()  # rest of the line the offset fell into
+        window = []
+        for _ in range(lines_per_offset):
+            line = input_file.readline()
+            if not line:
+                break
+            window.append(line)
+        if not any(has_odd_quotes(line) for line in window):
+            yield from window
+
+    tail_start = max(head_end, file_size - tail_bytes)
+    input_file.seek(tail_start)
+    tail = input_file.read().splitlines(keepends=True)
+    if tail_start > head_end and tail:
+        tail = tail[1:]
+
+    # a line starts a record when the quotes from it to the end of file balance
+    start = len(tail)
+    in_quotes = False
+    for i in range(len(tail) - 1, -1, -1):
+        if has_odd_quotes(tail[i]):
+            in_quotes = not in_quotes
+        if not in_quotes:
+            if len(tail) - i > tail_lines:
+                break
+            start = i
+    yield from tail[start:]
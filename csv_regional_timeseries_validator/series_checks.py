@@ -0,0 +1,115 @@
+import bisect
+from timeseries_reader import KeyIndexBuilder, parse_header_line, parse_line
+
+
+class SeriesChecker():
+    """
+    Streaming checks over the sorted long format file. Rows of one series
+    (every dimension but time and value) are adjacent and ordered by time,
+    so comparing each row with the previous one finds:
+
+    - duplicate keys: a series has the same time twice
+    - non-monotonic times: time decreases within a series
+    - gaps: a series misses times of the file wide `time_grid` between its
+      first and last time
+
+    Only the previous row is kept, so memory is constant per series. Up to
+    `example_limit` offending keys are kept per check.
+    """
+
+    def __init__(self, *, key_columns, time_column, time_grid=None, example_limit=10):
+        self.key_columns = key_columns
+        self.time_column = time_column
+        self.time_grid = sorted(time_grid) if time_grid else None
+        self.example_limit = example_limit
+
+        self.series = 0
+        self.duplicate_keys = 0
+        self.non_monotonic = 0
+        self.series_with_gaps = 0
+        self.missing_points = 0
+        self.examples = {
+            'duplicate_keys': [],
+            'non_monotonic': [],
+            'gaps': [],
+        }
+
+        self.previous_key = None
+        self.previous_time = None
+        self.series_has_gap = False
+
+    def add_example(self, check, example):
+        if len(self.examples[check]) < self.example_limit:
+            self.examples[check].append(example)
+
+    def count_missing(self, previous_time, time):
+        """ Grid times strictly between two consecutive times of a series. """
+        return bisect.bisect_left(self.time_grid, time) - bisect.bisect_right(self.time_grid, previous_time)
+
+    def add(self, key, time):
+        if key != self.previous_key:
+            self.series += 1
+            self.previous_key = key
+            self.previous_time = time
+            self.series_has_gap = False
+            return
+
+        if time == self.previous_time:
+            self.duplicate_keys += 1
+            self.add_example('duplicate_keys', [*key, time])
+        elif time < self.previous_time:
+            self.non_monotonic += 1
+            self.add_example('non_monotonic', [*key, self.previous_time, time])
+        elif self.time_grid:
+            missing = self.count_missing(self.previous_time, time)
+            if missing:
+                self.missing_points += missing
+                if not self.series_has_gap:
+                    self.series_has_gap = True
+                    self.series_with_gaps += 1
+                    self.add_example('gaps', [*key, self.previous_time, time])
+
+        self.previous_time = time
+
+    def check_file(self, filepath, *, index_key_columns=None):
+        """
+        Checks a sorted csv with header; returns the report. With
+        `index_key_columns` the key index of the file (see
+        timeseries_reader.KeyIndexBuilder) is built from the same pass and
+        kept as `key_index`.
+        """
+        with open(filepath, 'rb') as sorted_file:
+            header_line = sorted_file.readline()
+
+            if header_line:
+                header = parse_header_line(header_line)
+                key_indexes = [header.index(column) for column in self.key_columns]
+                time_index = header.index(self.time_column)
+
+                index_builder = KeyIndexBuilder(
+                    header_line, key_columns=index_key_columns, time_column=self.time_column
+                ) if index_key_columns else None
+
+                for line in sorted_file:
+                    row = parse_line(line)
+                    if index_builder:
+                        index_builder.add(row, len(line))
+                    if row == ['']:
+                        continue
+                    self.add(tuple(row[i] for i in key_indexes), float(row[time_index]))
+
+                if index_builder:
+                    self.key_index = index_builder.get_index()
+
+        return self.get_report()
+
+    def get_report(self):
+        """ Gap counts are None when no time grid was given. """
+        return {
+            'series': self.series,
+            'duplicate_keys': self.duplicate_keys,
+            'non_monotonic': self.non_monotonic,
+            'series_with_gaps': self.series_with_gaps if self.time_grid else None,
+            'missing_points': self.missing_points if self.time_grid else None,
+            'examples': self.examples,
+        }
@@ -1,19 +1,50 @@
 import json
 import os
+import asyncio
 import re
 import subprocess
 import csv
 import uuid
 import itertools
-import pandas as pd
+import shutil
 import pyarrow as pa
 import pyarrow.parquet as pq
 from typing import Optional
-from accli import AjobCliService
+from common.project_service import get_project_service
+from common.template_cache import get_template_rules_cache
+from common.async_project_service import get_async_project_service
+from common.duckdb_backend import get_duckdb_workspace
+from common.compression import detect_compression, open_input, decompress_file, compress_seekable
+from common.streaming import open_location, get_size, is_remote, get_input_location
+from common.resources import (
+    AdaptiveChunkSize,
+    profile_csv_input,
+    plan_chunks,
+    recommend_resources,
+    get_sort_resource_option_text,
+)
 from jsonschema import validate as jsonschema_validate
 from jsonschema.exceptions import ValidationError, SchemaError
 
 from jsonschema.validators import extend, Draft202012Validator
+from wide_format import WideFormatPivot
+from sampling import iter_sampled_lines
+from series_checks import SeriesChecker
+from lookups import TemplateLookups, resolve_pointer
+from duckdb_validation import DuckdbValidation
+from sharding import iter_range_lines
+from timeseries_reader import write_key_index
+from list_columns import ColumnarChunk, find_non_members, get_member_values
+from incremental import (
+    ValidationBlockCache,
+    concat_parquet_files,
+    get_block_hash,
+    iter_content_defined_blocks,
+    load_result,
+    merge_validation_metadata,
+    write_result,
+)
+from common.profiling import JobProfiler
 
 def number_type_checker(checker, instance):
     if isinstance(instance, str):
@@ -81,28 +112,90 @@ class CsvRegionalTimeseriesVerificationService():
         dataset_template_id,
         job_token,
         csv_fieldnames: Optional[list[str]]=None,
-        ram_required=4 * 1024**3,
-        disk_required=6 * 1024**3,
-        cores_required=1,
-        original_filepath: Optional[str]=None
+        ram_required: Optional[int]=None,
+        disk_required: Optional[int]=None,
+        cores_required: Optional[int]=None,
+        original_filepath: Optional[str]=None,
+        validation_cache_directory: Optional[str]=None,
+        validation_cache_block_lines=65536,
+        fail_fast=False,
+        sample_pre_validation=False,
+        error_budget=50,
+        execution_backend='python',
+        reject_duplicate_keys=False,
+        shard_byte_range: Optional[tuple[int, int]]=None,
+        shard_output_directory: Optional[str]=None,
+        shard_input_directories: Optional[list[str]]=None,
+        output_compression='none',
+        chunk_rows: Optional[int]=None,
+        input_location: Optional[str]=None,
+        stream_input=False
     ):
         
-        self.project_service = AjobCliService(
-            job_token,
-            server_url=os.environ.get('ACC_JOB_GATEWAY_SERVER'),
-            verify_cert=False
-        )   
+        self.job_token = job_token
+        self.project_service = get_project_service(job_token)
+        self.template_cache = get_template_rules_cache(self.project_service)
 
         self.dataset_template_id = dataset_template_id
 
         self.filename = filename
 
+        # http(s) or s3 url the input is streamed from instead of reading `filename` (see common/streaming.py);
+        # local temporaries are still named after `filename`
+        self.input_location = input_location or filename
+        if stream_input and not input_location:
+            # download url of `original_filepath` signed by the project service
+            self.input_location = get_input_location(original_filepath, project_service=self.project_service)
+
+        # Recommended from the input profile unless given (see profile_input)
         self.ram_required = ram_required
         self.disk_required = disk_required
         self.cores_required = cores_required
 
+        # Rows per parquet writer chunk; sized to the memory limit from the input profile unless given
+        self.chunk_rows = chunk_rows
+        self.input_profile = None
+        self.chunk_plan = None
+
         self.csv_fieldnames = csv_fieldnames
         self.original_filepath = original_filepath
+
+        # Incremental revalidation is enabled when a (persisted) cache directory is given
+        self.validation_cache_directory = validation_cache_directory
+        self.validation_cache_block_lines = validation_cache_block_lines
+
+        # fail_fast stops all work once more than error_budget rows failed validation
+        self.fail_fast = fail_fast
+        self.sample_pre_validation = sample_pre_validation
+        self.error_budget = error_budget
+        self.invalid_rows = 0
+        self.aborted = False
+
+        # 'duckdb' validates, sorts and writes the parquet out-of-core (see duckdb_validation.py)
+        if execution_backend not in ['python', 'duckdb']:
+            raise ValueError(f"Unknown execution backend: {execution_backend}")
+        if execution_backend == 'duckdb' and validation_cache_directory:
+            raise ValueError("Incremental revalidation is not supported by the duckdb execution backend")
+        self.execution_backend = execution_backend
+
+        # Duplicate keys are always reported in validation_metadata; this also fails validation
+        self.reject_duplicate_keys = reject_duplicate_keys
+
+        # Sharded validation (sharding.py): a shard task validates a byte range, the reduce task registers
+        self.shard_byte_range = shard_byte_range
+        self.shard_output_directory = shard_output_directory
+        self.shard_input_directories = shard_input_directories
+        if (shard_byte_range or shard_input_directories) and (execution_backend != 'python' or validation_cache_directory):
+            raise ValueError("Sharded validation requires the python execution backend without validation cache")
+        if shard_byte_range and not shard_output_directory:
+            raise ValueError("A shard task requires a shard output directory")
+
+        # Input compression (gzip, zstd, bz2) is detected from magic bytes in validate_and_register
+        self.input_compression = None
+        # 'zstd' uploads the sorted file as seekable zstd (see common/compression.py)
+        if output_compression not in ['none', 'zstd']:
+            raise ValueError(f"Unknown output compression: {output_compression}")
+        self.output_compression = output_compression
         
         # Remove csv extensiopn from filename and add validation.csv. filename is relative filepath
         self.temp_validated_filepath = (
@@ -113,13 +206,34 @@ class CsvRegionalTimeseriesVerificationService():
             f"{self.filename.split('.csv')[0]}_sorted.csv"
         )
 
+        self.temp_compressed_sorted_filepath = f"{self.temp_sorted_filepath}.zst"
+
+        # Byte ranges per (variable, region) of the sorted file, for random access (timeseries_reader.py)
+        self.temp_key_index_filepath = f"{self.temp_sorted_filepath}.index.json"
+
+        self.temp_wide_filepath = (
+            f"{self.filename.split('.csv')[0]}_wide.csv"
+        )
+
         self.errors = dict()
+
+        self.profiler = JobProfiler(
+            f"{os.path.basename(self.filename).split('.csv')[0]}_validation"
+            + (f"_shard_{shard_byte_range[0]}" if shard_byte_range else '')
+        )
     
     
     def get_map_documents(self, field_name):
         map_documents = self.rules.get(f'map_{field_name}')
         return map_documents
 
+    def get_map_names(self, field_name):
+        """ Keys of a dict map or items of a list map, for error messages. """
+        map_documents = self.get_map_documents(field_name)
+        if isinstance(map_documents, dict):
+            return map_documents.keys()
+        return map_documents
+
 
     def init_validation_metadata(self):
         self.validation_metadata = {
@@ -130,13 +244,16 @@ class CsvRegionalTimeseriesVerificationService():
         }
 
     def set_csv_regional_validation_rules(self):
-        dataset_template_details = self.project_service.get_dataset_template_details(self.dataset_template_id)
+        dataset_template_details = self.template_cache.get_dataset_template_details(self.dataset_template_id)
         self.rules =  dataset_template_details.get('rules')
 
 
         assert self.rules, \
             f"No dataset template rules found for dataset_template id: \
                 {self.dataset_template_id}"
+
+        # Built once per template revision and shared by every file of the job
+        self.lookups = self.template_cache.get_derived(self.dataset_template_id, 'lookups', TemplateLookups)
         
         self.time_dimension = self.rules['root_schema_declarations']['time_dimension']
         self.value_dimension = self.rules['root_schema_declarations']['value_dimension']
@@ -146,6 +263,47 @@ class CsvRegionalTimeseriesVerificationService():
 
         self.region_dimension = self.rules['root_schema_declarations']['region_dimension']
 
+        # x-split columns -> separator; split per chunk when rows become parquet
+        self.list_separators = {
+            field: rules['x-split']
+            for field, rules in self.rules['root'].get('properties', {}).items()
+            if rules.get('type') == 'array' and rules.get('x-split')
+        }
+        # map members of x-split columns as Arrow value sets, built on first use
+        self.list_member_values = {}
+
+
+    def profile_input(self):
+        """
+        Samples the input for row width, cardinality and x-split list sizes,
+        sizes parquet chunks and row groups to the container memory limit
+        and recommends wkube resources for the file.
+        """
+        with self.profiler.stage('input_profiling'):
+            self.input_profile = profile_csv_input(self.input_location, list_columns=self.list_separators)
+            self.chunk_plan = plan_chunks(self.input_profile)
+
+        if self.chunk_rows:
+            self.chunk_plan['chunk_rows'] = self.chunk_rows
+            self.chunk_plan['row_group_rows'] = min(self.chunk_plan['row_group_rows'], self.chunk_rows)
+
+        recommendation = recommend_resources(self.input_profile)
+        self.ram_required = self.ram_required or recommendation['required_ram']
+        self.disk_required = self.disk_required or recommendation['required_storage_local']
+        self.cores_required = self.cores_required or recommendation['required_cores']
+
+        print(
+            f"Input profile: ~{self.input_profile['estimated_rows']} rows of {self.input_profile['row_bytes']} bytes, "
+            f"{self.chunk_plan['chunk_rows']} rows per chunk, {self.chunk_plan['row_group_rows']} rows per row group"
+        )
+        print(f"Recommended wkube resources: {recommendation}")
+
+        self.profiler.metadata['input_profile'] = self.input_profile
+        self.profiler.metadata['chunk_plan'] = self.chunk_plan
+        self.profiler.metadata['resource_recommendation'] = recommendation
+
+    def get_sort_resource_option_text(self):
+        return get_sort_resource_option_text(self.input_profile['uncompressed_bytes']) if self.input_profile else ''
 
     def preprocess_row(self, row, schema):
         """ Temporary row to validate array represented as string"""
@@ -171,23 +329,9 @@ class CsvRegionalTimeseriesVerificationService():
        
     
     def get_value_from__mapping_pointers(self, pointer_array, root_schema, row):
-        value = None
-        for pointer in pointer_array:
-            if pointer.startswith('&'):
-                value = root_schema[pointer[1:]]
-            elif pointer.startswith('{') and pointer.endswith('}'):
-                if value:
-                    value = value[row[pointer[1:-1]]]
-                else:
-                    value = row[pointer[1:-1]]
-
-            else:
-                value = value[pointer]
-        return value
+        return resolve_pointer(pointer_array, root_schema, row)
     
-    def validate_row_data(self, row):
-        row = CaseInsensitiveDict(row)
-        validation_row = self.preprocess_row(row.copy(), self.rules['root'])
+    def validate_schema(self, validation_row):
         try:
             CustomValidator(
                 validation_row,
@@ -203,19 +347,16 @@ class CsvRegionalTimeseriesVerificationService():
             raise ValueError(
                 f"Invalid data. Template id: {self.dataset_template_id}. Data: {str(validation_error)}. Original exception: {str(validation_error)}"
             )
-        
 
+    def validate_maps_and_harvest_metadata(self, row):
         for key in self.rules['root']['properties']:
             
-            map_documents = self.get_map_documents(key)
+            map_members = self.lookups.map_members.get(key)
 
-            if map_documents:
-                if type(row[key]) == list:
-                    for item in row[key]:
-                        if item not in map_documents:
-                            raise ValueError(f"'{item}' must be one of {map_documents.keys()}" )
-                elif row[key] not in map_documents:
-                    raise ValueError(f"'{row[key]}' must be one of {map_documents.keys()}" )
+            # items of x-split columns are checked per chunk (check_list_members), per row with FAIL_FAST
+            if map_members and key not in self.list_separators:
+                if row[key] not in map_members:
+                    raise ValueError(f"'{row[key]}' must be one of {self.get_map_names(key)}" )
 
             # TODO we will remote this whole block of metadata preparation thing.
             if self.rules['root']['properties'][key]['type'] == 'array':
@@ -260,7 +401,7 @@ class CsvRegionalTimeseriesVerificationService():
                 (row[self.variable_dimension], row[self.unit_dimension])
             ])
 
-
+    def validate_template_validators(self, row, validation_row):
         extra_template_validators = self.rules.get('template_validators')
 
         if extra_template_validators and extra_template_validators != 'not defined':
@@ -276,16 +417,16 @@ class CsvRegionalTimeseriesVerificationService():
                     
                         rhs_value_pointer = condition_object[condition]
 
-                        rhs = self.get_value_from__mapping_pointers(rhs_value_pointer, self.rules, validation_row)
-
                         if condition == 'value_equals':
+                            rhs = self.lookups.resolve(rhs_value_pointer, validation_row)
                             if lhs != rhs:
                                 raise ValueError(
                                     f'{lhs} in {row_key} column must be equal to {rhs}.'
                                 )
                         
                         if condition == 'is_subset_of_map':
-                            if not lhs in rhs:
+                            if not lhs in self.lookups.resolve_members(rhs_value_pointer, validation_row):
+                                rhs = self.get_value_from__mapping_pointers(rhs_value_pointer, self.rules, validation_row)
                                 raise ValueError(
                                     f'{lhs} in {row_key} column must be member of {rhs}.'
                                 )
@@ -301,20 +442,98 @@ class CsvRegionalTimeseriesVerificationService():
                         for key in fcontext:
                             key_pointer = fcontext[key]
 
-                            print(f"Resolving key: {key} with pointer: {key_pointer}")
-
-                            resolved_fcontext[key] = self.get_value_from__mapping_pointers(key_pointer, self.rules, validation_row)
+                            resolved_fcontext[key] = self.lookups.resolve(key_pointer, validation_row)
                         
                         pattern = regexf.format(**resolved_fcontext)
 
                         if not re.match(pattern, lhs.strip()):
                             raise ValueError(f"Value {lhs}  did not match pattern {pattern}")
 
+    def validate_row_data(self, row):
+        row = CaseInsensitiveDict(row)
+
+        with self.profiler.row_stage('schema_checks'):
+            validation_row = self.preprocess_row(row.copy(), self.rules['root'])
+            self.validate_schema(validation_row)
+
+        with self.profiler.row_stage('map_checks'):
+            self.validate_maps_and_harvest_metadata(row)
+
+        with self.profiler.row_stage('template_validators'):
+            self.validate_template_validators(row, validation_row)
 
         return validation_row, row 
           
+    def is_error_budget_exhausted(self, invalid_rows=None):
+        """ Distinct errors are capped at error_budget, so invalid rows are what is counted. """
+        invalid_rows = self.invalid_rows if invalid_rows is None else invalid_rows
+        return invalid_rows > self.error_budget
+
+    def validate_reader_rows(self, reader, stage_name='parsing'):
+        for row in self.profiler.iterate(stage_name, reader):
+            row.pop('restkeys', None)
+            row.pop('restvals', None)
+
+            if not any(value.strip() for value in row.values()):
+                print("Empty row detected, skipping...")
+                continue
+
+            try:
+                validation_row, original_row = self.validate_row_data(row)
+                yield validation_row, original_row
+            except Exception as err:
+                self.invalid_rows += 1
+                if len(self.errors) <= self.error_budget:
+                    self.errors[str(err)] = str(row)
+
+                if self.fail_fast and self.is_error_budget_exhausted():
+                    print(f"More than {self.error_budget} invalid rows. Aborting validation as FAIL_FAST is set.")
+                    self.aborted = True
+                    return
+
+    def get_input_fieldnames(self, input_file):
+        """ Reads the header line of a binary file object unless csv_fieldnames are given. """
+        if self.csv_fieldnames:
+            return self.csv_fieldnames
+        header = input_file.readline().decode('utf-8-sig').lower()
+        return next(csv.reader([header]))
+
+    def pre_validate_sample(self):
+        """
+        Validates a stratified sample (head, tail and random offsets) of the
+        file before the full pass, so broken files fail within seconds.
+        """
+        self.init_validation_metadata()
+
+        with open_location(self.input_location) as input_file:
+            self.input_fieldnames = self.get_input_fieldnames(input_file)
+
+            reader = csv.DictReader(
+                lower_rows(
+                    line.decode('utf-8-sig') for line in iter_sampled_lines(
+                        input_file,
+                        data_start=input_file.tell(),
+                    )
+                ),
+                fieldnames=self.input_fieldnames,
+                restkey='restkeys',
+                restval='restvals'
+            )
+
+            sample = self.create_columnar_chunk()
+            for _, original_row in self.validate_reader_rows(reader, stage_name='sample_validation'):
+                sample.append(original_row)
+
+            self.check_list_members(sample)
+
+        sampled_rows = self.profiler.stage('sample_validation').rows
+        print(f"Pre-validated a sample of {sampled_rows} rows")
+
+        if self.errors:
+            self.raise_validation_errors()
+
     def get_validated_rows(self):
-        with open(self.filename, encoding="utf-8-sig") as csvfile:
+        with open_input(self.input_location, 'r', encoding="utf-8-sig") as csvfile:
             reader = csv.DictReader(
                 lower_rows(csvfile), 
                 fieldnames=self.csv_fieldnames, 
@@ -322,49 +541,41 @@ class CsvRegionalTimeseriesVerificationService():
                 restval='restvals'
             )
 
-            for row in reader:
-                row.pop('restkeys', None)
-                row.pop('restvals', None)
+            self.profiler.stage('parsing').bytes += get_size(self.input_location)
 
-                if not any(value.strip() for value in row.values()):
-                    print("Empty row detected, skipping...")
-                    continue
+            yield from self.validate_reader_rows(reader)
 
-                try:
-                    validation_row, original_row = self.validate_row_data(row)
-                    yield validation_row, original_row
-                except Exception as err:
-                    if len(self.errors) <= 50:
-                        self.errors[str(err)] = str(row)
+    def set_validated_headers(self):
+        # Prepare final header order
+        headers = self.rules['root']['properties'].copy()
 
-    
-    def create_validated_file(self):
-        with open(self.temp_validated_filepath, 'w') as csv_validated_file:
+        self.validated_headers = []
 
-            # Prepare final header order
-            headers = self.rules['root']['properties'].copy()
+        final_dimensions_order = self.rules['root_schema_declarations'].get('final_dimensions_order')
 
-            self.validated_headers = []
+        if final_dimensions_order:
+            for item in final_dimensions_order:
+                if item in headers:
+                    if item not in [self.time_dimension, self.value_dimension]:
+                        self.validated_headers.append(item)
+        else:
+            raise ValueError("'final_dimensions_order' in template is required")
+        
+        for item in headers:
+            used_headers = self.validated_headers + [self.time_dimension, self.value_dimension]
+            if item not in used_headers:
+                self.validated_headers.append(item)
+        
+        self.validated_headers = self.validated_headers + [self.time_dimension, self.value_dimension]
+        # End final order preparation
 
-            final_dimensions_order = self.rules['root_schema_declarations'].get('final_dimensions_order')
+    def get_sort_order_option_text(self):
+        return ' '.join([f"-k{i+1},{i+1}{'n' if self.validated_headers[i] == self.time_dimension else ''}" for i in range(len(self.validated_headers[:-1]))])
 
-            if final_dimensions_order:
-                for item in final_dimensions_order:
-                    if item in headers:
-                        if item not in [self.time_dimension, self.value_dimension]:
-                            self.validated_headers.append(item)
-            else:
-                raise ValueError("'final_dimensions_order' in template is required")
-            
-            for item in headers:
-                used_headers = self.validated_headers + [self.time_dimension, self.value_dimension]
-                if item not in used_headers:
-                    self.validated_headers.append(item)
-            
-            self.validated_headers = self.validated_headers + [self.time_dimension, self.value_dimension]
-            # End final order preparation
+    def create_validated_file(self):
+        self.set_validated_headers()
 
-            
+        with open(self.temp_validated_filepath, 'w') as csv_validated_file:
             writer = csv.DictWriter(csv_validated_file, fieldnames=self.validated_headers, extrasaction='ignore')
 
             writer.writeheader()
@@ -373,11 +584,324 @@ class CsvRegionalTimeseriesVerificationService():
 
             passed_rows = self.create_associated_parquet(rows)
 
-            for _, original_row in passed_rows:
-            
-                writer.writerow(original_row)
+            csv_writing = self.profiler.row_stage('csv_writing')
+
+            for original_row in passed_rows:
+                with csv_writing:
+                    writer.writerow(original_row)
+                csv_writing.rows += 1
         
 
+    def validate_with_duckdb(self):
+        """ Replaces create_validated_file and the shell sort when the execution backend is duckdb. """
+        self.set_validated_headers()
+
+        with open_input(self.input_location) as input_file:
+            self.input_fieldnames = [name.lower() for name in self.get_input_fieldnames(input_file)]
+
+        input_filepath = self.filename
+        input_compression = self.input_compression
+        if input_compression == 'bz2' or is_remote(self.input_location):
+            # DuckDB reads local gzip and zstd only
+            input_filepath = f"{self.filename.split('.csv')[0]}_decompressed.csv"
+            with self.profiler.stage('decompression') as decompression:
+                decompression.bytes += decompress_file(self.input_location, input_filepath)
+            input_compression = None
+
+        try:
+            self.validate_in_duckdb(input_filepath, input_compression)
+        finally:
+            if input_filepath != self.filename:
+                self.delete_local_file(input_filepath)
+
+    def validate_in_duckdb(self, input_filepath, input_compression):
+        with get_duckdb_workspace() as workspace:
+            duckdb_validation = DuckdbValidation(
+                workspace,
+                rules=self.rules,
+                lookups=self.lookups,
+                input_filepath=input_filepath,
+                input_fieldnames=self.input_fieldnames,
+                header=not self.csv_fieldnames,
+                validated_headers=self.validated_headers,
+                input_compression=input_compression,
+            )
+
+            with self.profiler.stage('duckdb_load') as load_stage:
+                load_stage.rows += duckdb_validation.load()
+            load_stage.bytes += os.path.getsize(input_filepath)
+
+            with self.profiler.stage('duckdb_checks'):
+                self.errors, self.invalid_rows = duckdb_validation.find_errors(self.error_budget)
+
+            if self.errors:
+                return
+
+            with self.profiler.stage('duckdb_metadata'):
+                self.validation_metadata = duckdb_validation.harvest_metadata()
+
+            with self.profiler.stage('sort') as sort_stage:
+                duckdb_validation.sort()
+                duckdb_validation.export_sorted_csv(self.temp_sorted_filepath)
+            sort_stage.bytes += os.path.getsize(self.temp_sorted_filepath)
+            print("Validated file sorted")
+
+            with self.profiler.stage('parquet_writing'):
+                duckdb_validation.export_parquet(f"{self.temp_sorted_filepath}.parquet")
+
+    def check_series(self):
+        """
+        Duplicate keys, non-monotonic times and gaps per series of the sorted
+        file. The same pass builds the sparse key-offset index, uploaded as
+        the .index.json supporter.
+        """
+        time_values = self.validation_metadata.get(self.time_dimension)
+
+        # more than 1000 harvested times may be truncated, gaps are then not checked
+        time_grid = None
+        if time_values and len(time_values) <= 1000:
+            time_grid = {float(time_value) for time_value in time_values}
+
+        series_checker = SeriesChecker(
+            key_columns=self.validated_headers[:-2],
+            time_column=self.time_dimension,
+            time_grid=time_grid,
+        )
+
+        with self.profiler.stage('series_checks') as series_stage:
+            series_checks = series_checker.check_file(
+                self.temp_sorted_filepath,
+                index_key_columns=[self.variable_dimension, self.region_dimension],
+            )
+            write_key_index(series_checker.key_index, self.temp_key_index_filepath)
+        series_stage.rows += series_checks['series']
+        series_stage.bytes += os.path.getsize(self.temp_sorted_filepath)
+
+        print(
+            f"{series_checks['series']} series: {series_checks['duplicate_keys']} duplicate keys, "
+            f"{series_checks['non_monotonic']} non-monotonic times, {series_checks['series_with_gaps']} series with gaps"
+        )
+
+        print(f"Key index of {len(series_checker.key_index['ranges'])} keys created")
+
+        self.validation_metadata['series_checks'] = series_checks
+
+        if self.reject_duplicate_keys and series_checks['duplicate_keys']:
+            self.errors[f"{series_checks['duplicate_keys']} duplicate keys"] = str(series_checks['examples']['duplicate_keys'])
+            self.raise_validation_errors()
+
+    def validate_block(self, lines, staging_directory):
+        """ Validates one content block into a sorted run and a parquet within `staging_directory`. """
+        self.init_validation_metadata()
+        self.errors = dict()
+        self.invalid_rows = 0
+
+        reader = csv.DictReader(
+            lower_rows(line.decode('utf-8-sig') for line in lines),
+            fieldnames=self.input_fieldnames,
+            restkey='restkeys',
+            restval='restvals'
+        )
+
+        run_filepath = os.path.join(staging_directory, 'run.csv')
+
+        with open(run_filepath, 'w') as run_file:
+            writer = csv.DictWriter(run_file, fieldnames=self.validated_headers, extrasaction='ignore')
+
+            rows = self.create_associated_parquet(
+                self.validate_reader_rows(reader),
+                parquet_filepath=os.path.join(staging_directory, 'rows.parquet')
+            )
+
+            csv_writing = self.profiler.row_stage('csv_writing')
+
+            for original_row in rows:
+                with csv_writing:
+                    writer.writerow(original_row)
+                csv_writing.rows += 1
+
+        with self.profiler.stage('sort'):
+            subprocess.run(
+                f"sort -t',' {self.get_sort_order_option_text()} {self.get_sort_resource_option_text()} -o {run_filepath} {run_filepath}",
+                capture_output=True,
+                shell=True,
+                check=True
+            )
+
+    def validate_blocks(self):
+        """
+        Incremental counterpart of create_validated_file and the sort step.
+
+        Input is split into content defined blocks. Blocks found in the
+        validation cache reuse their harvested metadata, errors, sorted run
+        and parquet; only new or edited blocks are validated. Sorted runs
+        are then merged with `sort -m` and block parquets concatenated.
+        """
+        self.set_validated_headers()
+
+        self.init_validation_metadata()
+        validation_metadata = self.validation_metadata
+        errors = dict()
+        invalid_rows = 0
+
+        block_hashes = []
+        cached_blocks = 0
+
+        with open_input(self.input_location) as input_file:
+            self.input_fieldnames = self.get_input_fieldnames(input_file)
+
+            # block hashes cover data lines only; the header decides which column a field belongs to
+            cache = ValidationBlockCache(
+                self.validation_cache_directory,
+                {
+                    'rules': self.rules,
+                    'csv_fieldnames': self.csv_fieldnames,
+                    'input_fieldnames': self.input_fieldnames,
+                    'original_filepath': self.original_filepath,
+                }
+            )
+
+            for lines in iter_content_defined_blocks(
+                input_file, average_lines=self.validation_cache_block_lines
+            ):
+                with self.profiler.stage('block_hashing') as block_hashing:
+                    block_hash = get_block_hash(lines)
+                    block_bytes = sum(len(line) for line in lines)
+                block_hashing.bytes += block_bytes
+
+                block_hashes.append(block_hash)
+
+                if cache.has(block_hash):
+                    cached_blocks += 1
+                else:
+                    self.profiler.stage('parsing').bytes += block_bytes
+                    staging_directory = cache.create_staging_directory()
+                    self.validate_block(lines, staging_directory)
+
+                    if self.aborted:
+                        # partial results of an aborted block are never cached
+                        shutil.rmtree(staging_directory, ignore_errors=True)
+                        for error_msg, row_data in self.errors.items():
+                            if len(errors) <= self.error_budget:
+                                errors[error_msg] = row_data
+                        invalid_rows += self.invalid_rows
+                        break
+
+                    cache.commit(staging_directory, block_hash, self.validation_metadata, self.errors, self.invalid_rows)
+
+                with self.profiler.stage('block_merge'):
+                    result = cache.load_result(block_hash)
+                    merge_validation_metadata(validation_metadata, result['validation_metadata'], self.time_dimension)
+                    for error_msg, row_data in result['errors'].items():
+                        if len(errors) <= self.error_budget:
+                            errors[error_msg] = row_data
+                    invalid_rows += result['invalid_rows']
+
+                if self.fail_fast and self.is_error_budget_exhausted(invalid_rows):
+                    print(f"More than {self.error_budget} invalid rows. Aborting validation as FAIL_FAST is set.")
+                    self.aborted = True
+                    break
+
+        self.validation_metadata = validation_metadata
+        self.errors = errors
+        self.invalid_rows = invalid_rows
+
+        if not self.aborted:
+            cache.prune(block_hashes)
+
+        self.profiler.metadata['blocks'] = len(block_hashes)
+        self.profiler.metadata['cached_blocks'] = cached_blocks
+        print(f"{cached_blocks} of {len(block_hashes)} blocks reused from validation cache")
+
+        if self.errors:
+            return
+
+        # Same block may occur more than once; its run is then merged more than once.
+        self.merge_sorted_runs(
+            [cache.get_run_filepath(block_hash) for block_hash in block_hashes],
+            [cache.get_parquet_filepath(block_hash) for block_hash in block_hashes],
+        )
+        print("Validated blocks merged")
+
+    def merge_sorted_runs(self, run_filepaths, parquet_filepaths):
+        """ Merges sorted runs (no header) with `sort -m` into the sorted file and concatenates parquet parts in order. """
+        with open(self.temp_sorted_filepath, 'w') as sorted_file:
+            csv.writer(sorted_file).writerow(self.validated_headers)
+
+        runs_filepath = f"{self.temp_sorted_filepath}.runs"
+        with open(runs_filepath, 'w') as runs_file:
+            runs_file.write(''.join(f"{run_filepath}\0" for run_filepath in run_filepaths))
+
+        with self.profiler.stage('sort') as sort_stage:
+            subprocess.run(
+                f"sort -m -t',' {self.get_sort_order_option_text()} --files0-from={runs_filepath} >> {self.temp_sorted_filepath}",
+                capture_output=True,
+                shell=True,
+                check=True
+            )
+        sort_stage.bytes += os.path.getsize(self.temp_sorted_filepath)
+        self.delete_local_file(runs_filepath)
+
+        with self.profiler.stage('parquet_writing'):
+            concat_parquet_files(parquet_filepaths, f"{self.temp_sorted_filepath}.parquet")
+
+    def validate_shard(self):
+        """
+        Shard task of a sharded validation (see sharding.py): validates the
+        lines starting within the shard byte range into a sorted run, a
+        parquet part and result.json in the shard output directory. Nothing
+        is uploaded; the reduce task merges and registers.
+        """
+        self.set_validated_headers()
+        start, end = self.shard_byte_range
+
+        os.makedirs(self.shard_output_directory, exist_ok=True)
+
+        # a streamed input is only fetched from the shard range on
+        with open_location(self.input_location) as input_file:
+            self.input_fieldnames = self.get_input_fieldnames(input_file)
+            data_start = input_file.tell()
+
+            self.profiler.stage('parsing').bytes += end - start
+            self.validate_block(
+                iter_range_lines(input_file, max(start, data_start), end),
+                self.shard_output_directory
+            )
+
+        write_result(self.shard_output_directory, self.validation_metadata, self.errors, self.invalid_rows)
+        print(f"Shard {start}-{end} validated: {self.invalid_rows} invalid rows")
+
+    def reduce_shards(self):
+        """ Reduce task of a sharded validation: merges shard results in byte order. """
+        self.set_validated_headers()
+        self.init_validation_metadata()
+
+        errors = dict()
+        invalid_rows = 0
+
+        with self.profiler.stage('block_merge'):
+            for shard_directory in self.shard_input_directories:
+                result = load_result(shard_directory)
+                merge_validation_metadata(self.validation_metadata, result['validation_metadata'], self.time_dimension)
+                for error_msg, row_data in result['errors'].items():
+                    if len(errors) <= self.error_budget:
+                        errors[error_msg] = row_data
+                invalid_rows += result['invalid_rows']
+
+        self.errors = errors
+        self.invalid_rows = invalid_rows
+
+        self.profiler.metadata['shards'] = len(self.shard_input_directories)
+
+        if self.errors:
+            return
+
+        self.merge_sorted_runs(
+            [os.path.join(shard_directory, 'run.csv') for shard_directory in self.shard_input_directories],
+            [os.path.join(shard_directory, 'rows.parquet') for shard_directory in self.shard_input_directories],
+        )
+        print(f"{len(self.shard_input_directories)} validated shards merged")
+
     def replace_file_content(self, local_file_path):
         with open(local_file_path, "rb") as file_stream:
             bucket_object_id = self.project_service.replace_bucket_object_id_content(
@@ -390,101 +914,325 @@ class CsvRegionalTimeseriesVerificationService():
         if os.path.exists(filepath):
             os.remove(filepath)
 
-    def create_associated_parquet(self, rows):
-        chunk = []
+    def create_columnar_chunk(self):
+        # csv rows have lowercased keys
+        return ColumnarChunk({field.lower(): separator for field, separator in self.list_separators.items()})
+
+    def get_list_member_values(self, field):
+        if field not in self.list_member_values:
+            self.list_member_values[field] = get_member_values(self.lookups.map_members[field])
+        return self.list_member_values[field]
+
+    def check_list_members(self, chunk):
+        """
+        Checks every x-split item of a chunk against its map in one pass over
+        the flattened items. Returns the indexes of the rows to drop; each
+        counts as an invalid row.
+        """
+        invalid_row_indexes = set()
+
+        with self.profiler.stage('list_map_checks'):
+            list_arrays = chunk.get_list_arrays()
+
+            for field in self.list_separators:
+                if not self.lookups.map_members.get(field) or field.lower() not in list_arrays:
+                    continue
+
+                for row_index, item in find_non_members(list_arrays[field.lower()], self.get_list_member_values(field)):
+                    if row_index in invalid_row_indexes:
+                        continue
+                    invalid_row_indexes.add(row_index)
+                    self.add_list_member_error(field, item, chunk.get_row(row_index))
+
+        return invalid_row_indexes
+
+    def check_row_list_members(self, row):
+        """
+        Checks the x-split items of a single row against their maps, as
+        check_list_members does for a chunk. Returns False (and counts the
+        row as invalid) at the first item missing from its map.
+        """
+        for field, separator in self.list_separators.items():
+            members = self.lookups.map_members.get(field)
+            value = row.get(field.lower())
+            if not members or not value:
+                continue
+
+            for item in value.split(separator):
+                if item not in members:
+                    self.add_list_member_error(field, item, row)
+                    return False
+        return True
+
+    def add_list_member_error(self, field, item, row):
+        self.invalid_rows += 1
+        if len(self.errors) <= self.error_budget:
+            self.errors[f"'{item}' must be one of {self.get_map_names(field)}"] = str(row)
+
+    def create_associated_parquet(self, rows, parquet_filepath=None):
+        """
+        Writes the parquet of validated rows chunk by chunk and yields the
+        rows that also pass the x-split item checks, once their chunk is
+        flushed.
+        """
+        parquet_filepath = parquet_filepath or self.temp_sorted_filepath + '.parquet'
+        chunk = self.create_columnar_chunk()
         rows_written = 0
-        chunksize = 100_000
+        chunk_size = AdaptiveChunkSize(self.chunk_plan['chunk_rows'] if self.chunk_plan else 100_000)
+        row_group_rows = self.chunk_plan['row_group_rows'] if self.chunk_plan else None
         parquet_writer = None
 
-        for validation_row, original_row in rows:
-            chunk.append(validation_row)
-            if len(chunk) >= chunksize:
-                df = pd.DataFrame(chunk)
-                df = self._process_dataframe(df)  # defined below
-                table = self._convert_to_arrow_table(df)
-                
+        def flush(chunk):
+            nonlocal parquet_writer, rows_written
+
+            invalid_row_indexes = self.check_list_members(chunk)
+
+            with self.profiler.stage('parquet_writing') as parquet_writing:
+                table = chunk.to_table(self.value_dimension)
+                if invalid_row_indexes:
+                    table = table.filter(pa.array([i not in invalid_row_indexes for i in range(len(chunk))]))
+
                 if parquet_writer is None:
                     parquet_writer = pq.ParquetWriter(
-                        self.temp_sorted_filepath + '.parquet',
+                        parquet_filepath,
                         table.schema,
                         compression='snappy'
                     )
-                parquet_writer.write_table(table)
-                rows_written += len(chunk)
-                chunk = []
-
-            yield validation_row, original_row
-
-        if chunk:
-            df = pd.DataFrame(chunk)
-            df = self._process_dataframe(df)
-            table = self._convert_to_arrow_table(df)
-            if parquet_writer is None:
-                parquet_writer = pq.ParquetWriter(
-                    self.temp_sorted_filepath + '.parquet',
-                    table.schema,
-                    compression='snappy'
-                )
-            parquet_writer.write_table(table)
-            rows_written += len(chunk)
+                parquet_writer.write_table(table, row_group_size=row_group_rows)
+            parquet_writing.rows += table.num_rows
+            rows_written += table.num_rows
+
+            for i in range(len(chunk)):
+                if i not in invalid_row_indexes:
+                    yield CaseInsensitiveDict(chunk.get_row(i))
+
+        for _, original_row in rows:
+            # FAIL_FAST checks x-split items row by row, so it aborts at the row exhausting the budget, not at a flush
+            if self.fail_fast and not self.check_row_list_members(original_row):
+                if self.is_error_budget_exhausted():
+                    print(f"More than {self.error_budget} invalid rows. Aborting validation as FAIL_FAST is set.")
+                    self.aborted = True
+                    break
+                continue
+
+            chunk.append(original_row)
+            if chunk_size.should_flush(len(chunk)):
+                yield from flush(chunk)
+                chunk = self.create_columnar_chunk()
+
+        if len(chunk):
+            yield from flush(chunk)
 
         if parquet_writer:
             parquet_writer.close()
+        if chunk_size.shrinks:
+            self.profiler.metadata['chunk_shrinks'] = self.profiler.metadata.get('chunk_shrinks', 0) + chunk_size.shrinks
         print(f"✅ Total rows written: {rows_written}")
 
-    def _process_dataframe(self, df):
-        for col in df.columns:
-            if col == self.value_dimension:
-                df[col] = df[col].astype('float32')
-            elif df[col].apply(lambda x: isinstance(x, list)).all():
-                # Leave list columns as-is
-                continue
-            elif df[col].dtype == object:
-                df[col] = df[col].astype('category')
-        return df
-
-    def _convert_to_arrow_table(self, df):
-        arrays = {}
-        for col in df.columns:
-            first_val = next((x for x in df[col] if x is not None), None)
-            if isinstance(first_val, list):
-                arrays[col] = pa.array(df[col], type=pa.list_(pa.string()))
-            elif col == self.value_dimension:
-                arrays[col] = pa.array(df[col], type=pa.float32())
-            else:
-                arrays[col] = pa.array(df[col])
-        return pa.Table.from_arrays(
-            list(arrays.values()), 
-            names=list(arrays.keys())
+    def create_wide_format_file(self):
+        time_meta = self.validation_metadata[f"{self.time_dimension}_meta"]
+
+        if time_meta["min_value"] > time_meta["max_value"]:
+            print('No rows to pivot. Wide format file not created.')
+            return False
+
+        duplicate_keys = self.validation_metadata.get('series_checks', {}).get('duplicate_keys')
+        if duplicate_keys:
+            print(f"{duplicate_keys} duplicate keys. Wide format file not created.")
+            return False
+
+        wide_format_pivot = WideFormatPivot(
+            sorted_filepath=self.temp_sorted_filepath,
+            wide_filepath=self.temp_wide_filepath,
+            time_dimension=self.time_dimension,
+            value_dimension=self.value_dimension,
+            min_time=time_meta["min_value"],
+            max_time=time_meta["max_value"],
         )
+        try:
+            wide_format_pivot()
+        except ValueError as err:
+            print(f"{err}. Wide format file not created.")
+            self.delete_local_file(self.temp_wide_filepath)
+            self.delete_local_file(f"{self.temp_wide_filepath}.parquet")
+            return False
+        return True
+
+    def get_supporter_filename(self, suffix):
+        supporter_filename = f"{self.original_filepath}{suffix}"
+
+        if supporter_filename.startswith("/"):
+            return '/'.join(supporter_filename.split("/")[2:])
+        return '/'.join(supporter_filename.split("/")[1:])
+
+    async def upload_wide_format_supporters(self, project_service):
+        loop = asyncio.get_running_loop()
+
+        with self.profiler.stage('wide_format'):
+            wide_format_created = await loop.run_in_executor(None, self.create_wide_format_file)
+
+        if not wide_format_created:
+            return []
+
+        print("Wide format file created")
+
+        wide_format_files = [
+            (self.temp_wide_filepath, '.wide.csv'),
+            (f"{self.temp_wide_filepath}.parquet", '.wide.csv.parquet'),
+        ]
+
+        bucket_object_ids = await asyncio.gather(*[
+            project_service.add_validation_supporter_from_path(
+                self.get_supporter_filename(suffix),
+                local_filepath,
+            )
+            for local_filepath, suffix in wide_format_files
+        ])
+
+        self.profiler.stage('upload').bytes += sum(
+            os.path.getsize(local_filepath) for local_filepath, _ in wide_format_files
+        )
+        return bucket_object_ids
+
+    def get_upload_sorted_filepath(self):
+        """ Sorted file as uploaded: seekable zstd when output compression is zstd. """
+        if self.output_compression == 'zstd':
+            return self.temp_compressed_sorted_filepath
+        return self.temp_sorted_filepath
+
+    async def upload_and_register(self, wide_format):
+        """
+        Sorted file, parquet supporter and (while they upload) the wide
+        format pivot and its supporters run concurrently. Registration
+        waits for all of them.
+        """
+        async with get_async_project_service(self.job_token) as project_service:
+            uploads = [
+                project_service.replace_bucket_object_id_content_from_path(
+                    self.original_filepath,
+                    self.get_upload_sorted_filepath(),
+                ),
+                project_service.add_validation_supporter_from_path(
+                    self.get_supporter_filename('.parquet'),
+                    f"{self.temp_sorted_filepath}.parquet",
+                ),
+                project_service.add_validation_supporter_from_path(
+                    self.get_supporter_filename('.index.json'),
+                    self.temp_key_index_filepath,
+                ),
+            ]
+            if wide_format:
+                uploads.append(self.upload_wide_format_supporters(project_service))
+
+            with self.profiler.stage('upload') as upload_stage:
+                replaced_bucket_object_id, uploaded_parquet_bucket_object_id, uploaded_index_bucket_object_id, *wide_format_supporters = \
+                    await asyncio.gather(*uploads)
+            print('File replaced')
+
+            upload_stage.bytes += sum(
+                os.path.getsize(filepath)
+                for filepath in [self.get_upload_sorted_filepath(), f"{self.temp_sorted_filepath}.parquet", self.temp_key_index_filepath]
+            )
+
+            supporter_bucket_object_ids = [uploaded_parquet_bucket_object_id, uploaded_index_bucket_object_id]
+            for bucket_object_ids in wide_format_supporters:
+                supporter_bucket_object_ids.extend(bucket_object_ids)
+
+            # Monkey patch serializer
+            def monkey_patched_json_encoder_default(encoder, obj):
+                if isinstance(obj, set):
+                    return list(obj)
+                return json.JSONEncoder.default(encoder, obj)
+
+            json.JSONEncoder.default = monkey_patched_json_encoder_default
+            # Monkey patch serializer
+
+
+            with self.profiler.stage('registration'):
+                await project_service.register_validation(
+                    replaced_bucket_object_id,
+                    self.dataset_template_id,
+                    self.validation_metadata,
+                    supporter_bucket_object_ids
+                )
+
+    def raise_validation_errors(self):
+        print("\n" + "!" * 80)
+        print("!!! INVALID DATA DETECTED !!!".center(80))
+        print("!" * 80)
+        for error_msg, row_data in self.errors.items():
+            print(f"\n--- ERROR ---")
+            print(f"Details: {error_msg}")
+            print(f"Row Data: {row_data}")
+        print("\n" + "!" * 80)
+
+        if self.aborted:
+            raise ValueError("Invalid data: Data does not comply with template rules. Validation aborted early as FAIL_FAST is set.")
+        raise ValueError("Invalid data: Data does not comply with template rules.")
+
+    def upload_job_output(self, local_file_path):
+        with open(local_file_path, "rb") as file_stream:
+            return self.project_service.add_filestream_as_job_output(
+                local_file_path,
+                file_stream,
+            )
 
-    
-                
     def __call__(self):
-        self.set_csv_regional_validation_rules()
+        self.profiler.start()
+        try:
+            self.validate_and_register()
+        finally:
+            self.profiler.metadata['errors'] = len(self.errors)
+            self.profiler.finish(upload=self.upload_job_output)
+
+    def validate_and_register(self):
+        with self.profiler.stage('template_fetch'):
+            self.set_csv_regional_validation_rules()
+
+        # the reduce task of a sharded validation only reads shard results
+        if not self.shard_input_directories:
+            self.input_compression = detect_compression(self.input_location)
+            if self.input_compression:
+                print(f"Input is {self.input_compression} compressed")
+                if self.shard_byte_range:
+                    raise ValueError("Sharded validation requires uncompressed input")
+
+            if self.execution_backend == 'python':
+                self.profile_input()
+
+        if self.shard_byte_range:
+            self.validate_shard()
+            if self.errors:
+                # the reduce task raises for the whole file
+                print(f"{len(self.errors)} distinct errors in shard")
+            return
+
+        if self.sample_pre_validation:
+            if self.input_compression:
+                print("Pre-validation sample skipped: compressed input can not be read at random offsets")
+            else:
+                self.pre_validate_sample()
 
         self.init_validation_metadata()
         
         # try:
-        self.create_validated_file()
+        if self.execution_backend == 'duckdb':
+            self.validate_with_duckdb()
+        elif self.shard_input_directories:
+            self.reduce_shards()
+        elif self.validation_cache_directory:
+            self.validate_blocks()
+        else:
+            self.create_validated_file()
         print('File validated against rules.')
         # except Exception as err:
         #     if len(self.errors) <= 50:
         #         self.errors[str(err)] = str(err)
         
         if self.errors:
-            print("\n" + "!" * 80)
-            print("!!! INVALID DATA DETECTED !!!".center(80))
-            print("!" * 80)
-            for error_msg, row_data in self.errors.items():
-                print(f"\n--- ERROR ---")
-                print(f"Details: {error_msg}")
-                print(f"Row Data: {row_data}")
-            print("\n" + "!" * 80)
-            
             self.delete_local_file(self.temp_validated_filepath)
             print('Temporary validated file deleted')
-            raise ValueError("Invalid data: Data does not comply with template rules.")
+            self.raise_validation_errors()
         
         verify_only = True if os.environ.get('VERIFY_ONLY') in ['True', 'true', '1', 'TRUE'] else False
         if verify_only:
@@ -492,55 +1240,34 @@ class CsvRegionalTimeseriesVerificationService():
             return
 
 
-        sort_order_option_text = ' '.join([f"-k{i+1},{i+1}{'n' if self.validated_headers[i] == self.time_dimension else ''}" for i in range(len(self.validated_headers[:-1]))])
-
-        sort_command = f"head -n1 {self.temp_validated_filepath} >> {self.temp_sorted_filepath} && tail -n+2 {self.temp_validated_filepath} | sort -t',' {sort_order_option_text} >> {self.temp_sorted_filepath}"
+        if not self.validation_cache_directory and not self.shard_input_directories and self.execution_backend == 'python':
+            sort_order_option_text = self.get_sort_order_option_text()
 
-        print(sort_command)
-        print(self.validated_headers)
+            sort_command = f"head -n1 {self.temp_validated_filepath} >> {self.temp_sorted_filepath} && tail -n+2 {self.temp_validated_filepath} | sort -t',' {sort_order_option_text} {self.get_sort_resource_option_text()} >> {self.temp_sorted_filepath}"
 
-        subprocess.run(
-            sort_command,
-            capture_output=True,
-            shell=True
-        )
-        print("Validated file sorted")
+            print(sort_command)
+            print(self.validated_headers)
 
+            with self.profiler.stage('sort') as sort_stage:
+                subprocess.run(
+                    sort_command,
+                    capture_output=True,
+                    shell=True
+                )
+            sort_stage.bytes += os.path.getsize(self.temp_validated_filepath)
+            print("Validated file sorted")
 
-        replaced_bucket_object_id = self.replace_file_content(self.temp_sorted_filepath)
-        print('File replaced')
-
-        
-        s3_parquet_filename = f"{self.original_filepath}.parquet"
-
-        if s3_parquet_filename.startswith("/"):
-            s3_parquet_filename = '/'.join(s3_parquet_filename.split("/")[2:])
-        else:
-            s3_parquet_filename = '/'.join(s3_parquet_filename.split("/")[1:])
-        
-        with open(f"{self.temp_sorted_filepath}.parquet", "rb") as file_stream:
-            uploaded_parquet_bucket_object_id = self.project_service.add_filestream_as_validation_supporter(
-                s3_parquet_filename,
-                file_stream,
-            )
-
-            
-        # Monkey patch serializer
-        def monkey_patched_json_encoder_default(encoder, obj):
-            if isinstance(obj, set):
-                return list(obj)
-            return json.JSONEncoder.default(encoder, obj)
+        self.check_series()
 
-        json.JSONEncoder.default = monkey_patched_json_encoder_default
-        # Monkey patch serializer
+        if self.output_compression == 'zstd':
+            with self.profiler.stage('compression') as compression:
+                compress_seekable(self.temp_sorted_filepath, self.temp_compressed_sorted_filepath)
+            compression.bytes += os.path.getsize(self.temp_sorted_filepath)
+            print(f"Sorted file compressed to {os.path.getsize(self.temp_compressed_sorted_filepath)} bytes")
 
+        wide_format = True if os.environ.get('WIDE_FORMAT_OUTPUT') in ['True', 'true', '1', 'TRUE'] else False
 
-        self.project_service.register_validation(
-            replaced_bucket_object_id,
-            self.dataset_template_id,
-            self.validation_metadata,
-            [uploaded_parquet_bucket_object_id]
-        )
+        asyncio.run(self.upload_and_register(wide_format))
         print('Validation complete')
 
    
\ No newline at end of file
@@ -0,0 +1,160 @@
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_SHARD_BYTES = 512 * 1024**2
+
+# Row by row validation holds parquet chunks and the csv run of a shard; GNU sort needs about the run size
+SHARD_BASE_RAM = 512 * 1024**2
+SHARD_RAM_PER_BYTE = 2
+REDUCE_RAM = 1024**3
+RAM_GRANULARITY = 256 * 1024**2
+
+
+def iter_range_lines(input_file, start, end):
+    """
+    Lines of a binary file object whose first byte lies in [start, end).
+    Byte ranges splitting a file at arbitrary offsets therefore partition
+    its lines; a shard aligns to line boundaries without coordination.
+    """
+    if start > 0:
+        input_file.seek(start - 1)
+        input_file.readline()  # rest of the line owned by the previous range
+    else:
+        input_file.seek(0)
+
+    position = input_file.tell()
+    while position < end:
+        line = input_file.readline()
+        if not line:
+            return
+        yield line
+        position += len(line)
+
+
+def parse_byte_range(byte_range):
+    """ 'start-end' as in SHARD_BYTE_RANGE """
+    start, end = byte_range.split('-')
+    return int(start), int(end)
+
+
+def get_shard_ranges(size, shard_bytes=DEFAULT_SHARD_BYTES):
+    if not size:
+        return [(0, 0)]
+    return [(start, min(start + shard_bytes, size)) for start in range(0, size, shard_bytes)]
+
+
+def round_up_ram(ram):
+    return math.ceil(ram / RAM_GRANULARITY) * RAM_GRANULARITY
+
+
+def get_shard_ram(shard_bytes):
+    return round_up_ram(SHARD_BASE_RAM + SHARD_RAM_PER_BYTE * shard_bytes)
+
+
+def get_shard_directory(filepath, index):
+    return f"shards/{os.path.basename(filepath).split('.csv')[0]}/{index}"
+
+
+def plan_validation(file_sizes, *, dataset_template_id, shard_bytes=DEFAULT_SHARD_BYTES, conf=None, input_base_url=None):
+    """
+    Plan of a sharded validation: per file (`file_sizes` maps file path to
+    bytes) one shard task per byte range and a reduce task that merges
+    the shard results and registers the validation once.
+
+    Tasks are plain dicts (name, required_ram, required_storage_local,
+    required_storage_workflow and the `conf` env of the pod), turned into
+    a WKubeTask DAG by wkube.py or run by run_plan_locally. Shards stream
+    only their range, from the download url signed by the project service
+    or from below `input_base_url` when given, so no pod downloads the
+    whole file.
+    """
+    plan = []
+
+    for filepath, size in file_sizes.items():
+        basename = os.path.basename(filepath)
+        base_conf = {
+            **(conf or {}),
+            'dataset_template_id': str(dataset_template_id),
+            'selected_filenames': filepath,
+        }
+
+        if input_base_url:
+            input_conf = {'INPUT_BASE_URL': input_base_url}
+        else:
+            input_conf = {'STREAM_INPUT': 'True'}
+
+        shards = []
+        for index, (start, end) in enumerate(get_shard_ranges(size, shard_bytes)):
+            shard_directory = get_shard_directory(filepath, index)
+            shards.append({
+                'name': f"Validate {basename} bytes {start}-{end}",
+                'required_ram': get_shard_ram(end - start),
+                # run, parquet and sort temporaries of the shard
+                'required_storage_local': 3 * (end - start),
+                'required_storage_workflow': 2 * (end - start),
+                'conf': {
+                    **base_conf,
+                    **input_conf,
+                    'SHARD_BYTE_RANGE': f"{start}-{end}",
+                    'SHARD_OUTPUT_DIRECTORY': shard_directory,
+                    'output_mappings': f"/code/{shard_directory}/:/mnt/graph/{shard_directory}/",
+                },
+            })
+
+        shards_root = os.path.dirname(get_shard_directory(filepath, 0))
+        plan.append({
+            'filepath': filepath,
+            'size': size,
+            'shards': shards,
+            'reduce': {
+                'name': f"Register validation of {basename}",
+                'required_ram': REDUCE_RAM,
+                # merged csv, its parquet and the shard results
+                'required_storage_local': 3 * size,
+                'required_storage_workflow': 0,
+                'conf': {
+                    **base_conf,
+                    'SHARD_INPUT_DIRECTORIES': ','.join(shard['conf']['SHARD_OUTPUT_DIRECTORY'] for shard in shards),
+                    'input_mappings': f"/mnt/graph/{shards_root}/:/code/{shards_root}/",
+                },
+            },
+        })
+
+    return plan
+
+
+def run_task(conf, job_token=None):
+    """ Runs one planned task in this process, configured like its pod. """
+    from service import CsvRegionalTimeseriesVerificationService
+    from common.streaming import join_location
+
+    filepath = conf['selected_filenames']
+
+    CsvRegionalTimeseriesVerificationService(
+        filename=f"inputs/{filepath.split('/')[-1]}",
+        input_location=join_location(conf['INPUT_BASE_URL'], filepath) if conf.get('INPUT_BASE_URL') else None,
+        stream_input=conf.get('STREAM_INPUT') in ['True', 'true', '1', 'TRUE'],
+        dataset_template_id=conf['dataset_template_id'],
+        job_token=job_token,
+        original_filepath=filepath,
+        shard_byte_range=parse_byte_range(conf['SHARD_BYTE_RANGE']) if conf.get('SHARD_BYTE_RANGE') else None,
+        shard_output_directory=conf.get('SHARD_OUTPUT_DIRECTORY'),
+        shard_input_directories=conf['SHARD_INPUT_DIRECTORIES'].split(',') if conf.get('SHARD_INPUT_DIRECTORIES') else None,
+    )()
+
+
+def run_plan_locally(plan, *, job_token=None, max_workers=None):
+    """
+    In-process executor of a plan: shard tasks of all files run on a
+    process pool (the stand-in for pods on several nodes), then every
+    file is reduced. Inputs are streamed like in a pod, from the bucket of
+    the local backend (ACC_JOB_BACKEND=local) or from INPUT_BASE_URL.
+    """
+    shard_confs = [shard['conf'] for file_plan in plan for shard in file_plan['shards']]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(run_task, shard_confs, [job_token] * len(shard_confs)))
+
+    for file_plan in plan:
+        run_task(file_plan['reduce']['conf'], job_token)
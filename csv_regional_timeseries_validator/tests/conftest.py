@@ -0,0 +1,7 @@
+import os
+import sys
+
+routine_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# routines run from their own directory with common/ copied next to them
+sys.path[:0] = [routine_directory, os.path.dirname(routine_directory)]
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from common.project_service import LocalAjobCliService
+
+
+DIMENSIONS = ['model', 'scenario', 'region', 'variable', 'unit']
+
+RULES = {
+    'root_schema_declarations': {
+        'time_dimension': 'year',
+        'value_dimension': 'value',
+        'unit_dimension': 'unit',
+        'variable_dimension': 'variable',
+        'region_dimension': 'region',
+        'final_dimensions_order': DIMENSIONS + ['tags', 'year', 'value'],
+    },
+    'root': {
+        'type': 'object',
+        'properties': {
+            **{dimension: {'type': 'string'} for dimension in DIMENSIONS},
+            'tags': {'type': 'array', 'x-split': '|', 'items': {'type': 'string'}},
+            'year': {'type': 'number'},
+            'value': {'type': 'number'},
+        },
+        'required': DIMENSIONS + ['year', 'value'],
+    },
+    'map_region': {'r1': {}},
+    'map_variable': {'v1': {'unit': 'u1'}},
+    'map_tags': ['a', 'b'],
+    'template_validators': {},
+}
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('ACC_JOB_BACKEND', 'local')
+    monkeypatch.setenv('ACC_LOCAL_BACKEND_DIRECTORY', 'backend')
+
+    project_service = LocalAjobCliService('backend')
+    # template rules are cached per process by id; test_validation_cache uses 1
+    project_service.write_json({'id': 2, 'rules': RULES}, 'dataset_templates', '2.json')
+    os.makedirs('inputs')
+    return project_service
+
+
+def test_fail_fast_stops_at_list_member_errors(backend):
+    from service import CsvRegionalTimeseriesVerificationService
+
+    with open('inputs/data.csv', 'w') as input_file:
+        input_file.write('model,scenario,region,variable,unit,tags,year,value\n')
+        # every tenth row has an x-split item outside map_tags; all rows fit in one parquet chunk
+        for i in range(2000):
+            input_file.write(f"m1,s1,r1,v1,u1,{'a|x' if i % 10 == 5 else 'a|b'},{i},1\n")
+
+    service = CsvRegionalTimeseriesVerificationService(
+        filename='inputs/data.csv',
+        dataset_template_id=2,
+        job_token=None,
+        original_filepath='project/data.csv',
+        fail_fast=True,
+        error_budget=3,
+    )
+    with pytest.raises(ValueError, match='FAIL_FAST'):
+        service()
+
+    assert service.aborted
+    assert service.invalid_rows == 4
+    assert list(service.errors) == ["'x' must be one of ['a', 'b']"]
@@ -0,0 +1,46 @@
+import pyarrow as pa
+
+from list_columns import ColumnarChunk, find_non_members, get_member_values, split_list_column
+
+
+def test_split_list_column():
+    column = split_list_column(['a|b', '', 'c', 'b|b|a'], '|')
+
+    assert column.to_pylist() == [['a', 'b'], [], ['c'], ['b', 'b', 'a']]
+    assert column.type == pa.list_(pa.dictionary(pa.int32(), pa.string()))
+    # items are dictionary encoded once per distinct value
+    assert column.flatten().dictionary.to_pylist() == ['a', 'b', 'c']
+
+
+def test_split_list_column_edge_cases():
+    assert split_list_column(['', ''], '|').to_pylist() == [[], []]
+    assert split_list_column([], '|').to_pylist() == []
+    # empty items between separators are kept, as str.split keeps them
+    assert split_list_column(['a||b', 'a.b'], '||').to_pylist() == [['a', 'b'], ['a.b']]
+    assert split_list_column(['a||b'], '|').to_pylist() == [['a', '', 'b']]
+
+
+def test_find_non_members():
+    members = get_member_values({'a', 'b', 1.5})
+    column = split_list_column(['a|x', '', 'b', 'y|a|x'], '|')
+
+    assert members.to_pylist() == ['a', 'b']
+    assert find_non_members(column, members) == [(0, 'x'), (3, 'y'), (3, 'x')]
+    assert find_non_members(split_list_column(['a|b', 'b'], '|'), members) == []
+    assert find_non_members(split_list_column(['', ''], '|'), members) == []
+
+
+def test_columnar_chunk():
+    chunk = ColumnarChunk({'tags': '|'})
+    chunk.append({'variable': 'v1', 'tags': 'a|b', 'value': '1.5'})
+    chunk.append({'value': '2', 'variable': 'v2', 'tags': ''})
+
+    table = chunk.to_table('value')
+
+    assert len(chunk) == 2
+    assert chunk.get_row(1) == {'variable': 'v2', 'tags': '', 'value': '2'}
+    assert table.column_names == ['variable', 'tags', 'value']
+    assert table.column('tags').to_pylist() == [['a', 'b'], []]
+    assert table.column('value').type == pa.float32()
+    assert table.column('value').to_pylist() == [1.5, 2.0]
+    assert pa.types.is_dictionary(table.column('variable').type)
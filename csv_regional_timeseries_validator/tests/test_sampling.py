@@ -0,0 +1,76 @@
+import io
+import csv
+
+from sampling import has_odd_quotes, iter_sampled_lines
+
+
+def get_records(lines):
+    return list(csv.reader(io.StringIO(b''.join(lines).decode())))
+
+
+def write_lines(count, multiline_every=None):
+    """ Data lines of three fields; every `multiline_every`th record has a quoted note spanning two lines. """
+    lines = []
+    for i in range(count):
+        if multiline_every and i % multiline_every == 0:
+            lines += [f'{i},"note ""{i}"" starts\n'.encode(), f'and ends",{i}.5\n'.encode()]
+        else:
+            lines.append(f'{i},plain,{i}.5\n'.encode())
+    return lines
+
+
+def test_has_odd_quotes():
+    assert not has_odd_quotes(b'a,b,c\n')
+    assert not has_odd_quotes(b'a,"b ""quoted"" text",c\n')
+    assert has_odd_quotes(b'a,"b starts\n')
+    assert has_odd_quotes(b'ends ""here"" b",c\n')
+
+
+def test_head_reads_until_quotes_balance():
+    lines = write_lines(10, multiline_every=3)
+    input_file = io.BytesIO(b'id,note,value\n' + b''.join(lines))
+
+    # the 5th line opens the quoted note of record 3
+    head = list(iter_sampled_lines(input_file, data_start=14, head_lines=5, tail_lines=0, random_offsets=0))
+
+    assert head == lines[:6]
+    assert [record[0] for record in get_records(head)] == ['0', '1', '2', '3']
+
+
+def test_tail_starts_at_a_record():
+    lines = write_lines(30, multiline_every=2)
+    content = b''.join(lines)
+
+    for tail_lines in range(1, 8):
+        sample = list(iter_sampled_lines(
+            io.BytesIO(content), data_start=0, head_lines=1, tail_lines=tail_lines, random_offsets=0, tail_bytes=200,
+        ))
+        tail = sample[2:]  # the head is the two lines of record 0
+
+        assert content.endswith(b''.join(tail))
+        assert all(len(record) == 3 for record in get_records(tail))
+
+
+def test_random_windows_skip_quoted_lines():
+    lines = write_lines(2000, multiline_every=7)
+    content = b''.join(lines)
+
+    def sample(**kwargs):
+        return list(iter_sampled_lines(io.BytesIO(content), data_start=0, head_lines=10, seed=0, **kwargs))
+
+    head = sample(tail_lines=0, random_offsets=0)
+    tail = sample(tail_lines=10, random_offsets=0)[len(head):]
+    windows = sample(tail_lines=10, random_offsets=100)[len(head):-len(tail)]
+
+    # windows with a line of odd quote count are dropped whole; the rest are full lines of the file
+    assert len(windows) > 100
+    assert not any(has_odd_quotes(line) for line in windows)
+    assert set(windows) <= set(lines)
+
+
+def test_small_file():
+    lines = write_lines(5)
+
+    sample = list(iter_sampled_lines(io.BytesIO(b''.join(lines)), data_start=0, head_lines=10))
+
+    assert sample == lines
@@ -0,0 +1,39 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from timeseries_reader import ParquetTimeseriesReader, SortedCsvReader
+
+ROWS = [
+    ('emissions|co2', 'europe', '2030', '3.0'),
+    ('emissions|co2', 'world', '2020', '1.0'),
+    ('emissions|co2', 'world', '2050', '2.0'),
+    ('population', 'world', '2020', '8.0'),
+]
+
+
+def test_sorted_csv_reader(tmp_path):
+    csv_filepath = tmp_path / 'data.csv'
+    csv_filepath.write_text('variable,region,year,value\n' + ''.join(','.join(row) + '\n' for row in ROWS))
+
+    with SortedCsvReader(str(csv_filepath), key_columns=['variable', 'region'], time_column='year') as reader:
+        table = reader.query(('Emissions|CO2', 'World'), time_range=(2020, 2040))
+        assert reader.query(('missing', 'world')).num_rows == 0
+
+    assert table.column('value').to_pylist() == ['1.0']
+
+
+def test_parquet_reader_in_input_order(tmp_path):
+    parquet_filepath = tmp_path / 'data.csv.parquet'
+    rows = list(reversed(ROWS))
+    pq.write_table(
+        pa.table({
+            name: [row[index] for row in rows] for index, name in enumerate(['variable', 'region', 'year', 'value'])
+        }),
+        parquet_filepath,
+        row_group_size=2,
+    )
+
+    reader = ParquetTimeseriesReader(str(parquet_filepath), key_columns=['variable', 'region'], time_column='year')
+
+    assert reader.query(('Emissions|CO2', 'World')).column('year').to_pylist() == ['2020', '2050']
+    assert reader.query(('emissions|co2', 'world'), time_range=(2040, 2060)).column('value').to_pylist() == ['2.0']
@@ -0,0 +1,72 @@
+import os
+import json
+import glob
+
+import pytest
+
+from common.project_service import LocalAjobCliService
+
+
+DIMENSIONS = ['model', 'scenario', 'region', 'variable', 'unit']
+
+RULES = {
+    'root_schema_declarations': {
+        'time_dimension': 'year',
+        'value_dimension': 'value',
+        'unit_dimension': 'unit',
+        'variable_dimension': 'variable',
+        'region_dimension': 'region',
+        'final_dimensions_order': DIMENSIONS + ['year', 'value'],
+    },
+    'root': {
+        'type': 'object',
+        'properties': {
+            **{dimension: {'type': 'string'} for dimension in DIMENSIONS},
+            'year': {'type': 'number'},
+            'value': {'type': 'number'},
+        },
+        'required': DIMENSIONS + ['year', 'value'],
+    },
+    'map_region': {'r1': {}, 'r2': {}},
+    'map_variable': {'v1': {'unit': 'u1'}},
+    'template_validators': {},
+}
+
+ROWS = ''.join(f"m{i % 2 + 1},s{i % 3 + 1},r{i % 2 + 1},v1,u1,{2000 + i},{i}.5\n" for i in range(40))
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('ACC_JOB_BACKEND', 'local')
+    monkeypatch.setenv('ACC_LOCAL_BACKEND_DIRECTORY', 'backend')
+
+    project_service = LocalAjobCliService('backend')
+    project_service.write_json({'id': 1, 'rules': RULES}, 'dataset_templates', '1.json')
+    os.makedirs('inputs')
+    return project_service
+
+
+def validate(header):
+    from service import CsvRegionalTimeseriesVerificationService
+
+    with open('inputs/data.csv', 'w') as input_file:
+        input_file.write(f"{header},region,variable,unit,year,value\n{ROWS}")
+
+    CsvRegionalTimeseriesVerificationService(
+        filename='inputs/data.csv',
+        dataset_template_id=1,
+        job_token=None,
+        original_filepath='project/data.csv',
+        validation_cache_directory='cache',
+        validation_cache_block_lines=8,
+    )()
+
+    with open(glob.glob('backend/validation_details/*.json')[0]) as details_file:
+        return json.load(details_file)['validation_metadata']
+
+
+def test_changed_header_is_not_served_from_cache(backend):
+    assert sorted(validate('model,scenario')['model']) == ['m1', 'm2']
+    # same data lines, swapped column names
+    assert sorted(validate('scenario,model')['model']) == ['s1', 's2', 's3']
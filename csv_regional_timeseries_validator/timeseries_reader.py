@@ -0,0 +1,270 @@
+import os
+import csv
+import json
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from common.compression import detect_compression
+
+INDEX_VERSION = 1
+
+
+def parse_line(line):
+    """ Fields of one csv line (bytes); quoted lines go through the csv module. """
+    line = line.rstrip(b'\r\n')
+    if b'"' not in line:
+        return line.decode().split(',')
+    return next(csv.reader([line.decode()]))
+
+
+def parse_header_line(header_line):
+    return parse_line(header_line.decode('utf-8-sig').encode())
+
+
+class KeyIndexBuilder():
+    """
+    Sparse key-offset index of a sorted csv fed line by line, so it can be
+    built by a pass that parses the lines anyway (see SeriesChecker). For
+    every combination of `key_columns` it keeps the byte ranges of its
+    runs. Rows of a key are contiguous per leading sort prefix, so a key
+    has one range per run instead of one entry per row; adjacent runs are
+    merged.
+    """
+
+    def __init__(self, header_line, *, key_columns, time_column):
+        self.columns = parse_header_line(header_line)
+        self.key_columns = key_columns
+        self.time_column = time_column
+        self.key_indexes = [self.columns.index(column) for column in key_columns]
+
+        self.ranges = {}
+        self.data_offset = len(header_line)
+        self.offset = self.data_offset
+        self.previous_key = None
+        self.run_start = self.offset
+
+    def add(self, fields, line_length):
+        """ Parsed fields and length in bytes of the next line. """
+        if len(fields) >= len(self.columns):
+            key = tuple(fields[i] for i in self.key_indexes)
+            if key != self.previous_key:
+                if self.previous_key is not None:
+                    add_range(self.ranges, self.previous_key, self.run_start, self.offset)
+                self.previous_key = key
+                self.run_start = self.offset
+        self.offset += line_length
+
+    def get_index(self):
+        if self.previous_key is not None:
+            add_range(self.ranges, self.previous_key, self.run_start, self.offset)
+            self.previous_key = None
+
+        return {
+            'version': INDEX_VERSION,
+            'columns': self.columns,
+            'key_columns': self.key_columns,
+            'time_column': self.time_column,
+            'size': self.offset,
+            'data_offset': self.data_offset,
+            'ranges': [[list(key), key_ranges] for key, key_ranges in self.ranges.items()],
+        }
+
+
+def build_key_index(sorted_filepath, *, key_columns, time_column):
+    """ Key index (see KeyIndexBuilder) of a sorted csv in a pass of its own. """
+    with open(sorted_filepath, 'rb') as sorted_file:
+        builder = KeyIndexBuilder(sorted_file.readline(), key_columns=key_columns, time_column=time_column)
+        for line in sorted_file:
+            builder.add(parse_line(line), len(line))
+
+    return builder.get_index()
+
+
+def add_range(ranges, key, start, end):
+    key_ranges = ranges.setdefault(key, [])
+    if key_ranges and key_ranges[-1][1] == start:
+        key_ranges[-1][1] = end
+    else:
+        key_ranges.append([start, end])
+
+
+def write_key_index(index, index_filepath):
+    with open(index_filepath, 'w') as index_file:
+        json.dump(index, index_file)
+
+
+def read_key_index(index_filepath):
+    with open(index_filepath) as index_file:
+        return json.load(index_file)
+
+
+class SortedCsvReader():
+    """
+    Random access to a sorted regional timeseries csv (as uploaded by the
+    validator) through mmap and its key index (`<csv>.index.json`
+    supporter; built on open when missing or stale).
+
+        reader = SortedCsvReader('data.csv', key_columns=['variable', 'region'], time_column='year')
+        table = reader.query(('Emissions|CO2', 'World'), time_range=(2020, 2050))
+
+    Only the byte ranges of a key are parsed (pyarrow.csv over the mapped
+    pages, every column as string), so a query costs the size of its rows,
+    not of the file. Keys are matched lower cased, as the validator lower
+    cases its output.
+    """
+
+    def __init__(self, csv_filepath, *, index_filepath=None, key_columns=None, time_column=None):
+        if detect_compression(csv_filepath):
+            raise ValueError(f"{csv_filepath} is compressed; decompress it with common.compression.decompress_file first")
+
+        self.csv_filepath = csv_filepath
+        self.index_filepath = index_filepath or f"{csv_filepath}.index.json"
+
+        index = read_key_index(self.index_filepath) if os.path.exists(self.index_filepath) else None
+        if not index or index['size'] != os.path.getsize(csv_filepath) or (
+            key_columns and index['key_columns'] != key_columns
+        ):
+            if not key_columns or not time_column:
+                raise ValueError("key_columns and time_column are required to build a missing or stale index")
+            index = build_key_index(csv_filepath, key_columns=key_columns, time_column=time_column)
+            write_key_index(index, self.index_filepath)
+
+        self.columns = index['columns']
+        self.key_columns = index['key_columns']
+        self.time_column = index['time_column']
+        self.ranges = {tuple(key): key_ranges for key, key_ranges in index['ranges']}
+
+        # Arrow's own mapping: buffers of a query keep it alive, so close() never waits for them
+        self.mmap = pa.memory_map(csv_filepath) if index['size'] else None
+
+    def keys(self):
+        return self.ranges.keys()
+
+    def read_range(self, start, end):
+        buffer = self.mmap.read_at(end - start, start)
+        return pa_csv.read_csv(
+            pa.BufferReader(buffer),
+            read_options=pa_csv.ReadOptions(column_names=self.columns),
+            convert_options=pa_csv.ConvertOptions(column_types={column: pa.string() for column in self.columns}),
+        )
+
+    def query(self, key, time_range=None):
+        """ Rows of `key` (values of the key columns), optionally with time in [start, end], as an Arrow table. """
+        key = tuple(value.lower() for value in key)
+        tables = [self.read_range(start, end) for start, end in self.ranges.get(key, [])]
+        if not tables:
+            return pa.table({column: pa.array([], pa.string()) for column in self.columns})
+
+        table = pa.concat_tables(tables)
+        if time_range:
+            time = pc.cast(table[self.time_column], pa.float64())
+            table = table.filter(pc.and_(pc.greater_equal(time, time_range[0]), pc.less_equal(time, time_range[1])))
+        return table
+
+    def close(self):
+        if self.mmap:
+            self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+class ParquetTimeseriesReader():
+    """
+    Random access to the parquet supporter of a validated file. Only the
+    key and time columns are read up front and ordered by key and time;
+    the supporter itself stays on disk in the order it was written (sorted
+    by the duckdb backend, in input order by the python backend). A query
+    finds the rows of its key (binary search over time within the key's
+    run) and reads just the row groups holding them. Keys are matched
+    lower cased, as for SortedCsvReader.
+
+        reader = ParquetTimeseriesReader('data.csv.parquet', key_columns=['variable', 'region'], time_column='year')
+        table = reader.query(('Emissions|CO2', 'World'), time_range=(2020, 2050))
+    """
+
+    def __init__(self, parquet_filepath, *, key_columns, time_column, columns=None):
+        self.key_columns = key_columns
+        self.time_column = time_column
+        self.columns = columns
+
+        self.parquet_file = pq.ParquetFile(parquet_filepath, memory_map=True)
+        metadata = self.parquet_file.metadata
+        self.row_group_starts = np.cumsum(
+            [0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+        )
+
+        key_table = self.parquet_file.read(columns=key_columns + [time_column])
+
+        # time may be stored as string; ordered and searched as numbers
+        times = pc.cast(self.decode(key_table[time_column]), pa.float64())
+        sort_table = pa.table(
+            [self.decode(key_table[column]) for column in key_columns] + [times],
+            names=key_columns + [time_column]
+        )
+        # row numbers of the file in key and time order
+        self.order = pc.sort_indices(
+            sort_table, sort_keys=[(name, 'ascending') for name in sort_table.column_names]
+        ).to_numpy().astype(np.int64)
+        self.times = times.to_numpy()[self.order]
+
+        # runs of equal keys in that order
+        boundaries = np.zeros(len(self.order), dtype=bool)
+        boundaries[:1] = True
+        for column in key_columns:
+            codes = pc.dictionary_encode(sort_table[column]).combine_chunks().indices.to_numpy()[self.order]
+            boundaries[1:] |= codes[1:] != codes[:-1]
+
+        starts = np.flatnonzero(boundaries)
+        stops = np.append(starts[1:], len(self.order))
+        key_values = [sort_table[column].take(pa.array(self.order[starts])).to_pylist() for column in key_columns]
+        self.ranges = {
+            key: (int(start), int(stop))
+            for key, start, stop in zip(zip(*key_values), starts, stops)
+        }
+
+    @staticmethod
+    def decode(chunked_array):
+        if pa.types.is_dictionary(chunked_array.type):
+            return pc.cast(chunked_array, chunked_array.type.value_type)
+        return chunked_array
+
+    def keys(self):
+        return self.ranges.keys()
+
+    def get_empty_table(self):
+        schema = self.parquet_file.schema_arrow
+        if self.columns:
+            schema = pa.schema([schema.field(column) for column in self.columns])
+        return schema.empty_table()
+
+    def query(self, key, time_range=None):
+        """ Rows of `key` ordered by time, optionally with time in [start, end]. """
+        start, end = self.ranges.get(tuple(value.lower() for value in key), (0, 0))
+        if time_range and end > start:
+            times = self.times[start:end]
+            start, end = (
+                start + int(np.searchsorted(times, time_range[0], side='left')),
+                start + int(np.searchsorted(times, time_range[1], side='right')),
+            )
+        if end <= start:
+            return self.get_empty_table()
+
+        rows = self.order[start:end]
+        row_groups = np.searchsorted(self.row_group_starts, rows, side='right') - 1
+        read_row_groups = np.unique(row_groups)
+
+        table = self.parquet_file.read_row_groups(read_row_groups.tolist(), columns=self.columns)
+
+        # position of every row within the concatenated row groups that were read
+        read_starts = np.cumsum(
+            [0] + [self.row_group_starts[i + 1] - self.row_group_starts[i] for i in read_row_groups[:-1]]
+        )
+        positions = read_starts[np.searchsorted(read_row_groups, row_groups)] + rows - self.row_group_starts[row_groups]
+        return table.take(pa.array(positions))
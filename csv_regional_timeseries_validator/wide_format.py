@@ -0,0 +1,136 @@
+import csv
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class WideFormatPivot():
+    """
+    Pivots sorted long format regional timeseries into IAMC style wide format.
+
+    Input must be sorted by all dimension columns followed by time dimension
+    (as produced by the validator sort step). Only one dimension key is held
+    in memory at a time, plus one chunk of pivoted rows for parquet writing.
+
+    Raises ValueError for a non-integer time or a key with the same time
+    twice, which have no single wide format cell.
+    """
+
+    def __init__(
+        self,
+        *,
+        sorted_filepath,
+        wide_filepath,
+        time_dimension,
+        value_dimension,
+        min_time,
+        max_time,
+        chunksize=100_000
+    ):
+        self.sorted_filepath = sorted_filepath
+        self.wide_filepath = wide_filepath
+        self.time_dimension = time_dimension
+        self.value_dimension = value_dimension
+
+        self.years = list(range(int(min_time), int(max_time) + 1))
+        self.year_index = {year: i for i, year in enumerate(self.years)}
+
+        self.chunksize = chunksize
+
+    def get_wide_rows(self, reader, key_indexes, time_index, value_index):
+        current_key = None
+        current_values = None
+
+        for row in reader:
+            if not row:
+                continue
+
+            key = tuple(row[i] for i in key_indexes)
+
+            if key != current_key:
+                if current_key is not None:
+                    yield current_key, current_values
+                current_key = key
+                current_values = [None] * len(self.years)
+
+            time = float(row[time_index])
+            if not time.is_integer():
+                raise ValueError(f"Non-integer {self.time_dimension} {row[time_index]} of {key} has no wide format column")
+
+            year_index = self.year_index[int(time)]
+            if current_values[year_index] is not None:
+                raise ValueError(f"Duplicate {self.time_dimension} {row[time_index]} of {key}")
+            current_values[year_index] = row[value_index].strip()
+
+        if current_key is not None:
+            yield current_key, current_values
+
+    def write_parquet_chunk(self, parquet_writer, key_headers, chunk):
+        arrays = []
+        for i in range(len(key_headers)):
+            arrays.append(
+                pa.array([key[i] for key, _ in chunk], type=pa.string()).dictionary_encode()
+            )
+
+        for i in range(len(self.years)):
+            arrays.append(
+                pa.array(
+                    [float(values[i]) if values[i] else None for _, values in chunk],
+                    type=pa.float32()
+                )
+            )
+
+        table = pa.Table.from_arrays(
+            arrays,
+            names=key_headers + [str(year) for year in self.years]
+        )
+
+        if parquet_writer is None:
+            parquet_writer = pq.ParquetWriter(
+                self.wide_filepath + '.parquet',
+                table.schema,
+                compression='snappy'
+            )
+        parquet_writer.write_table(table)
+        return parquet_writer
+
+    def __call__(self):
+        rows_written = 0
+        parquet_writer = None
+
+        with open(self.sorted_filepath, newline='') as sorted_file, \
+                open(self.wide_filepath, 'w', newline='') as wide_file:
+
+            reader = csv.reader(sorted_file)
+            headers = next(reader)
+
+            time_index = headers.index(self.time_dimension)
+            value_index = headers.index(self.value_dimension)
+            key_indexes = [
+                i for i in range(len(headers)) if i not in [time_index, value_index]
+            ]
+            key_headers = [headers[i] for i in key_indexes]
+
+            writer = csv.writer(wide_file)
+            writer.writerow(key_headers + [str(year) for year in self.years])
+
+            chunk = []
+            for key, values in self.get_wide_rows(reader, key_indexes, time_index, value_index):
+                writer.writerow(
+                    list(key) + [value or '' for value in values]
+                )
+                chunk.append((key, values))
+
+                if len(chunk) >= self.chunksize:
+                    parquet_writer = self.write_parquet_chunk(parquet_writer, key_headers, chunk)
+                    rows_written += len(chunk)
+                    chunk = []
+
+            if chunk:
+                parquet_writer = self.write_parquet_chunk(parquet_writer, key_headers, chunk)
+                rows_written += len(chunk)
+
+        if parquet_writer:
+            parquet_writer.close()
+
+        print(f"✅ Total wide rows written: {rows_written}")
+        return rows_written
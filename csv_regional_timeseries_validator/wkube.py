@@ -1,70 +1,57 @@
+import os
 from accli import WKubeTask
+from sharding import DEFAULT_SHARD_BYTES, plan_validation
+
+# Sharded validation of large uploads (see sharding.py):
+#
+#   selected_filenames=forestnav/pathway/a.csv,forestnav/pathway/b.csv
+#   selected_filesizes=21474836480,1048576
+#   dataset_template_id=4
+#
+# Every file fans out into shard pods validating a byte range each; a reduce
+# callback merges their results from workflow storage and registers once.
+
+
+def get_wkube_task(task):
+    return WKubeTask(
+        name=task['name'],
+        # repository root as build context, so that common/ is copied (see Dockerfile)
+        job_folder='../',
+        docker_filename="csv_regional_timeseries_validator/Dockerfile",
+        command="python main.py",
+        required_cores=1,
+        required_ram=task['required_ram'],
+        required_storage_local=task['required_storage_local'],
+        required_storage_workflow=max(task['required_storage_workflow'], 1024),
+        timeout=3600,
+        conf=task['conf'],
+    )
 
-# regional_validator = WKubeTask(
-#     name="Buffered Python Test",
-#     job_folder='./',
-#     # repo_url="https://github.com/iiasa/accelerator-common-routines.git",
-#     # repo_branch="master",
-#     docker_filename="Dockerfile.wkube",
-#     command="python main.py",
-#     required_cores=1,
-#     required_ram=1024*1024*1024,
-#     required_storage_local=1024*1024*1024,
-#     required_storage_workflow=1024,
-#     timeout=3600,
-#     conf={
-#         "dataset_template_id": 4,
-#         "VERIFY_ONLY":'True',
-#         "input_mappings": "acc://forestnav/pathway/pathway_sample.csv:/code/inputs/input.csv"
-#     }
-# )
 
+def build_validation_dag(plan):
+    root = WKubeTask(name='Sharded regional timeseries validation')
 
-root = WKubeTask(name='Local Experiments')
+    for file_plan in plan:
+        file_task = WKubeTask(name=f"Validate {os.path.basename(file_plan['filepath'])}")
 
-args = [1,2]
+        for shard in file_plan['shards']:
+            file_task.add_child(get_wkube_task(shard))
 
-for input in args:
-    first = WKubeTask(
-        name="Test First",
-        job_folder='./',
-        # repo_url="https://github.com/iiasa/accelerator-common-routines.git",
-        # repo_branch="master",
-        docker_filename="Dockerfile.wkube",
-        command=f"sleep {60*10}",
-        required_cores=1,
-        required_ram=1024*1024*1024,
-        required_storage_local=1024*1024*1024,
-        required_storage_workflow=1024,
-        timeout=3600,
-        conf={
-            "dataset_template_id": 4,
-            "VERIFY_ONLY":'True',
-            "input_mappings": "acc://forestnav/pathway/pathway_sample.csv:/code/inputs/input.csv;/mnt/data/inputs/:/code/inputs/",
-            "output_mappings": "/mnt/data/inputs/:/mnt/graph/outputs/"
-        }
-    )
+        file_task.add_callback(get_wkube_task(file_plan['reduce']))
 
-    second = WKubeTask(
-        name="Test Second",
-        job_folder='./',
-        # repo_url="https://github.com/iiasa/accelerator-common-routines.git",
-        # repo_branch="master",
-        docker_filename="Dockerfile.wkube",
-        command=f"sleep {60*60}",
-        required_cores=1,
-        required_ram=1024*1024*1024,
-        required_storage_local=1024*1024*1024,
-        required_storage_workflow=1024,
-        timeout=3600,
-        conf={
-            "dataset_template_id": 4,
-            "VERIFY_ONLY":'True',
-            "input_mappings": "/mnt/graph/outputs/:/code/inputs/",
-            "otuput_mappings": "/code/inputs/:acc://out/"
-        }
-    )
+        root.add_child(file_task)
 
-    first.add_callback(second)
+    return root
 
-    root.add_child(first)
\ No newline at end of file
+
+filepaths = [filepath for filepath in os.environ.get('selected_filenames', '').split(',') if filepath]
+filesizes = [int(size) for size in os.environ.get('selected_filesizes', '').split(',') if size]
+
+root = build_validation_dag(
+    plan_validation(
+        dict(zip(filepaths, filesizes)),
+        dataset_template_id=os.environ.get('dataset_template_id'),
+        shard_bytes=int(os.environ.get('SHARD_BYTES', DEFAULT_SHARD_BYTES)),
+        input_base_url=os.environ.get('INPUT_BASE_URL'),
+    )
+)
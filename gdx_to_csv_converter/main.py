@@ -0,0 +1,31 @@
+import os
+import json
+from service import GdxToCsvConversionService
+
+input_directory = 'inputs'
+
+filepaths = os.environ.get('selected_filenames', '').split(',')
+
+symbols = [
+    symbol.strip() for symbol in os.environ.get('GDX_SYMBOLS', '').split(',') if symbol.strip()
+]
+
+max_workers = os.environ.get('GDX_READ_WORKERS')
+
+
+for filepath in filepaths:
+
+    print(f"_____________Converting file: {filepath} _____________")
+
+    gdx_to_csv_conversion_service = GdxToCsvConversionService(
+        filename=f"inputs/{filepath.split('/')[-1]}",
+        dataset_template_id=os.environ.get('dataset_template_id'),
+        job_token=os.environ.get('ACC_JOB_TOKEN'),
+        dimension_mapping=json.loads(os.environ['GDX_DIMENSION_MAPPING']),
+        symbols=symbols or None,
+        max_workers=int(max_workers) if max_workers else None
+    )
+
+    gdx_to_csv_conversion_service()
+
+    print(f"_____________DONE: Converting file: {filepath} _____________")
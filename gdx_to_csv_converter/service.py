@@ -0,0 +1,356 @@
+import os
+import csv
+import string
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from common.project_service import get_project_service
+
+
+def open_gdx(gdx_filepath):
+    # imported where GDX files are read, so the rest of the module works without a GAMS installation
+    from gams.core import gdx
+
+    handle = gdx.new_gdxHandle_tp()
+
+    system_directory = os.environ.get('GAMS_SYSTEM_DIRECTORY')
+    if system_directory:
+        rc, message = gdx.gdxCreateD(handle, system_directory, gdx.GMS_SSSIZE)
+    else:
+        rc, message = gdx.gdxCreate(handle, gdx.GMS_SSSIZE)
+
+    if not rc:
+        raise RuntimeError(f"Could not load GDX library: {message}")
+
+    rc, error_number = gdx.gdxOpenRead(handle, gdx_filepath)
+    if not rc:
+        raise RuntimeError(f"Could not open {gdx_filepath}. GDX error number: {error_number}")
+
+    return handle
+
+
+def close_gdx(handle):
+    from gams.core import gdx
+
+    gdx.gdxClose(handle)
+    gdx.gdxFree(handle)
+
+
+def get_gdx_parameter_dimensions(gdx_filepath):
+    """ {symbol name: dimension} of every parameter, in file order. """
+    from gams.core import gdx
+
+    handle = open_gdx(gdx_filepath)
+    try:
+        _, symbol_count, _ = gdx.gdxSystemInfo(handle)
+
+        dimensions = {}
+        for symbol_number in range(1, symbol_count + 1):
+            _, name, dimension, symbol_type = gdx.gdxSymbolInfo(handle, symbol_number)
+            if symbol_type == gdx.GMS_DT_PAR:
+                dimensions[name] = dimension
+        return dimensions
+    finally:
+        close_gdx(handle)
+
+
+def get_mapping_arity(format_string):
+    """ Number of domain labels a mapping format string needs ({1} needs two). """
+    arity = 0
+    automatic_index = 0
+    for _, field_name, _, _ in string.Formatter().parse(format_string):
+        if field_name is None:
+            continue
+        name = field_name.split('.')[0].split('[')[0]
+        if name == '':
+            arity = max(arity, automatic_index + 1)
+            automatic_index += 1
+        elif name.isdigit():
+            arity = max(arity, int(name) + 1)
+    return arity
+
+
+def check_dimension_mapping(symbol_dimensions, dimension_mapping, headers):
+    """ Raises for symbols with fewer domain labels than the mapping of a column uses. """
+    arities = {header: get_mapping_arity(dimension_mapping[header]) for header in headers if header in dimension_mapping}
+
+    mismatches = []
+    for symbol, dimension in symbol_dimensions.items():
+        columns = [header for header, arity in arities.items() if arity > dimension]
+        if columns:
+            mismatches.append(f"{symbol} ({dimension} dimensions) for {columns}")
+
+    if mismatches:
+        raise ValueError(f"GDX dimension mapping uses more domain labels than symbols have: {'; '.join(mismatches)}")
+
+
+def iter_symbol_records(gdx_filepath, symbol_name):
+    """
+    Yields (keys, level) for every record of a symbol.
+
+    Records are read one at a time through the GDX string API, so memory
+    does not depend on the size of the symbol. NA and UNDF records are
+    skipped and EPS is reported as zero.
+    """
+    from gams.core import gdx
+
+    handle = open_gdx(gdx_filepath)
+    try:
+        rc, symbol_number = gdx.gdxFindSymbol(handle, symbol_name)
+        if not rc:
+            raise ValueError(f"Symbol '{symbol_name}' not found in {gdx_filepath}")
+
+        _, special_values = gdx.gdxGetSpecialValues(handle)
+        skipped_values = [
+            special_values[gdx.GMS_SVIDX_UNDEF],
+            special_values[gdx.GMS_SVIDX_NA],
+        ]
+        eps_value = special_values[gdx.GMS_SVIDX_EPS]
+
+        _, record_count = gdx.gdxDataReadStrStart(handle, symbol_number)
+
+        for _ in range(record_count):
+            rc, keys, values, _ = gdx.gdxDataReadStr(handle)
+            if not rc:
+                break
+
+            level = values[gdx.GMS_VAL_LEVEL]
+            if level in skipped_values:
+                continue
+            if level == eps_value:
+                level = 0.0
+
+            yield keys, level
+
+        gdx.gdxDataReadDone(handle)
+    finally:
+        close_gdx(handle)
+
+
+def iter_symbol_rows(records, symbol_name, headers, dimension_mapping, value_dimension):
+    """ csv rows (in `headers` order) of (keys, level) records of one symbol. """
+    for keys, level in records:
+        row = []
+        for header in headers:
+            if header == value_dimension:
+                row.append(repr(level))
+            else:
+                row.append(dimension_mapping[header].format(*keys, symbol=symbol_name))
+        yield row
+
+
+def convert_symbol_to_csv(gdx_filepath, symbol_name, part_filepath, headers, dimension_mapping, value_dimension):
+    """ Streams one symbol into a headerless csv part. Runs in a worker process. """
+    rows_written = 0
+
+    with open(part_filepath, 'w', newline='') as part_file:
+        writer = csv.writer(part_file)
+
+        for row in iter_symbol_rows(
+            iter_symbol_records(gdx_filepath, symbol_name),
+            symbol_name,
+            headers,
+            dimension_mapping,
+            value_dimension
+        ):
+            writer.writerow(row)
+            rows_written += 1
+
+    return part_filepath, rows_written
+
+
+def split_list_column(column, separator):
+    """ x-split column as lists; an empty cell is an empty list, as the validator splits it. """
+    lists = pc.split_pattern(column, pattern=separator)
+    empty_list = pa.scalar([], type=lists.type)
+    return pc.if_else(pc.equal(column, ''), empty_list, lists)
+
+
+class GdxToCsvConversionService():
+    def __init__(
+        self,
+        *,
+        filename,
+        dataset_template_id,
+        job_token,
+        dimension_mapping: dict,
+        symbols: Optional[list[str]]=None,
+        output_directory='outputs',
+        max_workers: Optional[int]=None
+    ):
+
+        self.project_service = get_project_service(job_token)
+
+        self.filename = filename
+        self.dataset_template_id = dataset_template_id
+        self.dimension_mapping = dimension_mapping
+        self.symbols = symbols
+        self.max_workers = max_workers
+
+        source_name = os.path.basename(self.filename).split('.gdx')[0]
+
+        self.output_filepath = os.path.join(output_directory, f"{source_name}.csv")
+        self.parts_directory = os.path.join(output_directory, f"{source_name}_parts")
+
+    def set_csv_regional_validation_rules(self):
+        dataset_template_details = self.project_service.get_dataset_template_details(self.dataset_template_id)
+        self.rules = dataset_template_details.get('rules')
+
+        assert self.rules, \
+            f"No dataset template rules found for dataset_template id: \
+                {self.dataset_template_id}"
+
+        self.time_dimension = self.rules['root_schema_declarations']['time_dimension']
+        self.value_dimension = self.rules['root_schema_declarations']['value_dimension']
+
+    def set_headers(self):
+        """ Same column order as validated file of regional timeseries validator. """
+        properties = self.rules['root']['properties']
+
+        final_dimensions_order = self.rules['root_schema_declarations'].get('final_dimensions_order')
+        if not final_dimensions_order:
+            raise ValueError("'final_dimensions_order' in template is required")
+
+        self.headers = [
+            item for item in final_dimensions_order
+            if item in properties and item not in [self.time_dimension, self.value_dimension]
+        ]
+
+        for item in properties:
+            if item not in self.headers + [self.time_dimension, self.value_dimension]:
+                self.headers.append(item)
+
+        self.headers = self.headers + [self.time_dimension, self.value_dimension]
+
+        missing_mappings = [
+            header for header in self.headers
+            if header != self.value_dimension and header not in self.dimension_mapping
+        ]
+        if missing_mappings:
+            raise ValueError(f"GDX dimension mapping missing for columns: {missing_mappings}")
+
+    def convert_symbols(self):
+        parameter_dimensions = get_gdx_parameter_dimensions(self.filename)
+
+        missing_symbols = [symbol for symbol in self.symbols or [] if symbol not in parameter_dimensions]
+        if missing_symbols:
+            raise ValueError(f"Parameters not found in {self.filename}: {missing_symbols}")
+
+        symbols = self.symbols or list(parameter_dimensions)
+        # before any worker starts, so a mapping that does not fit a symbol fails the whole file
+        check_dimension_mapping(
+            {symbol: parameter_dimensions[symbol] for symbol in symbols},
+            self.dimension_mapping,
+            self.headers
+        )
+
+        os.makedirs(self.parts_directory, exist_ok=True)
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(
+                    convert_symbol_to_csv,
+                    self.filename,
+                    symbol,
+                    os.path.join(self.parts_directory, f"{i}.csv"),
+                    self.headers,
+                    self.dimension_mapping,
+                    self.value_dimension
+                )
+                for i, symbol in enumerate(symbols)
+            ]
+
+            part_filepaths = []
+            for symbol, future in zip(symbols, futures):
+                part_filepath, rows_written = future.result()
+                print(f"Symbol {symbol}: {rows_written} rows")
+                part_filepaths.append(part_filepath)
+
+        return part_filepaths
+
+    def concatenate_parts(self, part_filepaths):
+        with open(self.output_filepath, 'w', newline='') as output_file:
+            csv.writer(output_file).writerow(self.headers)
+
+        with open(self.output_filepath, 'ab') as output_file:
+            for part_filepath in part_filepaths:
+                with open(part_filepath, 'rb') as part_file:
+                    while True:
+                        dat = part_file.read(1024**2)
+                        if not dat:
+                            break
+                        output_file.write(dat)
+                os.remove(part_filepath)
+
+        os.rmdir(self.parts_directory)
+
+    def create_associated_parquet(self):
+        """ Parquet with same column types as regional timeseries validator supporter. """
+        column_types = {header: pa.string() for header in self.headers}
+        column_types[self.value_dimension] = pa.float32()
+
+        splitters = {}
+        for field, rules in self.rules['root']['properties'].items():
+            if rules.get('type') == 'array' and rules.get('x-split'):
+                splitters[field] = rules['x-split']
+
+        reader = pa_csv.open_csv(
+            self.output_filepath,
+            read_options=pa_csv.ReadOptions(block_size=64 * 1024**2),
+            convert_options=pa_csv.ConvertOptions(
+                column_types=column_types,
+                strings_can_be_null=False
+            )
+        )
+
+        parquet_writer = None
+        for batch in reader:
+            arrays = []
+            for header in self.headers:
+                column = batch.column(header)
+                if header in splitters:
+                    column = split_list_column(column, splitters[header])
+                elif header != self.value_dimension:
+                    column = column.dictionary_encode()
+                arrays.append(column)
+
+            table = pa.Table.from_arrays(arrays, names=self.headers)
+
+            if parquet_writer is None:
+                parquet_writer = pq.ParquetWriter(
+                    self.output_filepath + '.parquet',
+                    table.schema,
+                    compression='snappy'
+                )
+            parquet_writer.write_table(table)
+
+        if parquet_writer:
+            parquet_writer.close()
+
+    def upload(self, local_filepath):
+        with open(local_filepath, "rb") as file_stream:
+            return self.project_service.add_filestream_as_job_output(
+                os.path.basename(local_filepath),
+                file_stream,
+            )
+
+    def __call__(self):
+        self.set_csv_regional_validation_rules()
+        self.set_headers()
+
+        part_filepaths = self.convert_symbols()
+        self.concatenate_parts(part_filepaths)
+        print(f"CSV written: {self.output_filepath}")
+
+        self.create_associated_parquet()
+        print(f"Parquet written: {self.output_filepath}.parquet")
+
+        if os.environ.get('DEVELOPMENT'):
+            return
+
+        self.upload(self.output_filepath)
+        self.upload(f"{self.output_filepath}.parquet")
+        print('Conversion complete')
@@ -0,0 +1,147 @@
+import os
+import json
+
+import pytest
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from service import (
+    GdxToCsvConversionService,
+    check_dimension_mapping,
+    get_mapping_arity,
+    iter_symbol_rows,
+    split_list_column,
+)
+
+
+HEADERS = ['model', 'variable', 'region', 'year', 'value']
+
+DIMENSION_MAPPING = {
+    'model': 'fixture',
+    'variable': '{symbol}',
+    'region': '{0}',
+    'year': '{1}',
+}
+
+RULES = {
+    'root_schema_declarations': {
+        'time_dimension': 'year',
+        'value_dimension': 'value',
+        'final_dimensions_order': ['model', 'variable', 'region', 'tags', 'year', 'value'],
+    },
+    'root': {
+        'properties': {
+            'model': {'type': 'string'},
+            'variable': {'type': 'string'},
+            'region': {'type': 'string'},
+            'tags': {'type': 'array', 'x-split': '|'},
+            'year': {'type': 'string'},
+            'value': {'type': 'number'},
+        }
+    },
+}
+
+
+def test_mapping_arity():
+    assert get_mapping_arity('fixture') == 0
+    assert get_mapping_arity('{symbol}') == 0
+    assert get_mapping_arity('{0}') == 1
+    assert get_mapping_arity('{1}|{0}') == 2
+    assert get_mapping_arity('{}-{}') == 2
+    assert get_mapping_arity('{{literal}}') == 0
+
+
+def test_check_dimension_mapping():
+    check_dimension_mapping({'emissions': 2}, DIMENSION_MAPPING, HEADERS)
+
+    with pytest.raises(ValueError, match=r"population \(1 dimensions\) for \['year'\]"):
+        check_dimension_mapping({'emissions': 2, 'population': 1}, DIMENSION_MAPPING, HEADERS)
+
+
+def test_iter_symbol_rows():
+    records = [(['r1', '2020'], 1.0), (['r2', '2030'], 2.5)]
+
+    assert list(iter_symbol_rows(records, 'emissions', HEADERS, DIMENSION_MAPPING, 'value')) == [
+        ['fixture', 'emissions', 'r1', '2020', '1.0'],
+        ['fixture', 'emissions', 'r2', '2030', '2.5'],
+    ]
+
+
+def test_split_list_column_empty_cell():
+    column = split_list_column(pa.array(['a|b', '', 'c']), '|')
+
+    assert column.to_pylist() == [['a', 'b'], [], ['c']]
+
+
+@pytest.fixture
+def conversion_service(tmp_path, monkeypatch):
+    backend_directory = tmp_path / 'backend'
+    os.makedirs(backend_directory / 'dataset_templates')
+    with open(backend_directory / 'dataset_templates' / '1.json', 'w') as template_file:
+        json.dump({'rules': RULES}, template_file)
+
+    monkeypatch.setenv('ACC_JOB_BACKEND', 'local')
+    monkeypatch.setenv('ACC_LOCAL_BACKEND_DIRECTORY', str(backend_directory))
+
+    service = GdxToCsvConversionService(
+        filename=str(tmp_path / 'fixture.gdx'),
+        dataset_template_id=1,
+        job_token=None,
+        dimension_mapping={**DIMENSION_MAPPING, 'tags': '{symbol}|{0}'},
+        output_directory=str(tmp_path),
+        max_workers=1,
+    )
+    service.set_csv_regional_validation_rules()
+    service.set_headers()
+    return service
+
+
+def test_associated_parquet(conversion_service):
+    with open(conversion_service.output_filepath, 'w') as csv_file:
+        csv_file.write('model,variable,region,tags,year,value\n')
+        csv_file.write('fixture,emissions,r1,a|b,2020,1.0\n')
+        csv_file.write('fixture,emissions,r2,,2030,2.5\n')
+
+    conversion_service.create_associated_parquet()
+
+    table = pq.read_table(conversion_service.output_filepath + '.parquet')
+    assert table.column('tags').to_pylist() == [['a', 'b'], []]
+    assert table.column('value').type == pa.float32()
+
+
+def write_fixture(filepath):
+    transfer = pytest.importorskip('gams.transfer')
+
+    try:
+        container = transfer.Container()
+        region = transfer.Set(container, 'region', records=['r1', 'r2'])
+        year = transfer.Set(container, 'year', records=['2020', '2030'])
+        transfer.Parameter(
+            container, 'emissions', domain=[region, year],
+            records=[['r1', '2020', 1.0], ['r2', '2030', 2.5]]
+        )
+        transfer.Parameter(container, 'population', domain=[region], records=[['r1', 3.0]])
+        container.write(filepath)
+    except Exception as err:
+        pytest.skip(f"GAMS installation required for gdx fixtures: {err}")
+
+
+def test_convert_symbols(conversion_service):
+    write_fixture(conversion_service.filename)
+
+    conversion_service.symbols = ['emissions']
+    conversion_service.concatenate_parts(conversion_service.convert_symbols())
+
+    with open(conversion_service.output_filepath) as csv_file:
+        assert csv_file.read().splitlines() == [
+            'model,variable,region,tags,year,value',
+            'fixture,emissions,r1,emissions|r1,2020,1.0',
+            'fixture,emissions,r2,emissions|r2,2030,2.5',
+        ]
+
+
+def test_convert_symbols_dimension_mismatch(conversion_service):
+    write_fixture(conversion_service.filename)
+
+    with pytest.raises(ValueError, match='population'):
+        conversion_service.convert_symbols()
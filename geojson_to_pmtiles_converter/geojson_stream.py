@@ -0,0 +1,161 @@
+import re
+import json
+
+CHUNK_SIZE = 1024**2
+
+RECORD_SEPARATOR = '\x1e'
+
+SEQUENCE_EXTENSIONS = ('.geojsonl', '.geojsons', '.geojsonseq', '.jsonl', '.ndjson')
+
+# strings and structural characters, the tokens that decide nesting
+STRUCTURE_TOKEN = re.compile(r'["{}\[\]:]')
+STRING_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"')
+
+
+def iter_geojson_seq_features(text_file):
+    """ GeoJSONSeq / newline delimited features, one per line. """
+    for line in text_file:
+        line = line.strip().lstrip(RECORD_SEPARATOR)
+        if not line:
+            continue
+        obj = json.loads(line)
+        if obj.get('type') == 'Feature':
+            yield obj
+
+
+def find_features_array(text_file, buffer=''):
+    """
+    Scans the json object starting in `buffer` (read on from `text_file`)
+    for its top level "features" array. Nesting and strings are tracked, so
+    a "features" key of a nested object (e.g. in crs properties) or inside
+    a string is not taken for it, wherever the key is among the members.
+
+    Returns the text after the '[' of the array, or None when the object
+    ends without one (e.g. the first feature of a GeoJSONSeq).
+    """
+    depth = 0
+    pos = 0
+    key = None
+
+    while True:
+        match = STRUCTURE_TOKEN.search(buffer, pos)
+        if not match:
+            buffer, pos = text_file.read(CHUNK_SIZE), 0
+            if not buffer:
+                return None
+            continue
+
+        token = match.group()
+        pos = match.end()
+
+        if token == '"':
+            rest = STRING_REST.match(buffer, pos)
+            while not rest:
+                # string continues in the next chunk
+                chunk = text_file.read(CHUNK_SIZE)
+                if not chunk:
+                    return None
+                buffer, pos = buffer[pos - 1:] + chunk, 1
+                rest = STRING_REST.match(buffer, pos)
+            key = buffer[pos - 1:rest.end()]
+            pos = rest.end()
+        elif token in '{[':
+            depth += 1
+        elif token in '}]':
+            depth -= 1
+            if depth <= 0:
+                return None
+        elif depth == 1 and key and json.loads(key) == 'features':
+            value = buffer[pos:].lstrip()
+            while not value:
+                chunk = text_file.read(CHUNK_SIZE)
+                if not chunk:
+                    return None
+                value = chunk.lstrip()
+            if value.startswith('['):
+                return value[1:]
+            buffer, pos = value, 0
+
+
+def iter_feature_collection_features(text_file):
+    """ Features of a FeatureCollection without loading the whole document. """
+    buffer = find_features_array(text_file)
+    if buffer is not None:
+        yield from iter_array_features(text_file, buffer)
+
+
+def iter_array_features(text_file, buffer):
+    """
+    Features of the "features" array, `buffer` starting after its '['.
+
+    Each feature object is decoded with raw_decode. When a feature does not
+    fit in the buffer more text is read, doubling the read size each time so
+    very large features are not re-parsed too often.
+    """
+    decoder = json.JSONDecoder()
+    pos = 0
+    eof = False
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+
+        if pos >= len(buffer):
+            if eof:
+                return
+            chunk = text_file.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        if buffer[pos] == ']':
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = text_file.read(max(CHUNK_SIZE, len(buffer) - pos))
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        if obj.get('type') == 'Feature':
+            yield obj
+
+        pos = end
+
+        # compact consumed part of the buffer once in a while only
+        if pos > CHUNK_SIZE:
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def iter_geojson_features(filepath):
+    """
+    Features of a FeatureCollection or a GeoJSONSeq file. A document
+    starting with an object that has a top level "features" array is a
+    FeatureCollection; record separators, sequence extensions and objects
+    without that array (the first feature of a sequence) mean GeoJSONSeq.
+    """
+    with open(filepath, encoding='utf-8-sig') as text_file:
+        head = ''
+        while not head:
+            chunk = text_file.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            head = chunk.lstrip()
+
+        if head.startswith('{') and not filepath.endswith(SEQUENCE_EXTENSIONS):
+            features_buffer = find_features_array(text_file, head)
+            if features_buffer is not None:
+                yield from iter_array_features(text_file, features_buffer)
+                return
+
+        text_file.seek(0)
+        yield from iter_geojson_seq_features(text_file)
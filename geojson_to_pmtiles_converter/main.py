@@ -0,0 +1,51 @@
+import os
+from common.project_service import get_project_service
+from tiler import GeojsonToPmtilesConverter
+
+DEVELOPMENT = os.environ.get('DEVELOPMENT', None)
+
+
+def upload(output_path):
+    if DEVELOPMENT:
+        return
+    ps = get_project_service(os.environ.get('ACC_JOB_TOKEN'))
+    with open(output_path, "rb") as file_stream:
+        ps.add_filestream_as_job_output(
+            output_path,
+            file_stream,
+        )
+
+
+def main():
+    files = []
+    for dirpath, dirnames, filenames in os.walk('inputs'):
+        for f in filenames:
+            if f != '.gitkeep':
+                files.append(os.path.relpath(os.path.join(dirpath, f), start=os.getcwd()))
+
+    max_workers = os.environ.get('PMTILES_WORKERS')
+
+    for input_geojson in files:
+        print(f"_____________Converting file: {input_geojson} to pmtiles_____________")
+
+        output_path = f"outputs/{os.path.splitext(os.path.relpath(input_geojson, 'inputs'))[0]}.pmtiles"
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        converter = GeojsonToPmtilesConverter(
+            filename=input_geojson,
+            output_filepath=output_path,
+            min_zoom=int(os.environ.get('MIN_ZOOM', 0)),
+            max_zoom=int(os.environ.get('MAX_ZOOM', 10)),
+            layer_name=os.environ.get('LAYER_NAME'),
+            max_workers=int(max_workers) if max_workers else None,
+            simplification=float(os.environ.get('SIMPLIFICATION', 1.0)),
+        )
+        converter()
+
+        upload(output_path)
+        if not DEVELOPMENT:
+            os.remove(output_path)
+
+
+if __name__ == "__main__":
+    main()
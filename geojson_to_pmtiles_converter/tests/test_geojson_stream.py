@@ -0,0 +1,75 @@
+import io
+import json
+
+import pytest
+
+import geojson_stream
+from geojson_stream import RECORD_SEPARATOR, find_features_array, iter_geojson_features
+
+
+def get_features(count):
+    return [
+        {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [i, i / 2]},
+            'properties': {'name': f"feature {i}", 'note': 'a "features": [ inside a string'},
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.fixture(params=[7, 64, 4096, 1024**2])
+def chunk_size(request, monkeypatch):
+    monkeypatch.setattr(geojson_stream, 'CHUNK_SIZE', request.param)
+    return request.param
+
+
+def write(tmp_path, text, filename='data.geojson'):
+    filepath = tmp_path / filename
+    filepath.write_text(text, encoding='utf-8')
+    return str(filepath)
+
+
+def test_feature_collection(tmp_path, chunk_size):
+    features = get_features(200)
+    filepath = write(tmp_path, json.dumps({'type': 'FeatureCollection', 'features': features}, indent=2))
+    assert list(iter_geojson_features(filepath)) == features
+
+
+def test_sorted_keys_beyond_head(tmp_path, chunk_size):
+    # "features" before "type", and the document far larger than the first read
+    features = get_features(200)
+    filepath = write(tmp_path, json.dumps({'type': 'FeatureCollection', 'features': features}, sort_keys=True))
+    assert list(iter_geojson_features(filepath)) == json.loads(json.dumps(features, sort_keys=True))
+
+
+def test_nested_features_key(tmp_path, chunk_size):
+    features = get_features(3)
+    document = {
+        'type': 'FeatureCollection',
+        'crs': {'type': 'name', 'properties': {'features': 1, 'name': 'EPSG:4326'}},
+        'metadata': ['"features": [', {'features': []}],
+        'features': features,
+    }
+    filepath = write(tmp_path, json.dumps(document))
+    assert list(iter_geojson_features(filepath)) == features
+
+
+def test_geojson_seq(tmp_path, chunk_size):
+    features = get_features(20)
+    lines = [RECORD_SEPARATOR + json.dumps(feature) for feature in features]
+    assert list(iter_geojson_features(write(tmp_path, '\n'.join(lines)))) == features
+
+    lines = [json.dumps(feature) for feature in features]
+    assert list(iter_geojson_features(write(tmp_path, '\n'.join(lines)))) == features
+    assert list(iter_geojson_features(write(tmp_path, '\n'.join(lines), 'data.ndjson'))) == features
+
+
+def test_find_features_array():
+    assert find_features_array(io.StringIO('{"type": "Feature", "properties": {"features": [1]}}')) is None
+    assert find_features_array(io.StringIO('{"features": null, "x": {"features": [2]}}')) is None
+    assert find_features_array(io.StringIO('{"fe\\u0061tures" :\n [1]}')) == '1]}'
+
+
+def test_empty_file(tmp_path):
+    assert list(iter_geojson_features(write(tmp_path, '  \n'))) == []
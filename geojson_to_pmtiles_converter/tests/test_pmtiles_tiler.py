@@ -0,0 +1,96 @@
+import os
+import gzip
+import json
+
+import pytest
+
+pytest.importorskip('shapely')
+pytest.importorskip('mapbox_vector_tile')
+pytest.importorskip('pmtiles')
+
+import mapbox_vector_tile
+from pmtiles.reader import Reader, MmapSource, all_tiles
+
+import tiler
+from tiler import GeojsonToPmtilesConverter
+
+
+FEATURES = [
+    {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [16.37, 48.21]},
+        'properties': {'name': 'Vienna', 'population': 1.9, 'capital': True, 'tags': ['a']},
+    },
+    {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Polygon',
+            'coordinates': [[[10.0, 45.0], [12.0, 45.0], [12.0, 47.0], [10.0, 47.0], [10.0, 45.0]]],
+        },
+        'properties': {'name': 'Box', 'population': 3, 'capital': False, 'tags': None},
+    },
+    {'type': 'Feature', 'geometry': None, 'properties': {'name': 'No geometry'}},
+]
+
+
+def write_feature_collection(filepath):
+    with open(filepath, 'w') as geojson_file:
+        json.dump({'type': 'FeatureCollection', 'features': FEATURES}, geojson_file)
+
+
+def convert(tmp_path, **kwargs):
+    input_filepath = tmp_path / 'places.geojson'
+    write_feature_collection(input_filepath)
+
+    converter = GeojsonToPmtilesConverter(
+        filename=str(input_filepath),
+        output_filepath=str(tmp_path / 'places.pmtiles'),
+        max_workers=1,
+        **kwargs
+    )
+    return converter, converter()
+
+
+def test_fields(tmp_path):
+    converter, _ = convert(tmp_path, max_zoom=2)
+
+    assert converter.fields == {
+        'name': 'String',
+        'population': 'Number',
+        'capital': 'Boolean',
+        'tags': 'String',
+    }
+
+
+def test_tiles(tmp_path):
+    converter, tiles_written = convert(tmp_path, max_zoom=3)
+
+    assert tiles_written == 4
+    assert not os.path.exists(converter.features_filepath)
+
+    with open(converter.output_filepath, 'rb') as pmtiles_file:
+        source = MmapSource(pmtiles_file)
+        metadata = Reader(source).metadata()
+        tiles = dict(all_tiles(source))
+
+    assert metadata['vector_layers'][0]['fields']['capital'] == 'Boolean'
+
+    names = set()
+    for data in tiles.values():
+        layer = mapbox_vector_tile.decode(gzip.decompress(data))['places']
+        for feature in layer['features']:
+            names.add(feature['properties']['name'])
+            if feature['properties']['name'] == 'Vienna':
+                assert feature['properties']['capital'] is True
+                assert feature['properties']['tags'] == '["a"]'
+
+    assert names == {'Vienna', 'Box'}
+
+
+def test_spill_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(tiler, 'SPILL_BATCH_SIZE', 1)
+
+    converter, tiles_written = convert(tmp_path, max_zoom=3)
+
+    assert tiles_written == 4
+    assert converter.lonlat_bounds.tolist() == [10.0, 45.0, 16.37, 48.21]
@@ -0,0 +1,309 @@
+import os
+import gzip
+import json
+import math
+import mmap
+import multiprocessing
+import numpy as np
+import shapely
+import mapbox_vector_tile
+from mapbox_vector_tile.encoder import on_invalid_geometry_make_valid
+from shapely.geometry import shape
+from pmtiles.tile import zxy_to_tileid, TileType, Compression
+from pmtiles.writer import Writer
+from geojson_stream import iter_geojson_features
+
+EARTH_RADIUS = 6378137.0
+HALF_WORLD = math.pi * EARTH_RADIUS
+MAX_LATITUDE = 85.0511287798066
+
+# Features projected in one shapely.transform call while spilling.
+SPILL_BATCH_SIZE = 10000
+
+# Shared with forked tile workers. Set by GeojsonToPmtilesConverter before the pool starts.
+FEATURES = None
+FEATURE_OFFSETS = None
+TREE = None
+LAYER_NAME = None
+EXTENT = 4096
+BUFFER = 64
+SIMPLIFICATION = 1.0
+
+
+def project_to_web_mercator(coords):
+    lon = np.clip(coords[:, 0], -180.0, 180.0)
+    lat = np.clip(coords[:, 1], -MAX_LATITUDE, MAX_LATITUDE)
+    x = EARTH_RADIUS * np.radians(lon)
+    y = EARTH_RADIUS * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+    return np.column_stack([x, y])
+
+
+def get_tile_size(zoom):
+    return 2 * HALF_WORLD / 2**zoom
+
+
+def get_tile_bounds(zoom, x, y):
+    tile_size = get_tile_size(zoom)
+    minx = -HALF_WORLD + x * tile_size
+    maxy = HALF_WORLD - y * tile_size
+    return minx, maxy - tile_size, minx + tile_size, maxy
+
+
+def get_field_type(value):
+    """ Vector layer field type of a tile attribute. """
+    if isinstance(value, bool):
+        return 'Boolean'
+    if isinstance(value, str):
+        return 'String'
+    return 'Number'
+
+
+def read_feature(i):
+    """ Projected geometry and tile properties of a spilled feature. """
+    offset, geometry_length, properties_length = FEATURE_OFFSETS[i]
+    properties_offset = offset + geometry_length
+    return (
+        shapely.from_wkb(FEATURES[offset:properties_offset]),
+        json.loads(FEATURES[properties_offset:properties_offset + properties_length])
+    )
+
+
+def get_vector_tile_properties(properties):
+    """ Vector tiles only carry scalar attributes. """
+    tile_properties = {}
+    for key, value in (properties or {}).items():
+        if value is None:
+            continue
+        if isinstance(value, (str, int, float, bool)):
+            tile_properties[key] = value
+        else:
+            tile_properties[key] = json.dumps(value)
+    return tile_properties
+
+
+def render_tile(tile):
+    """ Clips, simplifies and encodes one tile. Runs in a worker process. """
+    zoom, x, y = tile
+    minx, miny, maxx, maxy = get_tile_bounds(zoom, x, y)
+
+    buffer = (maxx - minx) * BUFFER / EXTENT
+    tolerance = (maxx - minx) * SIMPLIFICATION / EXTENT
+
+    features = []
+    for i in TREE.query(shapely.box(minx - buffer, miny - buffer, maxx + buffer, maxy + buffer)):
+        geometry, properties = read_feature(i)
+        geometry = shapely.clip_by_rect(
+            geometry, minx - buffer, miny - buffer, maxx + buffer, maxy + buffer
+        )
+        if geometry.is_empty:
+            continue
+
+        if tolerance > 0 and geometry.geom_type not in ['Point', 'MultiPoint']:
+            geometry = shapely.simplify(geometry, tolerance, preserve_topology=True)
+            if geometry.is_empty:
+                continue
+
+        features.append({"geometry": geometry, "properties": properties})
+
+    if not features:
+        return zxy_to_tileid(zoom, x, y), None
+
+    data = mapbox_vector_tile.encode(
+        [{"name": LAYER_NAME, "features": features}],
+        default_options={
+            "quantize_bounds": (minx, miny, maxx, maxy),
+            "extents": EXTENT,
+            "on_invalid_geometry": on_invalid_geometry_make_valid,
+        }
+    )
+    return zxy_to_tileid(zoom, x, y), gzip.compress(data)
+
+
+class GeojsonToPmtilesConverter():
+    def __init__(
+        self,
+        *,
+        filename,
+        output_filepath,
+        min_zoom=0,
+        max_zoom=10,
+        layer_name=None,
+        max_workers=None,
+        extent=4096,
+        buffer=64,
+        simplification=1.0
+    ):
+        self.filename = filename
+        self.output_filepath = output_filepath
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.layer_name = layer_name or os.path.basename(filename).split('.')[0]
+        self.max_workers = max_workers or os.cpu_count()
+        self.extent = extent
+        self.buffer = buffer
+        self.simplification = simplification
+
+        self.fields = {}
+        self.features_filepath = f"{output_filepath}.features"
+
+    def spill_batch(self, features_file, geometries, properties):
+        """ Writes projected WKB and json properties of a batch, returns offsets and mercator bounds. """
+        geometries = np.array(geometries, dtype=object)
+
+        lonlat_bounds = shapely.total_bounds(geometries)
+        self.lonlat_bounds = np.concatenate([
+            np.fmin(self.lonlat_bounds[:2], lonlat_bounds[:2]),
+            np.fmax(self.lonlat_bounds[2:], lonlat_bounds[2:])
+        ])
+
+        geometries = shapely.transform(geometries, project_to_web_mercator)
+
+        offsets = np.empty((len(geometries), 3), dtype=np.int64)
+        for i, (geometry_data, tile_properties) in enumerate(zip(shapely.to_wkb(geometries), properties)):
+            properties_data = json.dumps(tile_properties).encode()
+            offsets[i] = features_file.tell(), len(geometry_data), len(properties_data)
+            features_file.write(geometry_data)
+            features_file.write(properties_data)
+
+        return offsets, shapely.bounds(geometries)
+
+    def spill_features(self, features_file):
+        """
+        Streams features into `features_file` so only offsets and bounds are
+        kept in memory. Tile workers decode the features they clip from a
+        shared mmap of the file.
+        """
+        self.lonlat_bounds = np.array([np.inf, np.inf, -np.inf, -np.inf])
+
+        offsets = []
+        bounds = []
+
+        geometries = []
+        properties = []
+        for feature in iter_geojson_features(self.filename):
+            if not feature.get('geometry'):
+                continue
+
+            geometry = shape(feature['geometry'])
+            if geometry.is_empty:
+                continue
+
+            geometries.append(geometry)
+
+            tile_properties = get_vector_tile_properties(feature.get('properties'))
+            for key, value in tile_properties.items():
+                self.fields.setdefault(key, get_field_type(value))
+            properties.append(tile_properties)
+
+            if len(geometries) == SPILL_BATCH_SIZE:
+                batch_offsets, batch_bounds = self.spill_batch(features_file, geometries, properties)
+                offsets.append(batch_offsets)
+                bounds.append(batch_bounds)
+                geometries = []
+                properties = []
+
+        if geometries:
+            batch_offsets, batch_bounds = self.spill_batch(features_file, geometries, properties)
+            offsets.append(batch_offsets)
+            bounds.append(batch_bounds)
+
+        if not offsets:
+            raise ValueError(f"No features with geometry found in {self.filename}")
+
+        offsets = np.concatenate(offsets)
+        print(f"{len(offsets)} features loaded")
+
+        return offsets, np.concatenate(bounds)
+
+    def get_zoom_tiles(self, zoom, bounds):
+        """ Tiles touched by feature bounding boxes, ordered by pmtiles tile id. """
+        tile_size = get_tile_size(zoom)
+        last_tile = 2**zoom - 1
+
+        min_xs = np.clip(np.floor((bounds[:, 0] + HALF_WORLD) / tile_size), 0, last_tile).astype(int)
+        max_xs = np.clip(np.floor((bounds[:, 2] + HALF_WORLD) / tile_size), 0, last_tile).astype(int)
+        min_ys = np.clip(np.floor((HALF_WORLD - bounds[:, 3]) / tile_size), 0, last_tile).astype(int)
+        max_ys = np.clip(np.floor((HALF_WORLD - bounds[:, 1]) / tile_size), 0, last_tile).astype(int)
+
+        tiles = set()
+        for min_x, max_x, min_y, max_y in zip(min_xs, max_xs, min_ys, max_ys):
+            for x in range(min_x, max_x + 1):
+                for y in range(min_y, max_y + 1):
+                    tiles.add((zoom, x, y))
+
+        return sorted(tiles, key=lambda tile: zxy_to_tileid(*tile))
+
+    def get_header(self):
+        min_lon, min_lat, max_lon, max_lat = self.lonlat_bounds
+        return {
+            "tile_type": TileType.MVT,
+            "tile_compression": Compression.GZIP,
+            "min_zoom": self.min_zoom,
+            "max_zoom": self.max_zoom,
+            "min_lon_e7": int(min_lon * 10_000_000),
+            "min_lat_e7": int(min_lat * 10_000_000),
+            "max_lon_e7": int(max_lon * 10_000_000),
+            "max_lat_e7": int(max_lat * 10_000_000),
+            "center_zoom": self.min_zoom,
+            "center_lon_e7": int((min_lon + max_lon) / 2 * 10_000_000),
+            "center_lat_e7": int((min_lat + max_lat) / 2 * 10_000_000),
+        }
+
+    def get_metadata(self):
+        return {
+            "name": self.layer_name,
+            "vector_layers": [{
+                "id": self.layer_name,
+                "fields": self.fields,
+                "minzoom": self.min_zoom,
+                "maxzoom": self.max_zoom,
+            }]
+        }
+
+    def __call__(self):
+        try:
+            return self.write_tiles()
+        finally:
+            if os.path.exists(self.features_filepath):
+                os.remove(self.features_filepath)
+
+    def write_tiles(self):
+        global FEATURES, FEATURE_OFFSETS, TREE, LAYER_NAME, EXTENT, BUFFER, SIMPLIFICATION
+
+        with open(self.features_filepath, 'w+b') as features_file:
+            offsets, bounds = self.spill_features(features_file)
+            features_file.flush()
+            features = mmap.mmap(features_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        FEATURES = features
+        FEATURE_OFFSETS = offsets
+        # indexed by bounding boxes, geometries stay on disk
+        TREE = shapely.STRtree(shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]))
+        LAYER_NAME = self.layer_name
+        EXTENT = self.extent
+        BUFFER = self.buffer
+        SIMPLIFICATION = self.simplification
+
+        tiles_written = 0
+
+        # Workers are forked so the feature mmap and spatial index are shared, not pickled.
+        with features, multiprocessing.get_context('fork').Pool(self.max_workers) as pool, \
+                open(self.output_filepath, 'wb') as output_file:
+
+            writer = Writer(output_file)
+
+            # Zooms in order and tiles in tile id order within a zoom keep the archive clustered.
+            for zoom in range(self.min_zoom, self.max_zoom + 1):
+                tiles = self.get_zoom_tiles(zoom, bounds)
+
+                for tile_id, data in pool.imap(render_tile, tiles, chunksize=64):
+                    if data:
+                        writer.write_tile(tile_id, data)
+                        tiles_written += 1
+
+                print(f"Zoom {zoom}: {len(tiles)} candidate tiles")
+
+            writer.finalize(self.get_header(), self.get_metadata())
+
+        print(f"✅ Total tiles written: {tiles_written}")
+        return tiles_written
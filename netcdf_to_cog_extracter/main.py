@@ -0,0 +1,222 @@
+import os
+import re
+import itertools
+import threading
+from collections import Counter
+import tempfile
+import dask
+import rasterio
+import numpy as np
+import xarray as xr
+import rioxarray  # noqa: F401 registers .rio accessor
+from concurrent.futures import ProcessPoolExecutor
+from common.project_service import get_project_service
+from common.cog import compute_band_statistics, get_statistics_tags, translate_to_cog
+
+DEVELOPMENT = os.environ.get('DEVELOPMENT', None)
+
+TIME_DIMENSION = os.environ.get('NETCDF_TIME_DIMENSION', 'time')
+X_DIMENSION = os.environ.get('NETCDF_X_DIMENSION')
+Y_DIMENSION = os.environ.get('NETCDF_Y_DIMENSION')
+
+# Spatial chunk edge in pixels. Memory of a worker is bounded by a few chunks.
+CHUNK_SIZE = int(os.environ.get('NETCDF_CHUNK_SIZE', 2048))
+
+MAX_WORKERS = int(os.environ['NETCDF_EXTRACT_WORKERS']) if os.environ.get('NETCDF_EXTRACT_WORKERS') else None
+
+# native keeps the source grid, web aligns blocks and overviews to WebMercatorQuad tiles (see common/cog.py)
+COG_LAYOUT = os.environ.get('COG_LAYOUT', 'native')
+# resampling of web layout: mode for categorical, average for continuous bands; unset guesses from the dtype
+CATEGORICAL = (
+    os.environ['INPUT_FILE_CATEGORICAL'] in ['True', 'true', '1', 'TRUE']
+    if os.environ.get('INPUT_FILE_CATEGORICAL') else None
+)
+
+
+def upload(output_path):
+    if DEVELOPMENT:
+        return
+    ps = get_project_service(os.environ.get('ACC_JOB_TOKEN'))
+    with open(output_path, "rb") as file_stream:
+        ps.add_filestream_as_job_output(
+            output_path,
+            file_stream,
+        )
+
+
+def get_spatial_dimensions(data_array):
+    x_dim = X_DIMENSION or next(
+        (dim for dim in ['x', 'lon', 'longitude'] if dim in data_array.dims), None
+    )
+    y_dim = Y_DIMENSION or next(
+        (dim for dim in ['y', 'lat', 'latitude'] if dim in data_array.dims), None
+    )
+    return x_dim, y_dim
+
+
+def open_dataset(input_nc):
+    with xr.open_dataset(input_nc, engine='h5netcdf', decode_times=False) as ds:
+        dims = ds.dims
+
+    chunks = {dim: CHUNK_SIZE for dim in dims}
+    if TIME_DIMENSION in dims:
+        chunks[TIME_DIMENSION] = 1
+
+    return xr.open_dataset(input_nc, engine='h5netcdf', chunks=chunks, use_cftime=True)
+
+
+def format_time_label(value):
+    """ Date of a time step, with the time of day unless midnight, so sub-daily steps get their own files. """
+    if isinstance(value, np.datetime64):
+        value = value.astype('datetime64[s]').item()
+    if hasattr(value, 'hour'):
+        if (value.hour, value.minute, value.second) == (0, 0, 0):
+            return value.strftime('%Y-%m-%d')
+        return value.strftime('%Y-%m-%dT%H%M%S')
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def format_coordinate_label(value):
+    value = value.item() if hasattr(value, 'item') else value
+    return re.sub(r'[^A-Za-z0-9.+-]', '_', str(value))
+
+
+def get_slice_label(ds, dim, index):
+    if dim == TIME_DIMENSION:
+        return format_time_label(ds[dim].values[index])
+    if dim in ds.coords:
+        return format_coordinate_label(ds[dim].values[index])
+    return str(index)
+
+
+def get_slice_tasks(input_nc):
+    """
+    One task per variable and index of every non spatial dimension: time
+    steps and extra dimensions (e.g. level or ensemble member) alike.
+    """
+    source_file_id = os.path.splitext(os.path.relpath(input_nc, 'inputs'))[0]
+
+    tasks = []
+    with open_dataset(input_nc) as ds:
+        for variable, data_array in ds.data_vars.items():
+            x_dim, y_dim = get_spatial_dimensions(data_array)
+            if not x_dim or not y_dim:
+                print(f"Skipping {variable}: no spatial dimensions")
+                continue
+
+            slice_dims = [dim for dim in data_array.dims if dim not in [x_dim, y_dim]]
+            # time first, so files of a variable are named by time step as before
+            slice_dims.sort(key=lambda dim: dim != TIME_DIMENSION)
+
+            for indexes in itertools.product(*(range(data_array.sizes[dim]) for dim in slice_dims)):
+                labels = {dim: get_slice_label(ds, dim, index) for dim, index in zip(slice_dims, indexes)}
+
+                output_path = f"outputs/{source_file_id}/{variable}.tif"
+                if labels:
+                    name = '_'.join(
+                        label if dim == TIME_DIMENSION else f"{dim}-{label}"
+                        for dim, label in labels.items()
+                    )
+                    output_path = f"outputs/{source_file_id}/{variable}/{variable}_{name}.tif"
+
+                tasks.append((input_nc, variable, dict(zip(slice_dims, indexes)), labels, output_path))
+
+    # workers writing the same path would overwrite each other
+    duplicates = sorted(path for path, count in Counter(task[-1] for task in tasks).items() if count > 1)
+    if duplicates:
+        raise ValueError(f"Slices of {input_nc} map to the same output file: {duplicates[:5]}")
+
+    return tasks
+
+
+def extract_slice(task):
+    """ Writes one (variable, time step, extra indexes) slice as COG. Runs in a worker process. """
+    input_nc, variable, indexes, labels, output_path = task
+
+    # Chunks are computed one after another within a worker; parallelism is across workers.
+    with dask.config.set(scheduler='synchronous'), open_dataset(input_nc) as ds:
+        data_array = ds[variable]
+        x_dim, y_dim = get_spatial_dimensions(data_array)
+
+        band_tags = {key: str(value) for key, value in data_array.attrs.items()}
+        band_tags['VARIABLE'] = variable
+        for dim, label in labels.items():
+            band_tags[dim.upper()] = label
+
+        data_array = data_array.isel(indexes)
+
+        data_array = data_array.rio.set_spatial_dims(x_dim=x_dim, y_dim=y_dim)
+
+        if data_array[y_dim].size > 1 and data_array[y_dim][0] < data_array[y_dim][-1]:
+            data_array = data_array.isel({y_dim: slice(None, None, -1)})
+
+        if data_array.rio.crs is None:
+            crs_override = os.environ.get("INPUT_FILE_CRS")
+            if not crs_override:
+                raise ValueError(f"{input_nc} has no CRS and INPUT_FILE_CRS not provided")
+            data_array = data_array.rio.write_crs(crs_override)
+
+        nodata_value = os.environ.get('INPUT_FILE_NODATA')
+        if nodata_value is not None:
+            nodata_value = float(nodata_value)
+        else:
+            nodata_value = data_array.rio.nodata
+            if nodata_value is None:
+                nodata_value = data_array.rio.encoded_nodata
+            if nodata_value is not None and np.isnan(nodata_value):
+                nodata_value = None
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        with tempfile.TemporaryDirectory(dir='outputs') as temp_dir:
+            temp_tif = os.path.join(temp_dir, 'slice.tif')
+
+            # Windowed write pulls one chunk at a time from the lazily opened array.
+            data_array.astype('float32').rio.to_raster(
+                temp_tif,
+                tiled=True,
+                blockxsize=256,
+                blockysize=256,
+                compress='DEFLATE',
+                windowed=True,
+                lock=threading.Lock(),
+            )
+
+            with rasterio.open(temp_tif) as src:
+                # slices already run in parallel processes, statistics stay single threaded
+                statistics = compute_band_statistics(src, 1, nodata_value)
+                band_tags.update(get_statistics_tags(statistics))
+
+                translate_to_cog(
+                    src, output_path, 1, nodata_value, band_tags, quiet=True,
+                    layout=COG_LAYOUT, categorical=CATEGORICAL
+                )
+
+    return output_path
+
+
+def main():
+    files = []
+    for dirpath, dirnames, filenames in os.walk('inputs'):
+        for f in filenames:
+            if f != '.gitkeep':
+                files.append(os.path.relpath(os.path.join(dirpath, f), start=os.getcwd()))
+
+    for input_nc in files:
+        print(f"_____________Extracting cloud optimized GeoTIFFs from file: {input_nc}_____________")
+
+        tasks = get_slice_tasks(input_nc)
+        print(f"{len(tasks)} slices to extract")
+
+        with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            for output_path in executor.map(extract_slice, tasks):
+                print(f"Extracted {output_path}")
+                upload(output_path)
+                if not DEVELOPMENT:
+                    os.remove(output_path)
+
+
+if __name__ == "__main__":
+    main()
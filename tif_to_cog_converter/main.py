@@ -2,38 +2,43 @@ import sys
 import os
 import json
 import rasterio
-import morecantile
 from rasterio.vrt import WarpedVRT
-from rio_cogeo.cogeo import cog_translate
-from rio_cogeo.profiles import cog_profiles
-from accli import AjobCliService
+from common.project_service import get_project_service
 from jsonschema import validate as jsonschema_validate
 from jsonschema.exceptions import ValidationError, SchemaError
 from rasterio.crs import CRS
-import numpy as np
 import tempfile
 import subprocess
+from common.cog import compute_band_statistics, get_statistics_tags, translate_to_cog
+from common.profiling import JobProfiler
 
 DEVELOPMENT = os.environ.get('DEVELOPMENT', None)
 
-def get_project_service():
-    project_service = AjobCliService(
-        os.environ.get('ACC_JOB_TOKEN'),
-        server_url=os.environ.get('ACC_JOB_GATEWAY_SERVER'),
-        verify_cert=False
-    )
-    return project_service
+# exact (every pixel, threaded) or approximate (from an internal overview)
+STATISTICS_MODE = os.environ.get('STATISTICS_MODE', 'exact')
+STATISTICS_THREADS = int(os.environ.get('STATISTICS_THREADS', os.cpu_count() or 1))
+
+# native keeps the source grid, web aligns blocks and overviews to WebMercatorQuad tiles (see common/cog.py)
+COG_LAYOUT = os.environ.get('COG_LAYOUT', 'native')
+# resampling of web layout: mode for categorical, average for continuous bands; unset guesses from the dtype
+CATEGORICAL = (
+    os.environ['INPUT_FILE_CATEGORICAL'] in ['True', 'true', '1', 'TRUE']
+    if os.environ.get('INPUT_FILE_CATEGORICAL') else None
+)
 
 def upload(output_band_path, global_metadata):
     if DEVELOPMENT:
         return
-    ps = get_project_service()
+    ps = get_project_service(os.environ.get('ACC_JOB_TOKEN'))
     with open(output_band_path, "rb") as file_stream:
         uploaded_bucket_object_id = ps.add_filestream_as_job_output(
             output_band_path,
             file_stream,
         )
 
+profiler = JobProfiler('tif_to_cog')
+profiler.start()
+
 input_directory = 'inputs'
 files = []
 for dirpath, dirnames, filenames in os.walk(input_directory):
@@ -82,80 +87,38 @@ for input_tif in files:
         os.makedirs(os.path.dirname(output_band_path), exist_ok=True)
 
         # compute stats memory efficiently
-        min_val, max_val = None, None
-        with rasterio.open(input_tif) as src:
-            for _, window in src.block_windows(band_index):
-                block = src.read(band_index, window=window, masked=True)
-                if nodata_value is not None:
-                    block = np.ma.masked_equal(block, nodata_value)
-                if block.count() > 0:
-                    bmin, bmax = float(block.min()), float(block.max())
-                    min_val = bmin if min_val is None else min(min_val, bmin)
-                    max_val = bmax if max_val is None else max(max_val, bmax)
+        with profiler.stage('statistics') as statistics_stage, rasterio.open(input_tif) as src:
+            statistics = compute_band_statistics(
+                src,
+                band_index,
+                nodata_value,
+                mode=STATISTICS_MODE,
+                threads=STATISTICS_THREADS,
+            )
+            statistics_stage.rows += src.width * src.height
 
         band_tags = {}
         band_tags.update(variables_metadata[band_index - 1])
-        if min_val is not None and max_val is not None:
-            band_tags.update({
-                "STATISTICS_MINIMUM": str(min_val),
-                "STATISTICS_MAXIMUM": str(max_val),
-            })
-
-        dst_profile = cog_profiles.get("deflate")
-        dst_profile.update({
-            "dtype": "float32",
-            "nodata": nodata_value,
-            "blockxsize": 256,
-            "blockysize": 256,
-            "BIGTIFF": "IF_SAFER",
-        })
+        band_tags.update(get_statistics_tags(statistics))
 
         # If src has no CRS, use WarpedVRT with user CRS
-        with rasterio.open(input_tif) as src:
+        with profiler.stage('cog_translate'), rasterio.open(input_tif) as src:
             if src.crs is None:
                 with WarpedVRT(src, crs=source_crs) as vrt:
-                    cog_translate(
-                        vrt,
-                        output_band_path,
-                        dst_profile,
-                        indexes=[band_index],
-                        nodata=nodata_value,
-                        config={
-                            "GDAL_NUM_THREADS": "ALL_CPUS",
-                            "GDAL_TIFF_INTERNAL_MASK": True,
-                            "GDAL_TIFF_OVR_BLOCKSIZE": "256",
-                        },
-                        in_memory=False,
-                        quiet=False,
-                        forward_band_tags=True,
-                        additional_cog_metadata=band_tags,
-                        tms=morecantile.tms.get("WebMercatorQuad"),
-                        zoom_level_strategy="auto",
-                        aligned_levels=None,
-                        resampling="nearest"
+                    translate_to_cog(
+                        vrt, output_band_path, band_index, nodata_value, band_tags,
+                        layout=COG_LAYOUT, categorical=CATEGORICAL
                     )
             else:
-                cog_translate(
-                    src,
-                    output_band_path,
-                    dst_profile,
-                    indexes=[band_index],
-                    nodata=nodata_value,
-                    config={
-                        "GDAL_NUM_THREADS": "ALL_CPUS",
-                        "GDAL_TIFF_INTERNAL_MASK": True,
-                        "GDAL_TIFF_OVR_BLOCKSIZE": "256",
-                    },
-                    in_memory=False,
-                    quiet=False,
-                    forward_band_tags=True,
-                    additional_cog_metadata=band_tags,
-                    tms=morecantile.tms.get("WebMercatorQuad"),
-                    zoom_level_strategy="auto",
-                    aligned_levels=None,
-                    resampling="nearest"
+                translate_to_cog(
+                    src, output_band_path, band_index, nodata_value, band_tags,
+                    layout=COG_LAYOUT, categorical=CATEGORICAL
                 )
 
-        upload(output_band_path, global_metadata)
+        with profiler.stage('upload') as upload_stage:
+            upload(output_band_path, global_metadata)
+        upload_stage.bytes += os.path.getsize(output_band_path)
         if not DEVELOPMENT:
             os.remove(output_band_path)
+
+profiler.finish(upload=lambda path: upload(path, {}))
@@ -0,0 +1,606 @@
+#!/usr/bin/env python3
+"""
+Debounced git autosync for the workspace repo of the jupyter image.
+
+Changes are polled, debounced into one commit per batch and pushed by a
+background thread with exponential backoff. Files over the DVC threshold
+(and files already tracked by DVC) are added with `dvc add`, so git only
+gets their .dvc pointer. Files whose content hash did not change since
+the last sync (e.g. a notebook saved without edits) are skipped.
+
+    autosync start --repo /home/jovyan/work/repo
+    autosync status --repo /home/jovyan/work/repo
+    autosync sync --repo /home/jovyan/work/repo     # commit pending changes now
+    autosync stop --repo /home/jovyan/work/repo
+
+The daemon runs as its own niced process, so the notebook kernel never
+waits on a commit or push.
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import hashlib
+import argparse
+import threading
+import subprocess
+
+DEBOUNCE_SECONDS = float(os.getenv('AUTOSYNC_DEBOUNCE_SECONDS', 10))
+MAX_DELAY_SECONDS = float(os.getenv('AUTOSYNC_MAX_DELAY_SECONDS', 120))
+POLL_SECONDS = float(os.getenv('AUTOSYNC_POLL_SECONDS', 2))
+DVC_THRESHOLD_BYTES = int(float(os.getenv('AUTOSYNC_DVC_THRESHOLD_BYTES', 50 * 1024**2)))
+PUSH_BACKOFF_SECONDS = float(os.getenv('AUTOSYNC_PUSH_BACKOFF_SECONDS', 5))
+PUSH_BACKOFF_MAX_SECONDS = float(os.getenv('AUTOSYNC_PUSH_BACKOFF_MAX_SECONDS', 300))
+NICE = int(os.getenv('AUTOSYNC_NICE', 10))
+
+# Never watched: git and dvc internals, jupyter checkpoints
+SKIPPED_DIRECTORIES = {'.git', '.ipynb_checkpoints', '__pycache__'}
+SKIPPED_DVC_DIRECTORIES = {'cache', 'tmp'}
+
+HASH_BLOCK_BYTES = 1024**2
+
+
+def get_state_directory(repo):
+    return os.path.join(repo, '.git', 'autosync')
+
+
+def get_file_hash(filepath):
+    file_hash = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as watched_file:
+        while True:
+            block = watched_file.read(HASH_BLOCK_BYTES)
+            if not block:
+                break
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def scan_tree(repo):
+    """ {relative path: (size, mtime_ns)} of every watched file. """
+    snapshot = {}
+    for root, directories, files in os.walk(repo):
+        relative_root = os.path.relpath(root, repo)
+        directories[:] = [
+            directory for directory in directories
+            if directory not in SKIPPED_DIRECTORIES
+            and not (relative_root == '.dvc' and directory in SKIPPED_DVC_DIRECTORIES)
+        ]
+        for name in files:
+            filepath = os.path.join(root, name)
+            try:
+                stat = os.stat(filepath)
+            except FileNotFoundError:
+                continue
+            snapshot[os.path.normpath(os.path.join(relative_root, name))] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+class CommandError(Exception):
+    pass
+
+
+class RebaseConflict(CommandError):
+    """ The remote branch conflicts with local commits; retrying cannot resolve it. """
+
+
+def get_error_line(output):
+    """ The line of git / dvc output that says what failed (both add hints and support notes). """
+    lines = [line.strip() for line in output.splitlines() if line.strip()]
+    for line in lines:
+        if line.lower().startswith(('error', 'fatal')):
+            return line
+    return lines[0] if lines else 'failed'
+
+
+class AutoSync():
+
+    def __init__(
+        self,
+        repo,
+        *,
+        remote='origin',
+        branch=None,
+        debounce_seconds=DEBOUNCE_SECONDS,
+        max_delay_seconds=MAX_DELAY_SECONDS,
+        poll_seconds=POLL_SECONDS,
+        dvc_threshold_bytes=DVC_THRESHOLD_BYTES,
+    ):
+        self.repo = os.path.abspath(repo)
+        self.remote = remote
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.poll_seconds = poll_seconds
+        self.dvc_threshold_bytes = dvc_threshold_bytes
+
+        self.state_directory = get_state_directory(self.repo)
+        os.makedirs(self.state_directory, exist_ok=True)
+        self.state_filepath = os.path.join(self.state_directory, 'state.json')
+        self.status_filepath = os.path.join(self.state_directory, 'status.json')
+
+        self.branch = branch or self.git('rev-parse', '--abbrev-ref', 'HEAD').strip()
+
+        # relative path -> {'stat': [size, mtime_ns], 'hash': content hash at the last sync or None}
+        self.state = self.load_state()
+        self.pending = set()
+        self.first_change = None
+        self.last_change = None
+
+        # git commands of the sync loop and of the pusher's rebase must not interleave
+        self.repo_lock = threading.Lock()
+        # status is written by the sync loop and the pusher
+        self.status_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.flush_requested = threading.Event()
+        self.pusher = BackgroundPusher(self)
+
+        self.status = {
+            'pid': os.getpid(),
+            'branch': self.branch,
+            'pending': 0,
+            'last_commit': None,
+            'last_push': None,
+            'push_failures': 0,
+            'next_push_retry': None,
+            'push_conflict': None,
+            'last_error': None,
+        }
+
+    def run_command(self, *command, check=True):
+        try:
+            result = subprocess.run(command, cwd=self.repo, capture_output=True, text=True)
+        except FileNotFoundError:
+            raise CommandError(f"{command[0]} is not installed")
+        if check and result.returncode != 0:
+            raise CommandError(f"{' '.join(command[:2])}: {get_error_line(result.stderr or result.stdout)}")
+        return result
+
+    def git(self, *args, check=True):
+        return self.run_command('git', *args, check=check).stdout
+
+    def is_rebasing(self):
+        return any(
+            os.path.exists(os.path.join(self.repo, self.git('rev-parse', '--git-path', name).strip()))
+            for name in ['rebase-merge', 'rebase-apply']
+        )
+
+    def dvc(self, *args):
+        return self.run_command('dvc', *args).stdout
+
+    def load_state(self):
+        if not os.path.exists(self.state_filepath):
+            return {}
+        with open(self.state_filepath) as state_file:
+            return json.load(state_file)
+
+    def save_state(self):
+        with open(self.state_filepath + '.tmp', 'w') as state_file:
+            json.dump(self.state, state_file)
+        os.replace(self.state_filepath + '.tmp', self.state_filepath)
+
+    def write_status(self, **changes):
+        with self.status_lock:
+            self.status.update(changes)
+            with open(self.status_filepath + '.tmp', 'w') as status_file:
+                json.dump(self.status, status_file, indent=2)
+            os.replace(self.status_filepath + '.tmp', self.status_filepath)
+
+    def log(self, message):
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {message}", flush=True)
+
+    def has_dvc(self):
+        return os.path.isdir(os.path.join(self.repo, '.dvc'))
+
+    def configure_dvc(self):
+        """ Initialises DVC and its S3 remote from the environment (as git_dvc_push) unless the repo has a remote. """
+        if not self.has_dvc():
+            self.dvc('init', '-q')
+            self.git('add', '.dvc', '.dvcignore')
+            self.git('commit', '-q', '-m', 'Initialize DVC')
+
+        if self.dvc('remote', 'list').strip() or not os.getenv('DVC_S3_BUCKET'):
+            return
+
+        remote_url = f"s3://{os.getenv('DVC_S3_BUCKET')}/{os.getenv('DVC_S3_PREFIX', '')}".rstrip('/')
+        self.dvc('remote', 'add', '--local', '-d', 'storage', remote_url)
+        for option, variable in [
+            ('access_key_id', 'AWS_ACCESS_KEY_ID'),
+            ('secret_access_key', 'AWS_SECRET_ACCESS_KEY'),
+            ('endpointurl', 'DVC_S3_ENDPOINT_URL'),
+        ]:
+            if os.getenv(variable):
+                self.dvc('remote', 'modify', '--local', 'storage', option, os.getenv(variable))
+
+    def seed_pending(self):
+        """
+        On first start only changes since the last commit are pending:
+        files git reports as modified or untracked, plus every file of
+        an initial scan is recorded as synced without hashing it.
+        """
+        snapshot = scan_tree(self.repo)
+        if not self.state:
+            self.state = {path: {'stat': list(stat), 'hash': None} for path, stat in snapshot.items()}
+
+            entries = self.git('status', '--porcelain', '-z', '--untracked-files=all').split('\0')
+            for entry in entries:
+                if len(entry) > 3:
+                    self.pending.add(os.path.normpath(entry[3:]))
+        else:
+            self.pending |= self.record_changes(snapshot)
+
+        if self.pending:
+            self.first_change = self.last_change = time.monotonic()
+
+    def record_changes(self, snapshot):
+        """
+        Paths whose stat changed or that were deleted since the last poll.
+        Their new stat is recorded right away; whether the content changed
+        is decided by its hash at sync time.
+        """
+        changed = set()
+        for path, stat in snapshot.items():
+            entry = self.state.setdefault(path, {'stat': None, 'hash': None})
+            if entry['stat'] != list(stat):
+                entry['stat'] = list(stat)
+                changed.add(path)
+
+        for path, entry in self.state.items():
+            if path not in snapshot and entry['stat'] is not None:
+                entry['stat'] = None
+                changed.add(path)
+        return changed
+
+    def get_dvc_target(self, path, size):
+        """ What `dvc add` gets for a changed file: the file or its DVC tracked directory, None for git. """
+        target = path
+        while target:
+            if os.path.exists(os.path.join(self.repo, f"{target}.dvc")):
+                return target
+            target = os.path.dirname(target)
+        return path if size > self.dvc_threshold_bytes else None
+
+    def get_ignored_paths(self, paths):
+        if not paths:
+            return set()
+        result = subprocess.run(
+            ['git', 'check-ignore', '--stdin', '-z'],
+            cwd=self.repo,
+            input='\0'.join(paths),
+            capture_output=True,
+            text=True,
+        )
+        return {path for path in result.stdout.split('\0') if path}
+
+    def sync_batch(self):
+        """ One commit of the pending paths whose content changed; a failed batch stays pending. """
+        paths = sorted(self.pending)
+        self.pending = set()
+        self.first_change = self.last_change = None
+
+        try:
+            self.commit_paths(paths)
+        except (CommandError, OSError):
+            self.pending |= set(paths)
+            self.first_change = self.last_change = time.monotonic()
+            raise
+
+    def commit_paths(self, paths):
+        """ Routes changed paths to git or DVC and commits them; requests a push if something was committed. """
+
+        git_paths, dvc_paths, deleted_paths, synced = [], [], [], {}
+
+        for path in paths:
+            filepath = os.path.join(self.repo, path)
+            if not os.path.isfile(filepath):
+                self.state.pop(path, None)
+                deleted_paths.append(path)
+                continue
+
+            stat = os.stat(filepath)
+            file_hash = get_file_hash(filepath)
+            previous = self.state.get(path, {})
+            synced[path] = {'stat': [stat.st_size, stat.st_mtime_ns], 'hash': file_hash}
+            if previous.get('hash') == file_hash:
+                continue
+
+            dvc_target = None
+            if not path.endswith('.dvc') and os.path.basename(path) != '.gitignore':
+                dvc_target = self.get_dvc_target(path, stat.st_size)
+            if dvc_target:
+                dvc_paths.append(dvc_target)
+            else:
+                git_paths.append(path)
+
+        dvc_paths = list(dict.fromkeys(dvc_paths))
+
+        with self.repo_lock:
+            if deleted_paths:
+                # deletions of tracked files only; a DVC tracked file keeps its pointer
+                tracked = self.git('ls-files', '-z', '--', *deleted_paths).split('\0')
+                git_paths += [path for path in deleted_paths if path in tracked]
+
+            if dvc_paths:
+                self.configure_dvc()
+                self.dvc('add', '-q', *dvc_paths)
+                for path in dvc_paths:
+                    git_paths.append(f"{path}.dvc")
+                    gitignore = os.path.join(os.path.dirname(path), '.gitignore')
+                    if os.path.exists(os.path.join(self.repo, gitignore)):
+                        git_paths.append(os.path.normpath(gitignore))
+
+            ignored = self.get_ignored_paths(git_paths)
+            git_paths = [path for path in dict.fromkeys(git_paths) if path not in ignored]
+            if git_paths:
+                self.git('add', '-A', '--', *git_paths)
+
+            staged = [path for path in self.git('diff', '--cached', '--name-only', '-z').split('\0') if path]
+            committed = bool(staged)
+            if committed:
+                names = [os.path.basename(path) for path in staged]
+                summary = ', '.join(names[:3]) + (f" and {len(names) - 3} more" if len(names) > 3 else '')
+                self.git('commit', '-q', '-m', f"Autosync: {summary}")
+
+        # .dvc pointers and .gitignore written by dvc add are synced with this batch
+        for path in git_paths:
+            filepath = os.path.join(self.repo, path)
+            if path not in synced and os.path.isfile(filepath):
+                stat = os.stat(filepath)
+                synced[path] = {'stat': [stat.st_size, stat.st_mtime_ns], 'hash': get_file_hash(filepath)}
+        self.state.update(synced)
+        self.save_state()
+
+        if committed:
+            self.log(f"Committed {len(staged)} paths ({len(dvc_paths)} through DVC)")
+            self.write_status(last_commit=time.time(), pending=0)
+            self.pusher.request(dvc=bool(dvc_paths))
+        else:
+            self.write_status(pending=0)
+
+    def poll(self):
+        changed = self.record_changes(scan_tree(self.repo))
+
+        now = time.monotonic()
+        if changed:
+            self.pending |= changed
+            self.last_change = now
+            self.first_change = self.first_change or now
+            self.write_status(pending=len(self.pending))
+
+        if self.pending and (
+            self.flush_requested.is_set()
+            or now - self.last_change >= self.debounce_seconds
+            or now - self.first_change >= self.max_delay_seconds
+        ):
+            self.flush_requested.clear()
+            self.sync_batch()
+        elif self.flush_requested.is_set() and not self.pending:
+            self.flush_requested.clear()
+
+    def run(self):
+        os.nice(NICE)
+        if self.has_dvc():
+            try:
+                self.configure_dvc()
+            except CommandError as error:
+                self.log(f"DVC not configured: {error}")
+        self.seed_pending()
+        self.pusher.start()
+        # commits left unpushed by an earlier session
+        self.pusher.request(dvc=self.has_dvc())
+        self.write_status(pending=len(self.pending))
+        self.log(f"Watching {self.repo} on {self.branch}")
+
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except (CommandError, OSError) as error:
+                # e.g. a concurrent `git commit` from a terminal holds index.lock; retried after the debounce
+                self.log(f"Sync failed: {error}")
+                self.write_status(last_error=str(error))
+            self.stopped.wait(self.poll_seconds)
+
+        if self.pending:
+            try:
+                self.sync_batch()
+            except (CommandError, OSError) as error:
+                self.log(f"Sync failed: {error}")
+        self.pusher.stop()
+
+    def stop(self, *_):
+        self.stopped.set()
+
+    def flush(self, *_):
+        self.flush_requested.set()
+
+
+class BackgroundPusher(threading.Thread):
+    """
+    Pushes committed batches (`dvc push` first, so a pushed pointer always
+    has its data) outside the sync loop. Requests arriving during a push
+    are coalesced into one more push; failures are retried with
+    exponential backoff and jitter. A rejected push rebases onto the
+    remote branch before retrying. A conflicting rebase is aborted, which
+    leaves branch and workspace as they were, and pushing stops until
+    autosync is restarted after the conflict is resolved by hand.
+    """
+
+    def __init__(self, autosync):
+        super().__init__(daemon=True)
+        self.autosync = autosync
+        self.requested = threading.Event()
+        self.stopped = threading.Event()
+        self.pending_push = False
+        self.push_dvc = False
+        self.failures = 0
+        self.conflict = None
+
+    def request(self, dvc=False):
+        if self.conflict:
+            return
+        self.push_dvc = self.push_dvc or dvc
+        self.pending_push = True
+        self.requested.set()
+
+    def stop(self):
+        """ Waits for a requested push (e.g. of the final batch); a push in backoff is left to the next start. """
+        self.stopped.set()
+        self.requested.set()
+        self.join(timeout=120)
+
+    def push(self):
+        autosync = self.autosync
+
+        if self.push_dvc:
+            if autosync.dvc('remote', 'list').strip():
+                autosync.dvc('push', '-q')
+            else:
+                autosync.log("No DVC remote configured, DVC data stays in the local cache")
+            self.push_dvc = False
+
+        result = autosync.run_command('git', 'push', '-q', autosync.remote, f"HEAD:{autosync.branch}", check=False)
+        if result.returncode == 0:
+            return
+
+        if '[rejected]' in result.stderr:
+            with autosync.repo_lock:
+                result = autosync.run_command(
+                    'git', 'pull', '-q', '--rebase', '--autostash', autosync.remote, autosync.branch, check=False
+                )
+                if result.returncode != 0:
+                    error_line = get_error_line(result.stderr or result.stdout)
+                    if not autosync.is_rebasing():
+                        raise CommandError(f"git pull: {error_line}")
+                    # restores the branch and applies the autostash again
+                    autosync.git('rebase', '--abort')
+                    raise RebaseConflict(f"rebase onto {autosync.remote}/{autosync.branch} conflicts: {error_line}")
+            raise CommandError(f"push rejected, rebased onto {autosync.remote}/{autosync.branch}")
+        raise CommandError(f"git push: {get_error_line(result.stderr)}")
+
+    def run(self):
+        autosync = self.autosync
+
+        while True:
+            self.requested.wait()
+            self.requested.clear()
+
+            if self.pending_push:
+                self.pending_push = False
+                try:
+                    self.push()
+                except RebaseConflict as error:
+                    self.conflict = str(error)
+                    autosync.log(f"Push stopped, resolve the conflict and restart autosync: {error}")
+                    autosync.write_status(push_conflict=self.conflict, next_push_retry=None, last_error=self.conflict)
+                    if self.stopped.is_set():
+                        return
+                    continue
+                except (CommandError, OSError) as error:
+                    # any failure is retried, so the push thread never dies with commits left unpushed
+                    self.failures += 1
+                    self.pending_push = True
+                    delay = min(PUSH_BACKOFF_MAX_SECONDS, PUSH_BACKOFF_SECONDS * 2**(self.failures - 1))
+                    delay *= random.uniform(0.5, 1)
+                    autosync.log(f"Push failed ({self.failures}), retrying in {delay:.0f}s: {error}")
+                    autosync.write_status(push_failures=self.failures, next_push_retry=time.time() + delay, last_error=str(error))
+
+                    if self.stopped.wait(delay):
+                        return
+                    self.requested.set()
+                    continue
+
+                self.failures = 0
+                autosync.log("Pushed")
+                autosync.write_status(last_push=time.time(), push_failures=0, next_push_retry=None)
+
+            # a stop request may have been consumed together with the last push request
+            if self.stopped.is_set():
+                return
+
+
+def get_pid(repo):
+    pid_filepath = os.path.join(get_state_directory(repo), 'autosync.pid')
+    if not os.path.exists(pid_filepath):
+        return None
+    with open(pid_filepath) as pid_file:
+        pid = int(pid_file.read())
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    return pid
+
+
+def start(args):
+    if get_pid(args.repo):
+        print(f"autosync already running for {args.repo}")
+        return
+
+    state_directory = get_state_directory(args.repo)
+    os.makedirs(state_directory, exist_ok=True)
+
+    command = [sys.executable, os.path.abspath(__file__), 'run', '--repo', args.repo, '--remote', args.remote]
+    if args.branch:
+        command += ['--branch', args.branch]
+
+    with open(os.path.join(state_directory, 'autosync.log'), 'a') as log_file:
+        process = subprocess.Popen(
+            command,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    with open(os.path.join(state_directory, 'autosync.pid'), 'w') as pid_file:
+        pid_file.write(str(process.pid))
+    print(f"autosync started for {args.repo} (pid {process.pid}), log: {state_directory}/autosync.log")
+
+
+def run(args):
+    autosync = AutoSync(args.repo, remote=args.remote, branch=args.branch)
+    signal.signal(signal.SIGTERM, autosync.stop)
+    signal.signal(signal.SIGINT, autosync.stop)
+    signal.signal(signal.SIGUSR1, autosync.flush)
+    autosync.run()
+
+
+def send_signal(args, signal_number, message):
+    pid = get_pid(args.repo)
+    if not pid:
+        print(f"autosync is not running for {args.repo}")
+        return
+    os.kill(pid, signal_number)
+    print(message)
+
+
+def status(args):
+    status_filepath = os.path.join(get_state_directory(args.repo), 'status.json')
+    print(f"running: {bool(get_pid(args.repo))}")
+    if os.path.exists(status_filepath):
+        with open(status_filepath) as status_file:
+            print(status_file.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['start', 'run', 'sync', 'stop', 'status'])
+    parser.add_argument('--repo', default=os.getenv('AUTOSYNC_REPO', '.'))
+    parser.add_argument('--remote', default=os.getenv('AUTOSYNC_REMOTE', 'origin'))
+    parser.add_argument('--branch', default=os.getenv('AUTOSYNC_BRANCH'))
+    args = parser.parse_args()
+    args.repo = os.path.abspath(args.repo)
+
+    if args.command == 'start':
+        start(args)
+    elif args.command == 'run':
+        run(args)
+    elif args.command == 'sync':
+        send_signal(args, signal.SIGUSR1, "sync requested")
+    elif args.command == 'stop':
+        send_signal(args, signal.SIGTERM, "autosync stopping (pending changes are committed first)")
+    elif args.command == 'status':
+        status(args)
+
+
+if __name__ == '__main__':
+    main()
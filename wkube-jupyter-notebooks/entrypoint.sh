@@ -53,9 +53,15 @@ with open(config_path, 'w') as f:
 print(f'>>> Notebook Intelligence configured for user {os.getuid()}')
 "
 
+# 3. Autosync the workspace repo in the background when configured
+if [ -n "$AUTOSYNC_REPO" ]; then
+  echo ">>> Starting autosync for $AUTOSYNC_REPO..."
+  autosync start --repo "$AUTOSYNC_REPO" || echo ">>> autosync not started"
+fi
+
 echo ">>> Starting JupyterLab..."
 
-# 3. Launch JupyterLab
+# 4. Launch JupyterLab
 exec jupyter lab \
   --ServerApp.ip=0.0.0.0 \
   --ServerApp.token='' \
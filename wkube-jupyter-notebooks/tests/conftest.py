@@ -0,0 +1,5 @@
+import os
+import sys
+
+# autosync.py is installed as a script, imported here from its directory
+sys.path[:0] = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import shutil
+import threading
+import subprocess
+
+import pytest
+
+from autosync import AutoSync, RebaseConflict
+
+
+def git(repo, *args):
+    return subprocess.run(['git', *args], cwd=repo, capture_output=True, text=True, check=True).stdout
+
+
+def commit_file(repo, filename, content, message):
+    with open(os.path.join(repo, filename), 'w') as committed_file:
+        committed_file.write(content)
+    git(repo, 'add', filename)
+    git(repo, 'commit', '-q', '-m', message)
+
+
+@pytest.fixture
+def clones(tmp_path, monkeypatch):
+    for variable in ['GIT_AUTHOR_NAME', 'GIT_COMMITTER_NAME']:
+        monkeypatch.setenv(variable, 'autosync')
+    for variable in ['GIT_AUTHOR_EMAIL', 'GIT_COMMITTER_EMAIL']:
+        monkeypatch.setenv(variable, 'autosync@localhost')
+
+    remote = str(tmp_path / 'remote.git')
+    subprocess.run(['git', 'init', '-q', '--bare', '-b', 'main', remote], check=True)
+
+    workspace, other = str(tmp_path / 'workspace'), str(tmp_path / 'other')
+    subprocess.run(['git', 'clone', '-q', remote, workspace], check=True)
+    git(workspace, 'checkout', '-q', '-b', 'main')
+    commit_file(workspace, 'notes.txt', 'base\n', 'Base')
+    commit_file(workspace, 'scratch.txt', 'base\n', 'Scratch')
+    git(workspace, 'push', '-q', 'origin', 'main')
+    subprocess.run(['git', 'clone', '-q', remote, other], check=True)
+
+    return workspace, other
+
+
+def test_rejected_push_rebases(clones):
+    workspace, other = clones
+    commit_file(other, 'other.txt', 'other\n', 'Other')
+    git(other, 'push', '-q', 'origin', 'main')
+    commit_file(workspace, 'notes.txt', 'workspace\n', 'Workspace')
+
+    pusher = AutoSync(workspace).pusher
+    with pytest.raises(Exception, match='rebased'):
+        pusher.push()
+    pusher.push()
+
+    assert git(other, 'ls-remote', 'origin', 'main').split()[0] == git(workspace, 'rev-parse', 'HEAD').strip()
+
+
+def test_conflicting_rebase_is_aborted(clones):
+    workspace, other = clones
+    commit_file(other, 'notes.txt', 'other\n', 'Other')
+    git(other, 'push', '-q', 'origin', 'main')
+
+    commit_file(workspace, 'notes.txt', 'workspace\n', 'Workspace')
+    head = git(workspace, 'rev-parse', 'HEAD')
+    # uncommitted change, autostashed by the pull
+    with open(os.path.join(workspace, 'scratch.txt'), 'w') as scratch_file:
+        scratch_file.write('unsaved\n')
+
+    autosync = AutoSync(workspace)
+    with pytest.raises(RebaseConflict):
+        autosync.pusher.push()
+
+    assert not autosync.is_rebasing()
+    assert git(workspace, 'rev-parse', 'HEAD') == head
+    assert git(workspace, 'status', '--porcelain').split() == ['M', 'scratch.txt']
+    with open(os.path.join(workspace, 'notes.txt')) as notes_file:
+        assert notes_file.read() == 'workspace\n'
+    with open(os.path.join(workspace, 'scratch.txt')) as scratch_file:
+        assert scratch_file.read() == 'unsaved\n'
+
+
+def test_conflict_stops_retries(clones):
+    workspace, other = clones
+    commit_file(other, 'notes.txt', 'other\n', 'Other')
+    git(other, 'push', '-q', 'origin', 'main')
+    commit_file(workspace, 'notes.txt', 'workspace\n', 'Workspace')
+
+    autosync = AutoSync(workspace)
+    pusher = autosync.pusher
+    pusher.start()
+    pusher.request()
+    pusher.stop()
+
+    assert not pusher.is_alive()
+    assert pusher.failures == 0
+    assert 'conflicts' in autosync.status['push_conflict']
+    assert not autosync.is_rebasing()
+
+    # later batches are committed locally but not pushed
+    pusher.request()
+    assert not pusher.pending_push
+
+
+def write_file(repo, filename, content):
+    filepath = os.path.join(repo, filename)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, 'wb' if isinstance(content, bytes) else 'w') as written_file:
+        written_file.write(content)
+
+
+def get_commit_count(repo):
+    return int(git(repo, 'rev-list', '--count', 'HEAD'))
+
+
+def test_changes_are_debounced(clones):
+    workspace, _ = clones
+    autosync = AutoSync(workspace, debounce_seconds=0.5, max_delay_seconds=60)
+    commits = get_commit_count(workspace)
+
+    write_file(workspace, 'a.txt', 'a\n')
+    autosync.poll()
+    time.sleep(0.3)
+    write_file(workspace, 'b.txt', 'b\n')
+    autosync.poll()
+    assert get_commit_count(workspace) == commits
+    assert {'a.txt', 'b.txt'} <= autosync.pending
+
+    time.sleep(0.6)
+    autosync.poll()
+    # one commit for the batch
+    assert get_commit_count(workspace) == commits + 1
+    assert sorted(git(workspace, 'show', '--name-only', '--format=', 'HEAD').split()) == ['a.txt', 'b.txt']
+    assert autosync.pusher.pending_push
+
+
+def test_max_delay_bounds_debouncing(clones):
+    workspace, _ = clones
+    autosync = AutoSync(workspace, debounce_seconds=60, max_delay_seconds=0.5)
+    commits = get_commit_count(workspace)
+
+    for i in range(4):
+        write_file(workspace, 'a.txt', f"{i}\n")
+        autosync.poll()
+        time.sleep(0.2)
+
+    assert get_commit_count(workspace) == commits + 1
+
+
+def test_unchanged_content_is_skipped(clones):
+    workspace, _ = clones
+    autosync = AutoSync(workspace, debounce_seconds=0)
+    write_file(workspace, 'notebook.ipynb', '{}\n')
+    autosync.poll()
+    commits = get_commit_count(workspace)
+
+    # saved again without edits: new mtime, same content
+    time.sleep(0.01)
+    write_file(workspace, 'notebook.ipynb', '{}\n')
+    autosync.poll()
+
+    assert get_commit_count(workspace) == commits
+    assert not autosync.pending
+
+
+@pytest.mark.skipif(not shutil.which('dvc'), reason='dvc is not installed')
+def test_large_files_go_through_dvc(clones, monkeypatch):
+    monkeypatch.delenv('DVC_S3_BUCKET', raising=False)
+    workspace, _ = clones
+    autosync = AutoSync(workspace, debounce_seconds=0, dvc_threshold_bytes=1024)
+
+    write_file(workspace, 'data/large.bin', os.urandom(4096))
+    write_file(workspace, 'data/small.txt', 'small\n')
+    autosync.poll()
+
+    tracked = git(workspace, 'ls-files').split()
+    assert 'data/large.bin.dvc' in tracked
+    assert 'data/large.bin' not in tracked
+    assert 'data/small.txt' in tracked
+    assert autosync.pusher.push_dvc
+
+    # a DVC tracked file stays in DVC once it is small
+    write_file(workspace, 'data/large.bin', b'now small')
+    autosync.poll()
+    assert 'data/large.bin' not in git(workspace, 'ls-files').split()
+    assert 'now small' not in git(workspace, 'show', 'HEAD:data/large.bin.dvc')
+
+
+def test_concurrent_status_writes(clones):
+    workspace, _ = clones
+    autosync = AutoSync(workspace)
+    errors = []
+
+    def write(key):
+        try:
+            for i in range(200):
+                autosync.write_status(**{key: i})
+        except OSError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=write, args=(key,)) for key in ['pending', 'push_failures']]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    with open(autosync.status_filepath) as status_file:
+        assert json.load(status_file)['pending'] == 199